@@ -0,0 +1,46 @@
+"""Time a cold `import ndx_multichannel_volume` in a fresh interpreter, including the pynwb import it triggers."""
+import json
+import statistics
+import subprocess
+import sys
+
+# optional dependencies that must only be imported when the functions that need them are called
+DEFERRED_MODULES = ('skimage', 'scipy.io', 'tifffile')
+
+EXTENSION_SNIPPET = """
+import json, sys, time
+import pynwb
+start = time.perf_counter()
+import ndx_multichannel_volume
+print(json.dumps(dict(seconds=time.perf_counter() - start, modules=sorted(sys.modules))))
+"""
+
+
+def bench_import(benchmark):
+    command = [sys.executable, '-c', 'import ndx_multichannel_volume']
+    benchmark.pedantic(subprocess.run, args=(command,), kwargs=dict(check=True), rounds=5, iterations=1,
+                       warmup_rounds=1)
+
+
+def bench_import_pynwb(benchmark):
+    """Baseline for bench_import: the extension's own cost is the difference between the two."""
+    command = [sys.executable, '-c', 'import pynwb']
+    benchmark.pedantic(subprocess.run, args=(command,), kwargs=dict(check=True), rounds=5, iterations=1,
+                       warmup_rounds=1)
+
+
+def bench_import_budget(benchmark, import_budget):
+    """The extension's own import cost, after pynwb, which fails above --import-budget seconds (median)."""
+    runs = []
+
+    def import_extension():
+        out = subprocess.run([sys.executable, '-c', EXTENSION_SNIPPET], check=True, capture_output=True,
+                             text=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+
+    benchmark.pedantic(import_extension, rounds=5, iterations=1, warmup_rounds=1)
+    seconds = statistics.median(run['seconds'] for run in runs)
+    benchmark.extra_info['extension_seconds'] = seconds
+    assert not [m for m in DEFERRED_MODULES if m in runs[-1]['modules']], 'optional dependencies imported eagerly'
+    assert seconds <= import_budget, 'importing the extension took %.3f s, over the %.3f s budget' % (
+        seconds, import_budget)
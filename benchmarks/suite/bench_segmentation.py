@@ -0,0 +1,110 @@
+"""Build VolumeSegmentation tables with hundreds of ROIs and convert between voxel and image masks."""
+import os
+
+import numpy as np
+import pytest
+from pynwb import NWBHDF5IO
+
+from ndx_multichannel_volume import VolumeSegmentation
+
+
+@pytest.fixture
+def empty_segmentation(new_nwbfile):
+    _, imaging_vol = new_nwbfile(1)
+
+    def create():
+        return VolumeSegmentation(name='VolumeSegmentation', description='benchmark ROIs', imaging_volume=imaging_vol)
+    return create
+
+
+@pytest.fixture(scope='module')
+def segmentation(new_nwbfile, voxel_masks):
+    _, imaging_vol = new_nwbfile(1)
+    volume_seg = VolumeSegmentation(name='VolumeSegmentation', description='benchmark ROIs',
+                                    imaging_volume=imaging_vol)
+    volume_seg.add_rois(voxel_masks=voxel_masks)
+    return volume_seg
+
+
+@pytest.fixture(scope='module', params=['compound', 'numeric'])
+def segmentation_file(request, tmp_path_factory, new_nwbfile, voxel_masks):
+    """Path of a file holding the ROIs in each voxel mask layout."""
+    path = str(tmp_path_factory.mktemp('segmentation') / ('%s.nwb' % request.param))
+    nwbfile, imaging_vol = new_nwbfile(1)
+    volume_seg = VolumeSegmentation(name='VolumeSegmentation', description='benchmark ROIs',
+                                    imaging_volume=imaging_vol)
+    volume_seg.add_rois(voxel_masks=voxel_masks, layout=request.param)
+    nwbfile.processing['NeuroPAL'].add(volume_seg)
+    with NWBHDF5IO(path, mode='w') as io:
+        io.write(nwbfile)
+    return path
+
+
+def read_segmentation(path):
+    io = NWBHDF5IO(path, mode='r')
+    return io, io.read().processing['NeuroPAL']['VolumeSegmentation']
+
+
+def bench_add_roi(benchmark, empty_segmentation, voxel_masks):
+    def add():
+        volume_seg = empty_segmentation()
+        for voxel_mask in voxel_masks:
+            volume_seg.add_roi(voxel_mask=voxel_mask)
+        return volume_seg
+
+    assert len(benchmark.pedantic(add, rounds=3, iterations=1)) == len(voxel_masks)
+
+
+@pytest.mark.parametrize('layout', ['compound', 'numeric'])
+def bench_add_rois(benchmark, empty_segmentation, voxel_masks, layout):
+    benchmark.pedantic(lambda: empty_segmentation().add_rois(voxel_masks=voxel_masks, layout=layout), rounds=3,
+                       iterations=1)
+
+
+def bench_voxel_to_image(benchmark, voxel_masks, sizes):
+    benchmark(VolumeSegmentation.voxel_to_image, voxel_masks[0], shape=sizes['volume'][:3])
+
+
+def bench_image_to_pixel(benchmark, voxel_masks, sizes):
+    image_mask = VolumeSegmentation.voxel_to_image(voxel_masks[0], shape=sizes['volume'][:3])
+    benchmark(VolumeSegmentation.image_to_pixel, image_mask, 'neuron000')
+
+
+def bench_voxel_to_label_volume(benchmark, segmentation, sizes):
+    benchmark(segmentation.voxel_to_label_volume, shape=sizes['volume'][:3])
+
+
+def bench_from_labeled_volume(benchmark, segmentation, sizes):
+    labels = segmentation.voxel_to_label_volume(shape=sizes['volume'][:3])
+    benchmark.pedantic(VolumeSegmentation.from_labeled_volume, kwargs=dict(
+        labels = labels,
+        imaging_volume = segmentation.imaging_volume,
+        description = 'benchmark ROIs'
+    ), rounds=3, iterations=1)
+
+
+def bench_rois_at(benchmark, segmentation, sizes):
+    points = iter(np.random.default_rng(0).integers(0, sizes['volume'][:3], size=(10 ** 6, 3)))
+    segmentation.rois_at([0, 0, 0])  # build the spatial index outside the timing
+    benchmark(lambda: segmentation.rois_at(next(points)))
+
+
+def bench_read_voxel_to_label_volume(benchmark, segmentation_file, sizes):
+    """Rasterize all ROIs from a freshly opened file, in each voxel mask layout."""
+    def rasterize():
+        io, volume_seg = read_segmentation(segmentation_file)
+        with io:
+            return volume_seg.voxel_to_label_volume(shape=sizes['volume'][:3])
+
+    benchmark.pedantic(rasterize, rounds=3, iterations=1)
+    benchmark.extra_info['file_size'] = os.path.getsize(segmentation_file)
+
+
+def bench_read_voxel_masks(benchmark, segmentation_file):
+    """get_voxel_mask for every ROI of a freshly opened file, in each voxel mask layout."""
+    def read():
+        io, volume_seg = read_segmentation(segmentation_file)
+        with io:
+            return [volume_seg.get_voxel_mask(row) for row in range(len(volume_seg))]
+
+    benchmark.pedantic(read, rounds=3, iterations=1)
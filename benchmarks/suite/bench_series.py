@@ -0,0 +1,126 @@
+"""Write and read MultiChannelVolumeSeries data."""
+import os
+
+import numpy as np
+import pytest
+from pynwb import NWBHDF5IO
+
+from ndx_multichannel_volume import MultiChannelVolumeSeries
+
+PROFILES = {'gzip': dict(compression='gzip'), 'lzf': dict(compression='lzf'), 'contiguous': dict(compression=False)}
+
+
+def add_series(nwbfile, imaging_vol, data, **io_settings):
+    nwbfile.add_acquisition(MultiChannelVolumeSeries(
+        name = 'series',
+        data = data,
+        resolution = [0.3, 0.3, 0.75],
+        RGBW_channels = [0, 1, 0, 1],
+        imaging_volume = imaging_vol,
+        device = imaging_vol.device,
+        rate = 1.7,
+        description = 'benchmark series',
+        **io_settings
+    ))
+
+
+@pytest.fixture(scope='module', params=sorted(PROFILES))
+def series(request, tmp_path_factory, series_data, new_nwbfile):
+    """A MultiChannelVolumeSeries read back from a file written with each profile."""
+    path = str(tmp_path_factory.mktemp('series') / 'series.nwb')
+    nwbfile, imaging_vol = new_nwbfile(series_data.shape[-1])
+    add_series(nwbfile, imaging_vol, series_data, **PROFILES[request.param])
+    with NWBHDF5IO(path, mode='w') as io:
+        io.write(nwbfile)
+    with NWBHDF5IO(path, mode='r') as io:
+        yield io.read().acquisition['series']
+
+
+@pytest.mark.parametrize('profile', sorted(PROFILES))
+def bench_write_series(benchmark, tmp_path, series_data, new_nwbfile, profile):
+    path = str(tmp_path / 'series.nwb')
+
+    def write():
+        nwbfile, imaging_vol = new_nwbfile(series_data.shape[-1])
+        add_series(nwbfile, imaging_vol, series_data, **PROFILES[profile])
+        with NWBHDF5IO(path, mode='w') as io:
+            io.write(nwbfile)
+
+    benchmark.pedantic(write, rounds=3, iterations=1)
+    benchmark.extra_info['file_size'] = os.path.getsize(path)
+
+
+def bench_write_series_from_frames(benchmark, tmp_path, series_data, new_nwbfile):
+    """Streaming write, one frame in memory at a time."""
+    path = str(tmp_path / 'series.nwb')
+
+    def write():
+        nwbfile, imaging_vol = new_nwbfile(series_data.shape[-1])
+        nwbfile.add_acquisition(MultiChannelVolumeSeries.from_frames(
+            frames = iter(series_data),
+            n_frames = len(series_data),
+            name = 'series',
+            resolution = [0.3, 0.3, 0.75],
+            RGBW_channels = [0, 1, 0, 1],
+            imaging_volume = imaging_vol,
+            device = imaging_vol.device,
+            rate = 1.7,
+            description = 'benchmark series'
+        ))
+        with NWBHDF5IO(path, mode='w') as io:
+            io.write(nwbfile)
+
+    benchmark.pedantic(write, rounds=3, iterations=1)
+
+
+def bench_read_series(benchmark, series):
+    benchmark.pedantic(lambda: series.data[:], rounds=3, iterations=1)
+
+
+def bench_read_frame(benchmark, series):
+    frames = iter(np.random.default_rng(0).integers(0, series.data.shape[0], size=10 ** 6))
+    benchmark(lambda: series.data[next(frames)])
+
+
+def bench_read_frame_channel(benchmark, series):
+    """One channel of one frame, which reads every chunk of the frame unless the channels are chunked apart."""
+    frames = iter(np.random.default_rng(0).integers(0, series.data.shape[0], size=10 ** 6))
+    benchmark(lambda: series.data[next(frames), ..., 1])
+
+
+def bench_read_channel_plane_over_time(benchmark, series):
+    """One z-plane of one channel across all frames, as read when following a plane in time."""
+    z = series.data.shape[3] // 2
+    benchmark(lambda: series.data[:, :, :, z, 1])
+
+
+def bench_reduce_frames(benchmark, series):
+    benchmark.pedantic(series.reduce_frames, args=(lambda block: block.max(axis=0), np.maximum), rounds=3,
+                       iterations=1)
+
+
+@pytest.mark.parametrize('cached', [False, True], ids=['uncached', 'cached'])
+def bench_scrub_frames(benchmark, series, cached):
+    """One pass back and forth over a window of 8 frames, as when scrubbing in a viewer, after a first pass."""
+    window = min(8, series.data.shape[0])
+    frames = list(range(window)) + list(range(window - 2, 0, -1))
+    view = series.enable_frame_cache() if cached else series.data_view()
+
+    def scrub():
+        for frame in frames:
+            view[frame]
+
+    try:
+        benchmark.pedantic(scrub, rounds=10, iterations=1, warmup_rounds=1)
+    finally:
+        series.disable_frame_cache()
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+def bench_iter_frames(benchmark, series, prefetch):
+    """All frames of one channel with a CPU-bound consumer, with and without background reads."""
+    def consume():
+        for block in series.iter_frames(batch=1, prefetch=prefetch, channels=[1]):
+            np.sort(block, axis=3)
+
+    benchmark.pedantic(consume, rounds=3, iterations=1)
@@ -0,0 +1,88 @@
+"""Write and read MultiChannelVolume data, and select channels from it."""
+import os
+
+import numpy as np
+import pytest
+from pynwb import NWBHDF5IO
+
+from ndx_multichannel_volume import MultiChannelVolume
+
+PROFILES = {'gzip': dict(compression='gzip'), 'lzf': dict(compression='lzf'), 'contiguous': dict(compression=False)}
+
+
+def add_volume(nwbfile, imaging_vol, data, **io_settings):
+    nwbfile.add_acquisition(MultiChannelVolume(
+        name = 'volume',
+        data = data,
+        resolution = [0.3, 0.3, 0.75],
+        description = 'benchmark volume',
+        RGBW_channels = [0, 1, 2, 3],
+        imaging_volume = imaging_vol,
+        Order_optical_channels = imaging_vol.Order_optical_channels,
+        **io_settings
+    ))
+
+
+@pytest.fixture(scope='module', params=sorted(PROFILES))
+def volume(request, tmp_path_factory, volume_data, new_nwbfile):
+    """A MultiChannelVolume read back from a file written with each profile."""
+    path = str(tmp_path_factory.mktemp('volume') / 'volume.nwb')
+    nwbfile, imaging_vol = new_nwbfile(volume_data.shape[-1])
+    add_volume(nwbfile, imaging_vol, volume_data, **PROFILES[request.param])
+    with NWBHDF5IO(path, mode='w') as io:
+        io.write(nwbfile)
+    with NWBHDF5IO(path, mode='r') as io:
+        yield io.read().acquisition['volume']
+
+
+@pytest.mark.parametrize('profile', sorted(PROFILES))
+def bench_write_volume(benchmark, tmp_path, volume_data, new_nwbfile, profile):
+    path = str(tmp_path / 'volume.nwb')
+
+    def write():
+        nwbfile, imaging_vol = new_nwbfile(volume_data.shape[-1])
+        add_volume(nwbfile, imaging_vol, volume_data, **PROFILES[profile])
+        with NWBHDF5IO(path, mode='w') as io:
+            io.write(nwbfile)
+
+    benchmark.pedantic(write, rounds=3, iterations=1, warmup_rounds=0)
+    benchmark.extra_info['file_size'] = os.path.getsize(path)
+
+
+def bench_read_volume(benchmark, volume):
+    benchmark.pedantic(lambda: volume.data[:], rounds=3, iterations=1)
+
+
+@pytest.mark.parametrize('source', ['h5py', 'memmap'])
+def bench_read_random_planes(benchmark, volume, source):
+    """One z-plane of one channel at random, reduced so that the bytes are read, through h5py or data_view()."""
+    data = volume.data if source == 'h5py' else volume.data_view()
+    if source == 'memmap' and not isinstance(data, np.memmap):
+        pytest.skip('data_view() is only a memmap for uncompressed, contiguous data')
+    rng = np.random.default_rng(0)
+    planes = iter(zip(rng.integers(0, data.shape[2], size=10 ** 6), rng.integers(0, data.shape[3], size=10 ** 6)))
+
+    def read():
+        z, c = next(planes)
+        return data[:, :, z, c].sum()
+
+    benchmark(read)
+
+
+def bench_get_zslab(benchmark, volume):
+    nz = volume.data.shape[2]
+    benchmark(volume.get_zslab, nz // 2, nz // 2 + 4)
+
+
+@pytest.mark.parametrize('channel', [1, 'channel1', '561-650-40m', 650.], ids=['index', 'name', 'description',
+                                                                              'wavelength'])
+def bench_get_channel(benchmark, volume, channel):
+    benchmark(volume.get_channel, channel)
+
+
+def bench_get_channel_plane(benchmark, volume):
+    benchmark(volume.get_channel, '561-650-40m', z=volume.data.shape[2] // 2)
+
+
+def bench_get_rgbw(benchmark, volume):
+    benchmark.pedantic(volume.get_rgbw, rounds=3, iterations=1)
@@ -0,0 +1,110 @@
+"""Shared fixtures of the benchmark suite: synthetic data at realistic sizes and the NWB containers to hold it.
+
+All data is generated offline from fixed seeds, so runs are comparable across commits.
+"""
+import datetime
+
+import numpy as np
+import pytest
+from pynwb import NWBFile
+
+from ndx_multichannel_volume import OpticalChannelReferences, OpticalChannelPlus, ImagingVolume
+
+try:
+    import pytest_benchmark
+except ImportError:
+    pytest_benchmark = None
+    collect_ignore_glob = ['bench_*.py']
+
+# volume is (x, y, z, channel), series is (time, x, y, z, channel); ROIs are rois x roi_voxels voxels
+SIZES = {
+    'full': dict(volume=(1000, 240, 50, 4), series=(10, 512, 256, 24, 2), rois=300, roi_voxels=2000),
+    'small': dict(volume=(200, 120, 20, 4), series=(4, 128, 64, 12, 2), rois=100, roi_voxels=200),
+}
+
+
+def pytest_addoption(parser):
+    parser.addoption('--bench-size', choices=sorted(SIZES), default='full',
+                     help='size of the synthetic data, full (realistic) or small (smoke run)')
+    parser.addoption('--import-budget', type=float, default=0.5,
+                     help='maximum median seconds spent importing the extension after pynwb; bench_import_budget '
+                          'fails above it')
+
+
+def synthetic_volume(shape, seed=0):
+    """Smooth background, noise and sparse bright blobs as int16, roughly like a whole-brain recording."""
+    rng = np.random.default_rng(seed)
+    background = np.linspace(100, 400, shape[-4], dtype=np.float32).reshape((-1,) + (1,) * 3)
+    data = (background + rng.normal(0, 20, size=shape).astype(np.float32))
+    blobs = tuple(rng.integers(0, n, size=300 * int(np.prod(shape[:-4], dtype=np.int64))) for n in shape)
+    data[blobs] += 3000
+    return np.clip(data, 0, np.iinfo(np.int16).max).astype(np.int16)
+
+
+@pytest.fixture(scope='session')
+def sizes(pytestconfig):
+    return SIZES[pytestconfig.getoption('--bench-size')]
+
+
+@pytest.fixture(scope='session')
+def import_budget(pytestconfig):
+    return pytestconfig.getoption('--import-budget')
+
+
+@pytest.fixture(scope='session')
+def volume_data(sizes):
+    return synthetic_volume(sizes['volume'])
+
+
+@pytest.fixture(scope='session')
+def series_data(sizes):
+    return synthetic_volume(sizes['series'], seed=1)
+
+
+@pytest.fixture(scope='session')
+def voxel_masks(sizes):
+    """One list-of-records voxel mask per ROI, each a compact blob inside the benchmark volume."""
+    rng = np.random.default_rng(2)
+    extent = np.array(sizes['volume'][:3])
+    masks = []
+    for roi in range(sizes['rois']):
+        center = rng.integers(0, extent)
+        coords = np.clip(center + rng.integers(-8, 9, size=(sizes['roi_voxels'], 3)), 0, extent - 1)
+        weights = rng.random(sizes['roi_voxels'])
+        masks.append([[int(x), int(y), int(z), float(w), 'neuron%03d' % roi]
+                      for (x, y, z), w in zip(coords, weights)])
+    return masks
+
+
+@pytest.fixture(scope='session')
+def new_nwbfile():
+    """Returns a function creating an NWBFile with an ImagingVolume of n_channels, in a NeuroPAL module."""
+    def create(n_channels):
+        nwbfile = NWBFile(
+            session_description = 'benchmark',
+            identifier = 'benchmark',
+            session_start_time = datetime.datetime.now(datetime.timezone.utc)
+        )
+        device = nwbfile.create_device(name='device')
+        channels = [OpticalChannelPlus(
+            name = 'channel%d' % c,
+            description = '561-%d-40m' % (600 + 50 * c),
+            excitation_lambda = 561.,
+            excitation_range = [561., 561.],
+            emission_range = [580. + 50 * c, 620. + 50 * c],
+            emission_lambda = 600. + 50 * c
+        ) for c in range(n_channels)]
+        channel_refs = OpticalChannelReferences(name='OpticalChannelRefs', channels=[c.description for c in channels])
+        imaging_vol = ImagingVolume(
+            name = 'ImagingVolume',
+            optical_channel_plus = channels,
+            Order_optical_channels = channel_refs,
+            description = 'benchmark volume',
+            device = device,
+            location = 'head'
+        )
+        module = nwbfile.create_processing_module(name='NeuroPAL', description='benchmark')
+        module.add(imaging_vol)
+        module.add(channel_refs)
+        return nwbfile, imaging_vol
+    return create
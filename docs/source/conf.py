@@ -10,7 +10,7 @@ project = 'ndx-multichannel-volume'
 copyright = '2023, Daniel Sprague'
 author = 'Daniel Sprague'
 
-version = '0.1.0'
+version = '0.2.0'
 release = 'alpha'
 
 # -- General configuration ---------------------------------------------------
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+import json
 import os
 
 from setuptools import setup, find_packages
@@ -22,7 +24,7 @@ except Exception:
 
 setup_args = {
     'name': 'ndx-multichannel-volume',
-    'version': '0.1.0',
+    'version': '0.2.0',
     'description': 'extension to allow use of multichannel volumetric images',
     'long_description': readme,
     'long_description_content_type': readme_type,
@@ -31,14 +33,18 @@ setup_args = {
     'url': '',
     'license': 'BSD-3',
     'install_requires': [
-        'pynwb>=1.5.0,<3',
+        'pynwb>=1.5.0,<3',  # the spec cache loads into pynwb's type map, see _pynwb_type_map
         'hdmf>=2.5.6,<4',
     ],
+    'extras_require': {
+        'zarr': ['hdmf-zarr<0.12'],  # hdmf-zarr 0.12 requires hdmf 4
+    },
     'packages': find_packages('src/pynwb', exclude=["tests", "tests.*"]),
     'package_dir': {'': 'src/pynwb'},
     'package_data': {'ndx_multichannel_volume': [
         'spec/ndx-multichannel-volume.namespace.yaml',
         'spec/ndx-multichannel-volume.extensions.yaml',
+        'spec/ndx-multichannel-volume.spec-cache.json',
     ]},
     'classifiers': [
         "Intended Audience :: Developers",
@@ -65,6 +71,36 @@ def _copy_spec_files(project_dir):
 
     copy2(ns_path, dst_dir)
     copy2(ext_path, dst_dir)
+    _build_spec_cache(dst_dir)
+
+
+def _build_spec_cache(spec_dir):
+    """Writes the parsed namespace and extension YAML to ndx-multichannel-volume.spec-cache.json.
+
+    The extension loads its namespace from this file instead of parsing the YAML at import time, as long as
+    the SHA-256 of every YAML file still matches the one recorded here.
+    """
+    from ruamel import yaml  # installed with hdmf
+
+    def parse(name):
+        with open(os.path.join(spec_dir, name), 'r') as f:
+            return yaml.YAML(typ='safe', pure=True).load(f)
+
+    def digest(name):
+        with open(os.path.join(spec_dir, name), 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    ns_name = 'ndx-multichannel-volume.namespace.yaml'
+    namespaces = parse(ns_name)['namespaces']
+    sources = [s['source'] for ns in namespaces for s in ns.get('schema', []) if 'source' in s]
+    cache = {
+        'sources': {name: digest(name) for name in [ns_name] + sources},
+        'namespaces': namespaces,
+        'specs': {name: parse(name) for name in sources},
+    }
+    with open(os.path.join(spec_dir, 'ndx-multichannel-volume.spec-cache.json'), 'w') as f:
+        json.dump(cache, f, indent=1)
+        f.write('\n')
 
 
 if __name__ == '__main__':
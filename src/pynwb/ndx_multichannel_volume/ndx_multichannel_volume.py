@@ -1,30 +1,32 @@
 import os
-from pynwb import load_namespaces, get_class
-from pynwb.file import MultiContainerInterface, NWBContainer
-import skimage.io as skio
-from collections.abc import Iterable
-import numpy as np
-from pynwb import register_class
-from hdmf.utils import docval, get_docval, popargs
-from pynwb.ophys import ImageSeries 
-from pynwb.core import NWBDataInterface
-from hdmf.common import DynamicTable
-from hdmf.utils import docval, popargs, get_docval, get_data_shape, popargs_to_dict
-from pynwb.file import Device
-import pandas as pd
+import concurrent.futures
+import functools
+import glob
+import hashlib
+import itertools
+import json
+import threading
+import warnings
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterable
+
+import h5py
 import numpy as np
-from pynwb import NWBFile, TimeSeries, NWBHDF5IO
-from pynwb.epoch import TimeIntervals
-from pynwb.file import Subject
-from pynwb.behavior import SpatialSeries, Position
-from pynwb.image import ImageSeries
-from pynwb.ophys import OnePhotonSeries, OpticalChannel, ImageSegmentation, Fluorescence, CorrectedImageStack, MotionCorrection, RoiResponseSeries
-from datetime import datetime
-from dateutil import tz
-import pandas as pd
-import scipy.io as sio
-from datetime import datetime, timedelta
+from hdmf.backends.hdf5 import H5DataIO
+from hdmf.build import TypeMap
+from hdmf.common import DynamicTable, VectorIndex
+from hdmf.data_utils import AbstractDataChunkIterator, DataChunk, DataIO, DataChunkIterator, GenericDataChunkIterator
+from hdmf.query import HDMFDataset
+from hdmf.spec.namespace import SpecReader
+from hdmf.utils import docval, get_docval, get_data_shape, popargs, popargs_to_dict
+import pynwb
+from pynwb import load_namespaces, get_class, register_class, register_map, TimeSeries
+from pynwb.core import NWBData, NWBDataInterface
+from pynwb.device import Device
+from pynwb.io.base import TimeSeriesMap
 
+# Optional dependencies (scikit-image, tifffile) are imported where they are used so that
+# importing the extension only pays for what the registered classes need.
 
 
 # Set path of the namespace.yaml file to the expected install location
@@ -45,15 +47,586 @@ if not os.path.exists(MultiChannelVol_specpath):
         'ndx-multichannel-volume.namespace.yaml'
     ))
 
+
+class _CachedSpecReader(SpecReader):
+    """Serves the namespace and spec files of the extension from the parsed-spec cache."""
+
+    def __init__(self, indir, cache):
+        super().__init__(source=indir)
+        self.__cache = cache
+
+    def read_namespace(self, namespace_path):
+        return self.__cache['namespaces']
+
+    def read_spec(self, spec_path):
+        return self.__cache['specs'][spec_path]
+
+
+def _spec_cache_path(namespace_path):
+    return os.path.join(os.path.dirname(namespace_path), 'ndx-multichannel-volume.spec-cache.json')
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _read_spec_cache(namespace_path):
+    """Returns the parsed-spec cache next to namespace_path, or None if it is missing, unreadable or stale.
+
+    The cache is stale when the SHA-256 of any of the YAML files it was built from has changed.
+    """
+    indir = os.path.dirname(namespace_path)
+    try:
+        with open(_spec_cache_path(namespace_path), 'r') as f:
+            cache = json.load(f)
+        sources = cache['sources']
+        if os.path.basename(namespace_path) not in sources:
+            return None
+        for name, digest in sources.items():
+            if _file_digest(os.path.join(indir, name)) != digest:
+                return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return cache
+
+
+def _pynwb_type_map():
+    """Returns the global TypeMap that pynwb.load_namespaces loads into, or None if pynwb does not have one.
+
+    pynwb has no public access to it; the module global read here exists in the pynwb releases allowed by
+    setup.py (>=1.5, <3), and test_import fails if a release renames it.
+    """
+    type_map = vars(pynwb).get('__TYPE_MAP')
+    return type_map if isinstance(type_map, TypeMap) else None
+
+
+def _load_namespace(namespace_path):
+    """Loads the extension namespace into the pynwb type map.
+
+    Parsing the YAML dominates the cost of importing the extension, so setup.py ships the parsed namespace
+    and spec files as JSON next to the namespace file. They are used while the YAML hashes still match.
+    pynwb.load_namespaces takes no SpecReader, so the cache is loaded into pynwb's type map directly; without
+    it, or without a valid cache, the YAML is parsed by pynwb.load_namespaces.
+    """
+    cache = _read_spec_cache(namespace_path)
+    type_map = _pynwb_type_map()
+    if cache is None or type_map is None:
+        return load_namespaces(namespace_path)
+    reader = _CachedSpecReader(os.path.dirname(namespace_path), cache)
+    return type_map.load_namespaces(namespace_path=namespace_path, reader=reader)
+
+
 # Load the namespace
-load_namespaces(MultiChannelVol_specpath)
+_load_namespace(MultiChannelVol_specpath)
 
 # TODO: import your classes here or define your class using get_class to make
 # them accessible at the package level
 CElegansSubject = get_class('CElegansSubject', 'ndx-multichannel-volume')
 OpticalChannelReferences = get_class('OpticalChannelReferences', 'ndx-multichannel-volume')
 OpticalChannelPlus = get_class('OpticalChannelPlus', 'ndx-multichannel-volume')
-MultiChannelVolumeSeries = get_class('MultiChannelVolumeSeries', 'ndx-multichannel-volume')
+
+# numpy equivalents of the compound dtypes of VolumeSegmentation.voxel_mask and color_voxel_mask
+VOXEL_MASK_DTYPE = np.dtype([('x', np.uint32), ('y', np.uint32), ('z', np.uint32),
+                             ('weight', np.float32), ('ID', object)])
+COLOR_VOXEL_MASK_DTYPE = np.dtype([('x', np.uint32), ('y', np.uint32), ('z', np.uint32),
+                                   ('weight', np.float32), ('ID', object),
+                                   ('R', np.uint32), ('G', np.uint32), ('B', np.uint32), ('W', np.uint32)])
+# fixed-width dtypes of numeric_voxel_mask and numeric_color_voxel_mask, which store the cell ID once per ROI in roi_ID
+NUMERIC_VOXEL_MASK_DTYPE = np.dtype([(name, VOXEL_MASK_DTYPE[name]) for name in VOXEL_MASK_DTYPE.names
+                                     if name != 'ID'])
+NUMERIC_COLOR_VOXEL_MASK_DTYPE = np.dtype([(name, COLOR_VOXEL_MASK_DTYPE[name]) for name in COLOR_VOXEL_MASK_DTYPE.names
+                                           if name != 'ID'])
+
+# target size of one chunk of MultiChannelVolume / MultiChannelVolumeSeries data
+_CHUNK_TARGET_BYTES = 1024 ** 2
+# target size of the block of frames read at once when streaming MultiChannelVolumeSeries data
+_FRAME_BLOCK_TARGET_BYTES = 64 * 1024 ** 2
+
+_data_io_docval = (
+    {'name': 'compression', 'type': (str, bool), 'default': 'gzip',
+     'doc': "compression filter for data, 'gzip' or 'lzf' ('blosc' too with the zarr backend). False stores data "
+            "uncompressed and, with the hdf5 backend and unless chunks is given, contiguous"},
+    {'name': 'compression_opts', 'type': int, 'default': None,
+     'doc': 'compression level for gzip (0-9, 4 if not given) or blosc (0-9, 5 if not given)'},
+    {'name': 'shuffle', 'type': bool, 'default': True,
+     'doc': 'apply the byte shuffle filter before compressing data'},
+    {'name': 'chunks', 'type': (tuple, bool), 'default': None,
+     'doc': 'chunk shape of data. Defaults to a z-slab of all channels (of one frame for series data) of about 1 MiB'},
+    {'name': 'backend', 'type': str, 'default': 'hdf5',
+     'doc': "backend the data will be written with: 'hdf5' wraps data in H5DataIO, 'zarr' in ZarrDataIO "
+            "(requires hdmf-zarr)"},
+)
+
+# docval matches types given as strings by class name, which accepts dask arrays without importing dask
+_DASK_ARRAY = 'Array'
+
+_dtype_docval = (
+    {'name': 'dtype_conversion', 'type': str, 'default': 'cast',
+     'doc': "how data that is not int16, the dtype of the spec, is converted: 'cast' rounds and clips values to the "
+            "int16 range, 'rescale' maps value_range linearly onto 0..32767, 'none' leaves data as it is (float data "
+            "is then stored as int64). Iterators and dask arrays are converted lazily, block by block"},
+    {'name': 'value_range', 'type': (list, tuple), 'default': None,
+     'doc': "(min, max) of the input values mapped onto 0..32767 by 'rescale'. Defaults to the range of the data; "
+            "iterators must give it"},
+)
+
+_frame_engine_docval = (
+    {'name': 'frames_per_chunk', 'type': int, 'default': None,
+     'doc': 'frames passed to func at once. Defaults to a multiple of the HDF5 chunking of about 64 MiB'},
+    {'name': 'n_workers', 'type': int, 'default': 1, 'doc': 'number of threads or processes running func'},
+    {'name': 'executor', 'type': str, 'default': 'thread',
+     'doc': "'thread', or 'process' for data read from an HDF5 or Zarr file. With processes func must be picklable, "
+            "e.g. a module-level function or a functools.partial of one"},
+    {'name': 'max_pending', 'type': int, 'default': None,
+     'doc': 'maximum number of frame blocks read or processed at once. Defaults to 2 * n_workers'},
+)
+
+
+def _volume_chunks(shape, itemsize, frame_axis=False):
+    """Returns a chunk shape holding a z-slab of all channels, of a single frame if frame_axis is set."""
+    nx, ny, nz, nc = shape[-4:]
+    if None in (nx, ny, nz, nc):
+        return True
+    plane_bytes = max(nx * ny * nc * itemsize, 1)
+    nz_chunk = int(min(nz, max(1, _CHUNK_TARGET_BYTES // plane_bytes)))
+    return ((1,) if frame_axis else ()) + (nx, ny, max(nz_chunk, 1), nc)
+
+
+def _is_zarr_array(data):
+    """Returns whether data is a zarr array, without importing zarr."""
+    return type(data).__module__.split('.')[0] == 'zarr' and hasattr(data, 'store')
+
+
+def _zarr_data_io(data, chunks, compression, compression_opts, shuffle, itemsize):
+    """Wraps volume data in ZarrDataIO, translating the HDF5-style compression settings to numcodecs."""
+    try:
+        import numcodecs
+        from hdmf_zarr import ZarrDataIO
+    except ImportError as e:
+        raise ImportError("backend='zarr' requires hdmf-zarr: pip install hdmf-zarr") from e
+    filters = None
+    if not compression:
+        compressor = False
+    elif compression == 'gzip':
+        compressor = numcodecs.GZip(level=4 if compression_opts is None else compression_opts)
+        if shuffle:
+            filters = [numcodecs.Shuffle(elementsize=itemsize)]
+    elif compression in ('blosc', 'lzf'):
+        # lzf has no numcodecs codec, blosc with lz4 is the closest fast codec
+        compressor = numcodecs.Blosc(cname='lz4' if compression == 'lzf' else 'zstd',
+                                     clevel=5 if compression_opts is None else compression_opts,
+                                     shuffle=numcodecs.Blosc.SHUFFLE if shuffle else numcodecs.Blosc.NOSHUFFLE)
+    else:
+        raise ValueError("compression must be 'gzip', 'lzf', 'blosc' or False, got '%s'" % compression)
+    return ZarrDataIO(data=data,
+                      chunks=chunks if isinstance(chunks, tuple) else None,
+                      compressor=compressor,
+                      filters=filters)
+
+
+def _wrap_volume_data(data, frame_axis, compression, compression_opts, shuffle, chunks, backend='hdf5'):
+    """Wraps volume data in H5DataIO or ZarrDataIO with volume-aware chunking and the requested compression.
+
+    Data that is already wrapped or read from a file is returned as is.
+    """
+    if backend not in ('hdf5', 'zarr'):
+        raise ValueError("backend must be 'hdf5' or 'zarr', got '%s'" % backend)
+    if isinstance(data, (DataIO, HDMFDataset, h5py.Dataset)) or _is_zarr_array(data):
+        return data
+    dtype = getattr(data, 'dtype', None)
+    itemsize = np.dtype(dtype if dtype is not None else np.int16).itemsize
+    if _is_dask_array(data):
+        # written one buffer at a time, so that only the blocks of one buffer are computed at once
+        chunk_shape = chunks if isinstance(chunks, tuple) else _volume_chunks(data.shape, itemsize, frame_axis)
+        data = _LazyArrayIterator(array=data, chunk_shape=chunk_shape, buffer_gb=_FRAME_BLOCK_TARGET_BYTES / 1e9)
+    if backend == 'hdf5' and not compression and chunks is None:
+        return data
+    if chunks is None:
+        shape = getattr(data, 'maxshape', None) or get_data_shape(data)
+        chunks = _volume_chunks(shape, itemsize, frame_axis)
+    if backend == 'zarr':
+        return _zarr_data_io(data, chunks, compression, compression_opts, shuffle, itemsize)
+    return H5DataIO(data=data,
+                    chunks=chunks,
+                    compression=compression or None,
+                    compression_opts=compression_opts if compression else None,
+                    shuffle=shuffle if compression else False)
+
+
+def _is_dask_array(data):
+    """Returns whether data is a dask array, without importing dask."""
+    return type(data).__module__.split('.')[0] == 'dask' and hasattr(data, 'map_blocks')
+
+
+class _ConversionStats(dict):
+    """Counts of the values converted to int16 and of those rounded, clipped or replaced, filled as blocks are
+    converted. Dask converts blocks in worker threads, so counts are added under a lock."""
+
+    def __init__(self, name):
+        super().__init__(values=0, rounded=0, below=0, above=0, nan=0)
+        self.name = name
+        self.warned = False
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        """Adds the counts of one converted block."""
+        with self._lock:
+            for key, count in counts.items():
+                self[key] += count
+
+    def warn(self, final=True):
+        """Warns once if values were rounded, clipped or NaN. Lazy conversions warn at the first such block."""
+        with self._lock:
+            if self.warned or not (self['rounded'] or self['below'] or self['above'] or self['nan']):
+                return
+            self.warned = True
+        if final:
+            message = ("%s: %d of %d values had a fractional part and were rounded, %d were clipped to the int16 "
+                       "range (%d below, %d above) and %d NaN values were set to 0"
+                       % (self.name, self['rounded'], self['values'], self['below'] + self['above'], self['below'],
+                          self['above'], self['nan']))
+        else:
+            message = ("%s: values are being rounded, clipped to the int16 range or are NaN; see "
+                       "dtype_conversion_stats for the totals once the data has been written" % self.name)
+        if self['rounded']:
+            message += ". Use dtype_conversion='rescale' to keep the precision of fractional data"
+        warnings.warn(message)
+
+
+class _Int16ChunkIterator(AbstractDataChunkIterator):
+    """Converts the chunks of another DataChunkIterator to int16 as they are written."""
+
+    def __init__(self, iterator, convert, stats):
+        self._iterator = iterator
+        self._convert = convert
+        self._stats = stats
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self._iterator)
+        except StopIteration:
+            self._stats.warn()
+            raise
+        return DataChunk(data=self._convert(chunk.data), selection=chunk.selection)
+
+    def recommended_chunk_shape(self):
+        return self._iterator.recommended_chunk_shape()
+
+    def recommended_data_shape(self):
+        return self._iterator.recommended_data_shape()
+
+    @property
+    def dtype(self):
+        return np.dtype(np.int16)
+
+    @property
+    def maxshape(self):
+        return self._iterator.maxshape
+
+
+class _LazyArrayIterator(GenericDataChunkIterator):
+    """Reads a lazy array, such as a dask array, one buffer at a time for writing."""
+
+    @docval({'name': 'array', 'type': None, 'doc': 'array with shape, dtype and NumPy-style slicing'},
+            *get_docval(GenericDataChunkIterator.__init__))
+    def __init__(self, **kwargs):
+        self._array = popargs('array', kwargs)
+        super().__init__(**kwargs)
+
+    def _get_data(self, selection):
+        return np.asarray(self._array[selection])
+
+    def _get_maxshape(self):
+        return tuple(int(n) for n in self._array.shape)
+
+    def _get_dtype(self):
+        return np.dtype(self._array.dtype)
+
+
+def _rescale_chunk(chunk, value_range, dtype, stats=None):
+    """Maps value_range linearly onto 0..max of an integer dtype, clipping values outside of it and zeroing NaN."""
+    lo, hi = value_range
+    info = np.iinfo(dtype)
+    values = (np.asarray(chunk, dtype=np.float64) - lo) * (info.max / (hi - lo))
+    nan = np.isnan(values)
+    values = np.rint(values)
+    if stats is not None:
+        stats.add(values=values.size, below=int(np.count_nonzero(values < 0)),
+                  above=int(np.count_nonzero(values > info.max)), nan=int(np.count_nonzero(nan)))
+    values = np.clip(values, 0, info.max)
+    values[nan] = 0
+    return values.astype(dtype)
+
+
+def _convert_volume_data(data, conversion, value_range, name):
+    """Converts volume data to the int16 dtype of the spec. Returns the converted data and the conversion stats.
+
+    Arrays are converted block by block along their first axis into a new int16 array, so the input is never
+    modified and no full-size float temporary is created. Iterators and dask arrays are wrapped so that each
+    block is converted when it is written; their stats fill up during the write. Data that is int16 already,
+    wrapped in DataIO or read from a file is returned as it is, with stats None.
+    """
+    if conversion not in ('cast', 'rescale', 'none'):
+        raise ValueError("dtype_conversion must be 'cast', 'rescale' or 'none', got '%s'" % conversion)
+    if conversion == 'none' or isinstance(data, (DataIO, HDMFDataset, h5py.Dataset)) or _is_zarr_array(data):
+        return data, None
+    iterator = isinstance(data, AbstractDataChunkIterator)
+    if not iterator and not _is_dask_array(data):
+        data = np.asarray(data)
+    dtype = getattr(data, 'dtype', None)
+    if conversion == 'cast' and dtype is not None and np.dtype(dtype) == np.int16:
+        return data, None
+
+    if conversion == 'rescale' and value_range is None:
+        if iterator:
+            raise ValueError("%s: dtype_conversion='rescale' of iterator data needs value_range" % name)
+        if _is_dask_array(data):
+            import dask
+            import dask.array
+
+            value_range = dask.compute(dask.array.nanmin(data), dask.array.nanmax(data))
+        else:
+            value_range = (np.nanmin(data), np.nanmax(data)) if data.size else (0, 1)
+    if value_range is not None:
+        value_range = (float(value_range[0]), float(value_range[1]))
+        if conversion == 'rescale' and not value_range[1] > value_range[0]:
+            raise ValueError("%s: value_range must be (min, max) with max > min, got %s" % (name, value_range))
+
+    stats = _ConversionStats(name)
+    if conversion == 'rescale':
+        cast = functools.partial(_rescale_chunk, value_range=value_range, dtype=np.int16, stats=stats)
+    else:
+        cast = functools.partial(_cast_chunk, dtype=np.int16, stats=stats)
+
+    if iterator or _is_dask_array(data):
+        def convert(block):
+            block = cast(block)
+            stats.warn(final=False)
+            return block
+
+        if iterator:
+            return _Int16ChunkIterator(data, convert, stats), stats
+        return data.map_blocks(convert, dtype=np.int16), stats
+
+    out = np.empty(data.shape, dtype=np.int16)
+    row_bytes = max(int(np.prod(data.shape[1:], dtype=np.int64)) * data.dtype.itemsize, 1)
+    step = max(1, _FRAME_BLOCK_TARGET_BYTES // 4 // row_bytes)
+    for start in range(0, len(data), step):
+        out[start:start + step] = cast(data[start:start + step])
+    stats.warn()
+    return out, stats
+
+
+def _stack_voxel_rows(rows):
+    """Returns a list of voxel mask rows as a structured array if they are all records of one dtype.
+
+    Rows added from structured arrays are stored as np.void records and rows added from lists as lists or tuples,
+    and one column can hold both. Mixed rows are returned as a list of tuples.
+    """
+    dtype = rows[0].dtype
+    if all(isinstance(row, np.void) and row.dtype == dtype for row in rows):
+        return np.array(rows)
+    return [tuple(row) for row in rows]
+
+
+def _voxel_mask_arrays(voxel_mask):
+    """Returns the (N, 3) integer coordinates and the weights of compound voxel mask data.
+
+    Accepts structured arrays, h5py compound datasets (only the numeric fields are read) and
+    lists of records such as [x, y, z, weight, ID].
+    """
+    if isinstance(voxel_mask, HDMFDataset):
+        # compound datasets read from file are wrapped by hdmf
+        voxel_mask = voxel_mask.dataset
+    if isinstance(voxel_mask, list) and len(voxel_mask) and isinstance(voxel_mask[0], np.void):
+        # rows added from structured arrays are stored as a list of records
+        voxel_mask = _stack_voxel_rows(voxel_mask)
+    dtype = getattr(voxel_mask, 'dtype', None)
+    if dtype is not None and dtype.names:
+        if hasattr(voxel_mask, 'fields'):
+            voxel_mask = voxel_mask.fields(['x', 'y', 'z', 'weight'])[()]
+        coords = np.stack([voxel_mask['x'], voxel_mask['y'], voxel_mask['z']], axis=1)
+        weights = np.asarray(voxel_mask['weight'])
+    else:
+        records = np.array(voxel_mask, dtype=object)
+        if records.ndim != 2:
+            # empty, or a mix of lists and records
+            records = np.array([tuple(v)[:4] for v in voxel_mask], dtype=object).reshape(-1, 4)
+        numeric = records[:, :4].astype(np.float64)
+        coords = numeric[:, :3]
+        weights = numeric[:, 3]
+    return coords.astype(np.intp), weights.astype(np.float32)
+
+
+def _as_voxel_records(voxel_mask, dtype=VOXEL_MASK_DTYPE):
+    """Returns voxel mask data as a structured array with the given voxel mask dtype."""
+    if isinstance(voxel_mask, list) and len(voxel_mask) and isinstance(voxel_mask[0], np.void):
+        voxel_mask = _stack_voxel_rows(voxel_mask)
+    if getattr(getattr(voxel_mask, 'dtype', None), 'names', None):
+        return np.asarray(voxel_mask).astype(dtype, copy=False)
+    records = np.array(voxel_mask, dtype=object).reshape(-1, len(dtype))
+    out = np.empty(len(records), dtype=dtype)
+    for i, field in enumerate(dtype.names):
+        out[field] = records[:, i]
+    return out
+
+
+def _split_voxel_records(records, ends, numeric_dtype):
+    """Splits concatenated voxel mask records into fixed-width numeric records and one cell ID per ROI.
+
+    ends are the end offsets of the ROIs in records. All voxels of a ROI must have the same ID.
+    """
+    starts = np.concatenate(([0], ends[:-1])).astype(np.int64)
+    roi_of_voxel = np.repeat(np.arange(len(ends)), ends - starts)
+    ids = records['ID']
+    if len(ids) and np.any(ids != ids[starts[roi_of_voxel]]):
+        raise ValueError("the voxels of each ROI must share one ID to be stored in the numeric layout")
+    roi_ids = np.array([ids[start] if stop > start else '' for start, stop in zip(starts, ends)], dtype=object)
+    numeric = np.empty(len(records), dtype=numeric_dtype)
+    for field in numeric_dtype.names:
+        numeric[field] = records[field]
+    return numeric, roi_ids
+
+
+def _frame_blocks(data, frames_per_block=None):
+    """Splits the frame axis of (time, ...) data into [start, stop) blocks.
+
+    Blocks default to about 64 MiB and are a multiple of the HDF5 chunking along time when the data is chunked.
+    """
+    shape = get_data_shape(data)
+    n_frames = shape[0]
+    if frames_per_block is None:
+        dtype = getattr(data, 'dtype', None)
+        itemsize = np.dtype(dtype if dtype is not None else np.float64).itemsize
+        frame_bytes = max(int(np.prod(shape[1:])) * itemsize, 1)
+        frames_per_block = max(1, _FRAME_BLOCK_TARGET_BYTES // frame_bytes)
+        frame_chunk = (getattr(data, 'chunks', None) or (1,))[0]
+        if frames_per_block >= frame_chunk:
+            frames_per_block -= frames_per_block % frame_chunk
+    return [(start, min(start + frames_per_block, n_frames)) for start in range(0, n_frames, frames_per_block)]
+
+
+def _is_file_backed(data):
+    """Returns whether data was read from an HDF5 or Zarr file rather than built in memory."""
+    data = data.data if isinstance(data, DataIO) else data
+    return isinstance(data, (HDMFDataset, h5py.Dataset)) or _is_zarr_array(data)
+
+
+def _frame_data(data, name):
+    """Returns random-access (time, ...) data of a series, unwrapping DataIO and hdmf datasets."""
+    data = data.data if isinstance(data, DataIO) else data
+    if isinstance(data, HDMFDataset):
+        data = data.dataset
+    if isinstance(data, Iterable) and not hasattr(data, '__getitem__'):
+        raise ValueError("the data of '%s' is an iterator without random access; write the series to a file "
+                         "and read it back first" % name)
+    return data
+
+
+def _channel_selection(channels):
+    """Returns a selection of the channel axis that h5py accepts and the indices that restore the requested order.
+
+    h5py needs increasing, unique indices for a list selection, while channels may repeat or be in any order.
+    Contiguous channels are selected with a slice, which reads a single hyperslab and keeps memmaps as views.
+    The reorder is None when the selection already returns the channels in the requested order.
+    """
+    channels = np.asarray(channels, dtype=np.intp).ravel()
+    unique, inverse = np.unique(channels, return_inverse=True)
+    if len(unique) and unique[-1] - unique[0] == len(unique) - 1:
+        selection = slice(int(unique[0]), int(unique[-1]) + 1)
+    else:
+        selection = unique.tolist()
+    return selection, None if np.array_equal(unique, channels) else inverse.ravel()
+
+
+def _reorder_channels(block, reorder):
+    """Applies the reorder of _channel_selection to the last axis of block."""
+    return block if reorder is None else block[..., reorder]
+
+
+# dataset opened by each worker process of _iter_frame_blocks, and the keyword arguments of its func
+_frame_worker = dict()
+
+
+def _init_frame_worker(filename, path, func_kwargs):
+    if filename is not None:
+        _frame_worker['data'] = h5py.File(filename, 'r')[path]
+    _frame_worker['func_kwargs'] = func_kwargs
+
+
+def _apply_to_frame_block(func, start, stop, selection, data=None, func_kwargs=None):
+    if data is None:
+        data = _frame_worker['data']
+    if func_kwargs is None:
+        func_kwargs = _frame_worker['func_kwargs']
+    return func(data[(slice(start, stop),) + selection], **func_kwargs)
+
+
+def _iter_frame_blocks(data, func, blocks, selection=(), n_workers=1, executor='thread', max_pending=None,
+                       func_kwargs=None):
+    """Yields func(data[start:stop, *selection], **func_kwargs) for each [start, stop) frame block, in block order.
+
+    Blocks are read and processed by a pool of n_workers threads, or processes when executor is 'process'. With
+    one worker, blocks are read in the caller's thread unless max_pending is given.
+    Process workers open HDF5-backed data read-only themselves and receive Zarr arrays, which pickle as a
+    reference to their store, with each block, so func must be picklable. func_kwargs are sent to each process
+    once, when it starts, so large arguments such as weight matrices are not pickled with every block. At most
+    max_pending blocks (2 * n_workers by default) are in flight, which bounds memory to a few blocks.
+    """
+    if executor not in ('thread', 'process'):
+        raise ValueError("executor must be 'thread' or 'process', got '%s'" % executor)
+    selection = tuple(selection)
+    func_kwargs = dict() if func_kwargs is None else func_kwargs
+    # a single worker only reads ahead when asked to through max_pending
+    if len(blocks) <= 1 or (n_workers <= 1 and max_pending is None):
+        for start, stop in blocks:
+            yield _apply_to_frame_block(func, start, stop, selection, data, func_kwargs)
+        return
+
+    if executor == 'process':
+        if isinstance(data, h5py.Dataset):
+            initargs = (data.file.filename, data.name, func_kwargs)
+            data = None
+        elif _is_zarr_array(data):
+            initargs = (None, None, func_kwargs)
+        else:
+            raise ValueError("executor='process' needs data read from an HDF5 or Zarr file")
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=n_workers, initializer=_init_frame_worker,
+                                                      initargs=initargs)
+        # the workers hold func_kwargs from their initializer
+        func_kwargs = None
+    else:
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=n_workers)
+    max_pending = max(max_pending or 2 * n_workers, 1)
+    pending = deque()
+    try:
+        for start, stop in blocks:
+            if len(pending) == max_pending:
+                yield pending.popleft().result()
+            pending.append(pool.submit(_apply_to_frame_block, func, start, stop, selection, data, func_kwargs))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _roi_traces(block, voxels, weights):
+    """Reduces a (time, x, y, z, channel) block to float32 (time, ROI, channel) traces.
+
+    Only the voxels (flat indices into the block's x, y, z axes) covered by the columns of the (ROI x voxel)
+    weight matrix are gathered, and all frames and channels are reduced with a single sparse matrix product.
+    """
+    n_frames, n_channels = block.shape[0], block.shape[-1]
+    # voxels x (time, channel), so that one product covers every frame and channel of the block
+    gathered = np.empty((len(voxels), n_frames, n_channels), dtype=np.float32)
+    gathered[...] = block.reshape(n_frames, -1, n_channels)[:, voxels, :].transpose(1, 0, 2)
+    traces = weights @ gathered.reshape(len(voxels), -1)
+    return np.asarray(traces).reshape(-1, n_frames, n_channels).transpose(1, 0, 2)
+
 
 @register_class('ImagingVolume', 'ndx-multichannel-volume')
 class ImagingVolume(NWBDataInterface):
@@ -116,6 +689,48 @@ class ImagingVolume(NWBDataInterface):
 
         for key, val in args_to_set.items():
             setattr(self, key, val)
+        self._channel_lookups = dict()
+
+    def _channel_lookup(self, order):
+        """Returns the cached channel -> position mapping for an OpticalChannelReferences order.
+
+        The mapping is rebuilt when the order's channel list or the optical channels of this volume are
+        replaced or change length.
+        """
+        channels = order.channels
+        token = (id(channels), len(channels), id(self.optical_channel_plus), len(self.optical_channel_plus))
+        cached = self._channel_lookups.get(id(order))
+        if cached is not None and cached[0] == token:
+            return cached[1]
+
+        descriptions = list(channels[:])
+        lookup = {description: i for i, description in enumerate(descriptions)}
+        for optical_channel in self.optical_channel_plus:
+            i = lookup.get(optical_channel.description)
+            if i is not None:
+                lookup.setdefault(optical_channel.name, i)
+                lookup.setdefault(float(optical_channel.emission_lambda), i)
+        self._channel_lookups[id(order)] = (token, lookup)
+        return lookup
+
+    def clear_channel_index(self):
+        """Drops the cached channel lookups, e.g. after editing a channel list in place."""
+        self._channel_lookups.clear()
+
+    def channel_index(self, channel, order=None):
+        """Returns the position of a channel along the channel axis of data ordered by ``order``.
+
+        ``channel`` is an index (int), a channel description such as '561-700-75m' or an OpticalChannelPlus name
+        (str), or an emission wavelength in nm (float). ``order`` is an OpticalChannelReferences and defaults to
+        Order_optical_channels. Lookups are served from a cache built on first use.
+        """
+        if isinstance(channel, (int, np.integer)):
+            return int(channel)
+        lookup = self._channel_lookup(self.Order_optical_channels if order is None else order)
+        try:
+            return lookup[float(channel) if isinstance(channel, (float, np.floating)) else channel]
+        except KeyError:
+            raise KeyError("ImagingVolume '%s' has no channel '%s'" % (self.name, channel)) from None
 
 @register_class('VolumeSegmentation', 'ndx-multichannel-volume')
 class VolumeSegmentation(DynamicTable):
@@ -129,12 +744,15 @@ class VolumeSegmentation(DynamicTable):
     ROI names should remain consistent between them.
     """
 
-    __fields__ = ('imaging_volume','name')
+    __fields__ = ('imaging_volume','name','label_volume')
 
     __columns__ = (
         {'name': 'image_mask', 'description': 'Image masks for each ROI'},
         {'name': 'voxel_mask', 'description': 'Voxel masks for each ROI', 'index': True},
-        {'name': 'color_voxel_mask', 'description': 'Color voxel masks for each ROI', 'index':True}
+        {'name': 'color_voxel_mask', 'description': 'Color voxel masks for each ROI', 'index':True},
+        {'name': 'numeric_voxel_mask', 'description': 'Numeric voxel masks for each ROI', 'index': True},
+        {'name': 'numeric_color_voxel_mask', 'description': 'Numeric color voxel masks for each ROI', 'index': True},
+        {'name': 'roi_ID', 'description': 'Cell ID of each ROI'}
     )
 
     @docval({'name': 'description', 'type': str,  # required
@@ -142,64 +760,836 @@ class VolumeSegmentation(DynamicTable):
             {'name': 'imaging_volume', 'type': ImagingVolume,  # required
              'doc': 'the ImagingVolume this ROI applies to'},
             {'name': 'name', 'type': str, 'doc': 'name of VolumeSegmentation.', 'default': None},
-            *get_docval(DynamicTable.__init__, 'id', 'columns', 'colnames'))
+            *get_docval(DynamicTable.__init__, 'id', 'columns', 'colnames'),
+            {'name': 'label_volume', 'type': 'array_data', 'default': None, 'shape': (None, None, None),
+             'doc': 'uint16 (x, y, z) label volume where the ROI in row i has the value i + 1. See set_label_volume'})
     def __init__(self, **kwargs):
-        imaging_volume = popargs('imaging_volume', kwargs)
+        imaging_volume, label_volume = popargs('imaging_volume', 'label_volume', kwargs)
         if kwargs['name'] is None:
             kwargs['name'] = imaging_volume.name
         super().__init__(**kwargs)
         self.imaging_volume = imaging_volume
+        self.label_volume = label_volume
+        self._spatial_indexes = dict()
+        self._label_boxes = None
 
     @docval({'name': 'voxel_mask', 'type': 'array_data', 'default': None,
              'doc': 'voxel mask for 3D ROIs: [(x1, y1, z1, weight1, ID), (x2, y2, z2, weight2, ID), ...]',
-             'shape': (None, 5)},
+             'shape': [(None, 5), (None,)]},
              {'name': 'color_voxel_mask', 'type': 'array_data', 'default': None,
              'doc': 'voxel mask for 3D ROIs with color information',
-             'shape': (None, 9)},
+             'shape': [(None, 9), (None,)]},
             {'name': 'image_mask', 'type': 'array_data', 'default': None,
              'doc': 'image with the same size of image where positive values mark this ROI',
              'shape': [[None]*3]},
             {'name': 'id', 'type': int, 'doc': 'the ID for the ROI', 'default': None},
+            {'name': 'layout', 'type': str, 'default': 'compound',
+             'doc': "'compound' stores the ID with every voxel in voxel_mask and color_voxel_mask, 'numeric' stores "
+                    "the voxels in numeric_voxel_mask and numeric_color_voxel_mask and the ID once in roi_ID"},
             allow_extra=True)
     def add_roi(self, **kwargs):
         """Add a Region Of Interest (ROI) data to this"""
-        voxel_mask, color_voxel_mask, image_mask = popargs('voxel_mask', 'color_voxel_mask', 'image_mask', kwargs)
+        voxel_mask, color_voxel_mask, image_mask, layout = popargs('voxel_mask', 'color_voxel_mask', 'image_mask',
+                                                                   'layout', kwargs)
         if image_mask is None and voxel_mask is None and color_voxel_mask is None:
             raise ValueError("Must provide 'image_mask' and/or 'voxel_mask' and/or 'color_voxel_mask'")
+        if layout not in ('compound', 'numeric'):
+            raise ValueError("layout must be 'compound' or 'numeric', got '%s'" % layout)
         rkwargs = dict(kwargs)
         if image_mask is not None:
             rkwargs['image_mask'] = image_mask
-        if voxel_mask is not None:
-            rkwargs['voxel_mask'] = voxel_mask
-        if color_voxel_mask is not None:
-            rkwargs['color_voxel_mask'] = color_voxel_mask
+        for column, mask, dtype, numeric_dtype in (
+                ('color_voxel_mask', color_voxel_mask, COLOR_VOXEL_MASK_DTYPE, NUMERIC_COLOR_VOXEL_MASK_DTYPE),
+                ('voxel_mask', voxel_mask, VOXEL_MASK_DTYPE, NUMERIC_VOXEL_MASK_DTYPE)):
+            if mask is None:
+                continue
+            if layout == 'compound':
+                rkwargs[column] = mask
+            else:
+                records = _as_voxel_records(mask, dtype)
+                numeric, roi_ids = _split_voxel_records(records, np.array([len(records)]), numeric_dtype)
+                rkwargs['numeric_' + column] = numeric
+                rkwargs['roi_ID'] = roi_ids[0]
         return super().add_row(**rkwargs)
 
+    @docval({'name': 'voxel_masks', 'type': (list, tuple), 'default': None,
+             'doc': 'one voxel mask per ROI, each a structured array or a list of (x, y, z, weight, ID) records'},
+            {'name': 'voxel_mask', 'type': 'array_data', 'default': None,
+             'doc': 'voxel masks of all ROIs concatenated into one structured array or list of records'},
+            {'name': 'voxel_mask_index', 'type': 'array_data', 'default': None,
+             'doc': 'end offset of each ROI in voxel_mask, as stored in a VectorIndex'},
+            {'name': 'id', 'type': 'array_data', 'doc': 'the IDs for the ROIs', 'default': None},
+            {'name': 'column', 'type': str, 'default': 'voxel_mask',
+             'doc': "the voxel mask column to fill, 'voxel_mask' or 'color_voxel_mask'"},
+            {'name': 'layout', 'type': str, 'default': 'compound',
+             'doc': "'compound' stores the ID with every voxel, 'numeric' stores the voxels in the numeric_ column "
+                    "and the ID of each ROI once in roi_ID"})
+    def add_rois(self, **kwargs):
+        """Add many ROIs at once from their voxel masks.
+
+        Arguments are validated once for the whole batch and the voxel mask column and its index are
+        extended directly instead of going through add_row for every ROI. The table must not have columns
+        other than the voxel mask column being filled (and roi_ID for the numeric layout), and must not have been
+        read from a file.
+        """
+        voxel_masks, voxel_mask, voxel_mask_index, ids, column, layout = popargs(
+            'voxel_masks', 'voxel_mask', 'voxel_mask_index', 'id', 'column', 'layout', kwargs)
+        if column not in ('voxel_mask', 'color_voxel_mask'):
+            raise ValueError("column must be 'voxel_mask' or 'color_voxel_mask', got '%s'" % column)
+        if layout not in ('compound', 'numeric'):
+            raise ValueError("layout must be 'compound' or 'numeric', got '%s'" % layout)
+        dtype = VOXEL_MASK_DTYPE if column == 'voxel_mask' else COLOR_VOXEL_MASK_DTYPE
+
+        if voxel_masks is not None:
+            if voxel_mask is not None or voxel_mask_index is not None:
+                raise ValueError("Provide either 'voxel_masks' or 'voxel_mask' and 'voxel_mask_index', not both")
+            per_roi = [_as_voxel_records(mask, dtype) for mask in voxel_masks]
+            records = np.concatenate(per_roi) if per_roi else np.zeros(0, dtype=dtype)
+            ends = np.cumsum([len(mask) for mask in per_roi], dtype=np.int64)
+        elif voxel_mask is not None and voxel_mask_index is not None:
+            records = _as_voxel_records(voxel_mask, dtype)
+            ends = np.asarray(voxel_mask_index, dtype=np.int64)
+            if len(ends) and (ends[-1] != len(records) or np.any(np.diff(ends, prepend=0) < 0)):
+                raise ValueError("voxel_mask_index must be non-decreasing and end at len(voxel_mask)")
+        else:
+            raise ValueError("Must provide 'voxel_masks' or both 'voxel_mask' and 'voxel_mask_index'")
+
+        n_rois = len(ends)
+        if ids is None:
+            ids = np.arange(len(self.id), len(self.id) + n_rois)
+        elif len(ids) != n_rois:
+            raise ValueError("Got %d ids for %d ROIs" % (len(ids), n_rois))
+        if n_rois == 0:
+            return
+
+        roi_ids = None
+        if layout == 'numeric':
+            numeric_dtype = NUMERIC_VOXEL_MASK_DTYPE if column == 'voxel_mask' else NUMERIC_COLOR_VOXEL_MASK_DTYPE
+            records, roi_ids = _split_voxel_records(records, ends, numeric_dtype)
+            column = 'numeric_' + column
+
+        filled = (column, 'roi_ID') if roi_ids is not None else (column,)
+        other_columns = [name for name in self.colnames if name not in filled]
+        if other_columns:
+            raise ValueError("add_rois cannot fill columns %s of VolumeSegmentation '%s'; use add_roi instead"
+                             % (other_columns, self.name))
+        existing = [self.id] + [self[name] for name in filled if name in self.colnames]
+        existing += [col.target for col in existing if isinstance(col, VectorIndex)]
+        if any(_is_file_backed(col.data) for col in existing):
+            raise ValueError("add_rois cannot extend VolumeSegmentation '%s' because it was read from a file; add the "
+                             "ROIs to a new VolumeSegmentation instead" % self.name)
+
+        descriptions = {col['name']: col['description'] for col in self.__columns__}
+        if column not in self.colnames:
+            self.add_column(name=column, description=descriptions[column], index=True)
+        if roi_ids is not None:
+            if 'roi_ID' not in self.colnames:
+                self.add_column(name='roi_ID', description=descriptions['roi_ID'])
+            self['roi_ID'].extend(roi_ids.tolist())
+
+        index = self[column]
+        offset = len(index.target)
+        # numeric rows are kept as records, the way add_roi stores them, so both can fill one column
+        index.target.extend(list(records) if roi_ids is not None else records.tolist())
+        # keep a single unsigned dtype across old and new offsets so the index is written consistently
+        index_dtype = np.promote_types(np.min_scalar_type(offset + int(ends[-1])), np.uint8)
+        new_index = np.concatenate((np.asarray(index.data, dtype=np.int64), ends + offset))
+        index.data[:] = list(new_index.astype(index_dtype))
+        self.id.extend(np.asarray(ids, dtype=np.int64).tolist())
+
+    @classmethod
+    @docval({'name': 'labels', 'type': 'array_data',
+             'doc': '3-D (x, y, z) integer label volume where each nonzero value marks one ROI'},
+            {'name': 'imaging_volume', 'type': ImagingVolume, 'doc': 'the ImagingVolume the ROIs apply to'},
+            {'name': 'description', 'type': str,
+             'doc': 'Description of image plane, recording wavelength, depth, etc.'},
+            {'name': 'name', 'type': str, 'doc': 'name of VolumeSegmentation.', 'default': None},
+            {'name': 'ID', 'type': dict, 'default': None,
+             'doc': 'Cell ID for each label value. Defaults to the label value as text'},
+            {'name': 'weights', 'type': 'array_data', 'default': None,
+             'doc': 'voxel weights with the same shape as labels. Defaults to 1 for every labeled voxel'},
+            {'name': 'storage', 'type': str, 'default': 'voxel_mask',
+             'doc': "'voxel_mask' to store the voxels of each ROI in the voxel_mask column, 'label_volume' to store "
+                    "a single compressed uint16 label volume instead (see set_label_volume), or 'both'"},
+            {'name': 'layout', 'type': str, 'default': 'compound',
+             'doc': "layout of the voxel masks, 'compound' or 'numeric' (see add_rois)"},
+            *_data_io_docval)
+    def from_labeled_volume(cls, **kwargs):
+        """Creates a VolumeSegmentation with one ROI per label of a label volume.
+
+        ROIs are ordered by label value and the label values are used as the ROI ids. With ``storage='label_volume'``
+        the table only holds the ids and the label volume, relabeled to row + 1; cell IDs and weights are only kept
+        in voxel masks. The compression arguments apply to the stored label volume.
+        """
+        labels, cell_ids, weights, storage, layout = popargs('labels', 'ID', 'weights', 'storage', 'layout', kwargs)
+        io_settings = popargs('compression', 'compression_opts', 'shuffle', 'chunks', 'backend', kwargs)
+        if storage not in ('voxel_mask', 'label_volume', 'both'):
+            raise ValueError("storage must be 'voxel_mask', 'label_volume' or 'both', got '%s'" % storage)
+        labels = np.asarray(labels)
+        coords = np.nonzero(labels)
+        voxel_labels = labels[coords]
+        order = np.argsort(voxel_labels, kind='stable')
+        voxel_labels = voxel_labels[order]
+        roi_labels, first, counts = np.unique(voxel_labels, return_index=True, return_counts=True)
+
+        volume_seg = cls(**kwargs)
+        if storage != 'voxel_mask':
+            if len(roi_labels) > np.iinfo(np.uint16).max:
+                raise ValueError("a uint16 label volume holds at most %d ROIs, got %d"
+                                 % (np.iinfo(np.uint16).max, len(roi_labels)))
+            rows = np.zeros(labels.shape, dtype=np.uint16)
+            rows[coords] = np.searchsorted(roi_labels, labels[coords]) + 1
+            if storage == 'label_volume':
+                volume_seg.id.extend(roi_labels.astype(np.int64).tolist())
+                volume_seg.set_label_volume(rows, None, *io_settings)
+                return volume_seg
+
+        records = np.zeros(len(order), dtype=VOXEL_MASK_DTYPE)
+        for axis, field in enumerate(('x', 'y', 'z')):
+            records[field] = coords[axis][order]
+        records['weight'] = 1. if weights is None else np.asarray(weights)[coords][order]
+        if cell_ids is None:
+            cell_ids = {}
+        roi_names = np.array([cell_ids.get(label, str(label)) for label in roi_labels.tolist()], dtype=object)
+        records['ID'] = np.repeat(roi_names, counts)
+
+        volume_seg.add_rois(voxel_mask=records, voxel_mask_index=first + counts, id=roi_labels, layout=layout)
+        if storage == 'both':
+            volume_seg.set_label_volume(rows, None, *io_settings)
+        return volume_seg
+
+    @classmethod
+    @docval({'name': 'matrix', 'type': None,
+             'doc': '(ROI x voxel) sparse matrix of voxel weights, a scipy.sparse matrix or array or a 2-D sparse.COO, '
+                    'with voxels in C order as returned by to_sparse'},
+            {'name': 'shape', 'type': (tuple, list), 'doc': '(x, y, z) shape of the volume the voxels index into'},
+            {'name': 'imaging_volume', 'type': ImagingVolume, 'doc': 'the ImagingVolume the ROIs apply to'},
+            {'name': 'description', 'type': str,
+             'doc': 'Description of image plane, recording wavelength, depth, etc.'},
+            {'name': 'name', 'type': str, 'doc': 'name of VolumeSegmentation.', 'default': None},
+            {'name': 'ID', 'type': 'array_data', 'default': None,
+             'doc': 'Cell ID of each row of matrix. Defaults to the ROI id as text'},
+            {'name': 'id', 'type': 'array_data', 'doc': 'the IDs for the ROIs. Defaults to the row numbers',
+             'default': None},
+            {'name': 'layout', 'type': str, 'default': 'compound',
+             'doc': "layout of the voxel masks, 'compound' or 'numeric' (see add_rois)"})
+    def from_sparse(cls, **kwargs):
+        """Creates a VolumeSegmentation with one ROI per row of a (ROI x voxel) sparse weight matrix.
+
+        The inverse of to_sparse: the stored nonzero entries of each row become the voxel mask of that ROI, in
+        increasing voxel order. The voxel masks are built from the CSR arrays directly, without a Python loop over
+        voxels.
+        """
+        from scipy import sparse
+
+        matrix, shape, cell_ids, ids, layout = popargs('matrix', 'shape', 'ID', 'id', 'layout', kwargs)
+        if hasattr(matrix, 'to_scipy_sparse'):
+            # sparse.COO
+            matrix = matrix.to_scipy_sparse()
+        matrix = sparse.csr_matrix(matrix)
+        shape = tuple(int(n) for n in shape[:3])
+        if matrix.ndim != 2 or matrix.shape[1] != int(np.prod(shape)):
+            raise ValueError("matrix must have shape (ROI, %d) for a volume of shape %s, got %s"
+                             % (int(np.prod(shape)), shape, matrix.shape))
+        matrix.sum_duplicates()
+        matrix.eliminate_zeros()
+        n_rois = matrix.shape[0]
+        if ids is None:
+            ids = np.arange(n_rois)
+        if cell_ids is None:
+            cell_ids = [str(i) for i in np.asarray(ids).tolist()]
+        if len(cell_ids) != n_rois:
+            raise ValueError("Got %d IDs for %d ROIs" % (len(cell_ids), n_rois))
+
+        ends = matrix.indptr[1:].astype(np.int64)
+        records = np.zeros(matrix.nnz, dtype=VOXEL_MASK_DTYPE)
+        for field, coords in zip(('x', 'y', 'z'), np.unravel_index(matrix.indices, shape)):
+            records[field] = coords
+        records['weight'] = matrix.data
+        records['ID'] = np.repeat(np.asarray(cell_ids, dtype=object), np.diff(ends, prepend=0))
+
+        volume_seg = cls(**kwargs)
+        volume_seg.add_rois(voxel_mask=records, voxel_mask_index=ends, id=ids, layout=layout)
+        return volume_seg
+
+    @docval({'name': 'labels', 'type': 'array_data', 'default': None, 'shape': (None, None, None),
+             'doc': '(x, y, z) label volume where the ROI in row i has the value i + 1 and background is 0. '
+                    'Defaults to rasterizing the voxel masks with voxel_to_label_volume'},
+            {'name': 'shape', 'type': (tuple, list), 'default': None,
+             'doc': '(x, y, z) shape used when rasterizing the voxel masks, see voxel_to_label_volume'},
+            *_data_io_docval)
+    def set_label_volume(self, **kwargs):
+        """Stores all ROIs of this table as a single uint16 label volume, chunked by z-slab and compressed.
+
+        This is a compact alternative to the image_mask column, which holds a dense volume per ROI: the image
+        mask of a single ROI is served from the label volume by get_image_mask. Where ROIs overlap, the later ROI
+        wins, so overlapping ROIs should also keep their voxel masks.
+        """
+        labels, shape = popargs('labels', 'shape', kwargs)
+        compression, compression_opts, shuffle, chunks, backend = popargs(
+            'compression', 'compression_opts', 'shuffle', 'chunks', 'backend', kwargs)
+        if self.label_volume is not None:
+            raise ValueError("VolumeSegmentation '%s' already has a label volume" % self.name)
+        if len(self) > np.iinfo(np.uint16).max:
+            raise ValueError("a uint16 label volume holds at most %d ROIs, got %d" % (np.iinfo(np.uint16).max,
+                                                                                       len(self)))
+        if labels is None:
+            labels = self.voxel_to_label_volume(shape=shape)
+        labels = np.asarray(labels)
+        if labels.size and labels.max() > len(self):
+            raise ValueError("label volume has label %d but VolumeSegmentation '%s' has %d ROIs"
+                             % (labels.max(), self.name, len(self)))
+        labels = labels.astype(np.uint16, copy=False)
+        if chunks is None:
+            chunks = _volume_chunks(labels.shape + (1,), labels.itemsize)[:3]
+        self.label_volume = _wrap_volume_data(labels, False, compression, compression_opts, shuffle, chunks, backend)
+        self._label_boxes = None
+
+    def _label_volume_boxes(self):
+        """Returns the (lower, upper) bounding boxes of every ROI in the label volume, upper exclusive.
+
+        The boxes are found in one pass over the label volume, one z-slab at a time, and cached.
+        """
+        from scipy import ndimage
+
+        data = _frame_data(self.label_volume, self.name)
+        n_rois = len(self)
+        if self._label_boxes is not None and len(self._label_boxes[0]) == n_rois:
+            return self._label_boxes
+        shape = get_data_shape(data)
+        z_step = (getattr(data, 'chunks', None) or _volume_chunks(tuple(shape) + (1,), 2))[2]
+        lower = np.full((n_rois, 3), np.iinfo(np.intp).max, dtype=np.intp)
+        upper = np.zeros((n_rois, 3), dtype=np.intp)
+        for z in range(0, shape[2], z_step):
+            slab = np.asarray(data[:, :, z:z + z_step])
+            for row, box in enumerate(ndimage.find_objects(slab, max_label=n_rois)):
+                if box is not None:
+                    lower[row] = np.minimum(lower[row], [box[0].start, box[1].start, box[2].start + z])
+                    upper[row] = np.maximum(upper[row], [box[0].stop, box[1].stop, box[2].stop + z])
+        self._label_boxes = (lower, upper)
+        return self._label_boxes
+
+    @docval({'name': 'row', 'type': int, 'doc': 'row (position in this table) of the ROI'},
+            {'name': 'crop', 'type': bool, 'default': False,
+             'doc': 'return only the bounding box of the ROI, with the (x, y, z) offset of the box in the volume'})
+    def get_image_mask(self, **kwargs):
+        """Returns the image mask of one ROI as a float32 (x, y, z) volume, or (mask, offset) with crop.
+
+        The mask comes from the image_mask column if there is one, else from the voxel mask of the ROI, else from
+        the label volume, reading only the bounding box of the ROI (the label volume has no weights, so they are 1).
+        """
+        row, crop = popargs('row', 'crop', kwargs)
+        if not -len(self) <= row < len(self):
+            raise IndexError("row %d is out of range for VolumeSegmentation '%s' with %d ROIs"
+                             % (row, self.name, len(self)))
+        row = row % len(self)
+        if 'image_mask' in self:
+            mask = np.asarray(self['image_mask'][row], dtype=np.float32)
+        elif 'voxel_mask' in self or 'numeric_voxel_mask' in self:
+            mask = self.voxel_to_image(self._voxel_mask_source('voxel_mask')[row], shape=self._volume_shape())
+        elif self.label_volume is not None:
+            data = _frame_data(self.label_volume, self.name)
+            lower, upper = (bounds[row] for bounds in self._label_volume_boxes())
+            if np.any(upper <= lower):
+                lower = upper = np.zeros(3, dtype=np.intp)
+            box = tuple(slice(int(a), int(b)) for a, b in zip(lower, upper))
+            cropped = np.asarray(data[box]) == row + 1
+            if crop:
+                return cropped.astype(np.float32), tuple(int(a) for a in lower)
+            mask = np.zeros(get_data_shape(data), dtype=np.float32)
+            mask[box] = cropped
+        else:
+            raise ValueError("VolumeSegmentation '%s' has no image_mask, voxel_mask or label_volume" % self.name)
+        if not crop:
+            return mask
+        coords = np.nonzero(mask)
+        if len(coords[0]) == 0:
+            return np.zeros((0, 0, 0), dtype=np.float32), (0, 0, 0)
+        lower = tuple(int(c.min()) for c in coords)
+        return mask[tuple(slice(a, int(c.max()) + 1) for a, c in zip(lower, coords))], lower
+
     @staticmethod
-    def voxel_to_image(voxel_mask):
-        """Converts a #D pixel_mask of a ROI into an image_mask."""
-        image_matrix = np.zeros(np.shape(voxel_mask))
-        npmask = np.asarray(voxel_mask)
-        x_coords = npmask[:, 0].astype(np.int32)
-        y_coords = npmask[:, 1].astype(np.int32)
-        z_coords = npmask[:, 2].astype(np.int32)
-        weights = npmask[:, -1]
-        image_matrix[y_coords, x_coords, z_coords] = weights
+    def voxel_to_image(voxel_mask, shape=None):
+        """Converts a 3D voxel_mask of a ROI into an image_mask.
+
+        The image has the given (x, y, z) shape, or just encloses the voxels if no shape is given.
+        """
+        coords, weights = _voxel_mask_arrays(voxel_mask)
+        if shape is None:
+            shape = coords.max(axis=0) + 1 if len(coords) else (0, 0, 0)
+        image_matrix = np.zeros(tuple(shape)[:3], dtype=np.float32)
+        image_matrix[coords[:, 0], coords[:, 1], coords[:, 2]] = weights
         return image_matrix
 
+    @docval({'name': 'row', 'type': int, 'doc': 'row (position in this table) of the ROI'},
+            {'name': 'column', 'type': str, 'default': 'voxel_mask',
+             'doc': "the voxel mask to read, 'voxel_mask' or 'color_voxel_mask'"})
+    def get_voxel_mask(self, **kwargs):
+        """Returns the voxel mask of one ROI as a structured array with the voxel_mask (or color_voxel_mask) dtype.
+
+        The result is the same whether the ROI is stored in the compound layout or in the numeric layout, where
+        the ID of the ROI is read from roi_ID.
+        """
+        row, column = popargs('row', 'column', kwargs)
+        dtype = VOXEL_MASK_DTYPE if column == 'voxel_mask' else COLOR_VOXEL_MASK_DTYPE
+        if column in self:
+            return _as_voxel_records(self[column][row], dtype)
+        index = self._voxel_mask_source(column)
+        if index is None:
+            raise ValueError("VolumeSegmentation '%s' has no column '%s'" % (self.name, column))
+        numeric_dtype = NUMERIC_VOXEL_MASK_DTYPE if column == 'voxel_mask' else NUMERIC_COLOR_VOXEL_MASK_DTYPE
+        numeric = _as_voxel_records(index[row], numeric_dtype)
+        records = np.empty(len(numeric), dtype=dtype)
+        for field in numeric_dtype.names:
+            records[field] = numeric[field]
+        records['ID'] = self['roi_ID'][row]
+        return records
+
+    @docval({'name': 'shape', 'type': (tuple, list), 'default': None,
+             'doc': '(x, y, z) shape of the output volume. Defaults to the shape of the MultiChannelVolume that '
+                    'shares this ImagingVolume, or to the extent of the voxels if there is none'},
+            {'name': 'weighted', 'type': bool, 'default': False,
+             'doc': 'store voxel weights instead of ROI labels'},
+            {'name': 'column', 'type': str, 'default': 'voxel_mask',
+             'doc': "the voxel mask column to read, 'voxel_mask' or 'color_voxel_mask'"})
+    def voxel_to_label_volume(self, **kwargs):
+        """Rasterizes the voxel masks of all ROIs into a single volume in one pass.
+
+        ROI ``i`` (its row position in this table) is labeled ``i + 1`` and background is 0, using the smallest
+        unsigned integer dtype that fits the number of ROIs. With ``weighted=True`` the voxel weights are stored
+        in a float32 volume instead. Where ROIs overlap, the later ROI wins.
+        """
+        shape, weighted, column = popargs('shape', 'weighted', 'column', kwargs)
+        coords, weights, roi_idx, _ = self._voxel_mask_table_arrays(column)
+        if shape is None:
+            shape = self._volume_shape()
+        if shape is None:
+            shape = coords.max(axis=0) + 1 if len(coords) else (0, 0, 0)
+        shape = tuple(int(n) for n in shape[:3])
+
+        if weighted:
+            volume = np.zeros(shape, dtype=np.float32)
+            values = weights
+        else:
+            volume = np.zeros(shape, dtype=np.min_scalar_type(len(self)))
+            values = roi_idx + 1
+        volume[coords[:, 0], coords[:, 1], coords[:, 2]] = values
+        return volume
+
+    def _voxel_mask_source(self, column):
+        """Returns the VectorIndex of a voxel mask column, or None if its voxels are read from the label volume.
+
+        'voxel_mask' and 'color_voxel_mask' are served from their numeric_ columns in the numeric layout.
+        """
+        if column in self:
+            return self[column]
+        if column in ('voxel_mask', 'color_voxel_mask') and 'numeric_' + column in self:
+            return self['numeric_' + column]
+        if column == 'voxel_mask' and self.label_volume is not None:
+            return None
+        raise ValueError("VolumeSegmentation '%s' has no column '%s'" % (self.name, column))
+
+    def _voxel_mask_table_arrays(self, column='voxel_mask'):
+        """Returns coordinates, weights and the ROI row of every voxel in a voxel mask column, grouped by ROI, and
+        the end offset of each ROI.
+
+        A table stored only as a label volume serves 'voxel_mask' from it, with weights of 1.
+        """
+        index = self._voxel_mask_source(column)
+        if index is None:
+            labels = np.asarray(_frame_data(self.label_volume, self.name)[...])
+            coords = np.nonzero(labels)
+            values = labels[coords]
+            order = np.argsort(values, kind='stable')
+            roi_idx = values[order].astype(np.intp) - 1
+            ends = np.cumsum(np.bincount(roi_idx, minlength=len(self)), dtype=np.int64)
+            return np.stack(coords, axis=1)[order].astype(np.intp), np.ones(len(order), np.float32), roi_idx, ends
+        coords, weights = _voxel_mask_arrays(index.target.data)
+        ends = np.asarray(index.data[:], dtype=np.int64)
+        roi_idx = np.repeat(np.arange(len(ends)), np.diff(ends, prepend=0))
+        return coords, weights, roi_idx, ends
+
+    def _voxel_mask_ids(self, roi_idx, column='voxel_mask'):
+        """Returns the cell ID of every voxel of a voxel mask column, in the order of _voxel_mask_table_arrays.
+
+        roi_idx is the ROI row of every voxel. Voxels served from the label volume have an empty ID.
+        """
+        index = self._voxel_mask_source(column)
+        if index is None:
+            return np.full(len(roi_idx), '', dtype=object)
+        if index.target.name.startswith('numeric_'):
+            return np.asarray(self['roi_ID'].data[:], dtype=object)[roi_idx]
+        data = index.target.data
+        if isinstance(data, HDMFDataset):
+            data = data.dataset
+        if hasattr(data, 'fields'):
+            ids = data.fields('ID')[()]
+        elif getattr(getattr(data, 'dtype', None), 'names', None):
+            ids = np.asarray(data['ID'])
+        else:
+            ids = [voxel[4] for voxel in data]
+        return np.array([i.decode() if isinstance(i, bytes) else i for i in ids], dtype=object)
+
+    def _spatial_index(self, column):
+        """Returns the cached spatial index of a voxel mask column, building it on first use.
+
+        The index holds the linearized (x, y, z) position of every voxel in sorted order with its ROI row, plus
+        the voxel range, bounding box and centroid of every ROI. It is rebuilt when ROIs or voxels are added.
+        """
+        index = self._voxel_mask_source(column)
+        if index is None:
+            token = (len(self), id(self.label_volume))
+        else:
+            token = (len(index.data), len(index.target.data))
+        cached = self._spatial_indexes.get(column)
+        if cached is not None and cached[0] == token:
+            return cached[1]
+
+        coords, _, roi_idx, ends = self._voxel_mask_table_arrays(column)
+        starts = np.concatenate(([0], ends[:-1])).astype(np.int64)
+        nonempty = ends > starts
+        extent = tuple(int(n) for n in coords.max(axis=0) + 1) if len(coords) else (1, 1, 1)
+        keys = np.ravel_multi_index(tuple(coords.T), extent)
+        order = np.argsort(keys, kind='stable')
+
+        # empty ROIs get an inverted box and a NaN centroid so that no query matches them
+        lower = np.full((len(ends), 3), np.iinfo(np.intp).max, dtype=np.intp)
+        upper = np.full((len(ends), 3), -1, dtype=np.intp)
+        centroids = np.full((len(ends), 3), np.nan)
+        if nonempty.any():
+            lower[nonempty] = np.minimum.reduceat(coords, starts[nonempty], axis=0)
+            upper[nonempty] = np.maximum.reduceat(coords, starts[nonempty], axis=0)
+            centroids[nonempty] = (np.add.reduceat(coords, starts[nonempty], axis=0)
+                                   / (ends - starts)[nonempty, np.newaxis])
+
+        spatial_index = dict(coords=coords, extent=extent, keys=keys[order], rows=roi_idx[order],
+                             starts=starts, ends=ends, lower=lower, upper=upper, centroids=centroids, tree=None)
+        self._spatial_indexes[column] = (token, spatial_index)
+        return spatial_index
+
+    def clear_spatial_index(self):
+        """Drops the cached spatial indexes and label volume bounding boxes, e.g. after editing voxel masks in place."""
+        self._spatial_indexes.clear()
+        self._label_boxes = None
+
+    @docval({'name': 'point', 'type': 'array_data', 'shape': [3], 'doc': '(x, y, z) voxel coordinates'},
+            {'name': 'column', 'type': str, 'default': 'voxel_mask',
+             'doc': "the voxel mask column to search, 'voxel_mask' or 'color_voxel_mask'"})
+    def rois_at(self, **kwargs):
+        """Returns the rows (positions in this table) of the ROIs that contain a voxel, in ascending order.
+
+        Lookups are a binary search in the spatial index, which is built on first use and cached.
+        """
+        point, column = popargs('point', 'column', kwargs)
+        spatial_index = self._spatial_index(column)
+        point = tuple(int(c) for c in point)
+        if any(c < 0 or c >= n for c, n in zip(point, spatial_index['extent'])):
+            return []
+        key = np.ravel_multi_index(point, spatial_index['extent'])
+        lo, hi = np.searchsorted(spatial_index['keys'], [key, key + 1])
+        return sorted(set(spatial_index['rows'][lo:hi].tolist()))
+
+    @docval({'name': 'start', 'type': 'array_data', 'shape': [3], 'doc': '(x, y, z) lower corner of the box'},
+            {'name': 'stop', 'type': 'array_data', 'shape': [3],
+             'doc': '(x, y, z) upper corner of the box, exclusive like a slice stop'},
+            {'name': 'exact', 'type': bool, 'default': True,
+             'doc': 'require a voxel of the ROI inside the box. If False, intersecting bounding boxes are enough'},
+            {'name': 'column', 'type': str, 'default': 'voxel_mask',
+             'doc': "the voxel mask column to search, 'voxel_mask' or 'color_voxel_mask'"})
+    def rois_in_box(self, **kwargs):
+        """Returns the rows of the ROIs that intersect the box [start, stop), in ascending order.
+
+        Candidates are found from the cached per-ROI bounding boxes; with ``exact=True`` only their voxels are
+        then tested against the box.
+        """
+        start, stop, exact, column = popargs('start', 'stop', 'exact', 'column', kwargs)
+        spatial_index = self._spatial_index(column)
+        start, stop = np.asarray(start, dtype=np.intp), np.asarray(stop, dtype=np.intp)
+        rows = np.flatnonzero(np.all((spatial_index['lower'] < stop) & (spatial_index['upper'] >= start), axis=1))
+        if not exact or len(rows) == 0:
+            return rows.tolist()
+
+        starts, ends = spatial_index['starts'][rows], spatial_index['ends'][rows]
+        voxels = np.concatenate([np.arange(a, b) for a, b in zip(starts, ends)])
+        coords = spatial_index['coords'][voxels]
+        inside = np.all((coords >= start) & (coords < stop), axis=1)
+        hits = np.add.reduceat(inside, np.concatenate(([0], np.cumsum(ends - starts)[:-1])))
+        return rows[hits > 0].tolist()
+
+    @docval({'name': 'point', 'type': 'array_data', 'shape': [3], 'doc': '(x, y, z) position, may be fractional'},
+            {'name': 'k', 'type': int, 'default': 1, 'doc': 'number of ROIs to return'},
+            {'name': 'column', 'type': str, 'default': 'voxel_mask',
+             'doc': "the voxel mask column to search, 'voxel_mask' or 'color_voxel_mask'"})
+    def nearest_rois(self, **kwargs):
+        """Returns the rows of the k ROIs with the nearest centroids and the distances to those centroids.
+
+        Uses a KD-tree over the ROI centroids (scipy.spatial), built on first use and cached with the spatial
+        index. Distances are in voxels. Fewer than k rows are returned if the table has fewer non-empty ROIs.
+        """
+        point, k, column = popargs('point', 'k', 'column', kwargs)
+        spatial_index = self._spatial_index(column)
+        if spatial_index['tree'] is None:
+            from scipy.spatial import cKDTree
+
+            tree_rows = np.flatnonzero(spatial_index['ends'] > spatial_index['starts'])
+            spatial_index['tree'] = (cKDTree(spatial_index['centroids'][tree_rows]), tree_rows)
+        tree, tree_rows = spatial_index['tree']
+        k = min(k, len(tree_rows))
+        if k == 0:
+            return [], []
+        distances, positions = tree.query(np.asarray(point, dtype=np.float64), k=[i + 1 for i in range(k)])
+        return tree_rows[positions].tolist(), distances.tolist()
+
+    @docval({'name': 'shape', 'type': (tuple, list), 'default': None,
+             'doc': '(x, y, z) shape of the volume. Defaults to the shape of the label volume or of a '
+                    'MultiChannelVolume in the same file sharing this ImagingVolume'},
+            {'name': 'column', 'type': str, 'default': 'voxel_mask',
+             'doc': "the voxel mask column holding the ROI weights, 'voxel_mask' or 'color_voxel_mask'"},
+            {'name': 'format', 'type': str, 'default': 'csr',
+             'doc': "a scipy.sparse format such as 'csr', 'csc' or 'coo', or 'COO' for a sparse.COO array "
+                    "(requires the sparse package)"})
+    def to_sparse(self, **kwargs):
+        """Returns all voxel masks as one float32 (ROI x voxel) sparse matrix of voxel weights.
+
+        Row i holds the ROI in row i of the table and columns are voxels in C order, matching a (x, y, z) volume
+        reshaped to one dimension; use numpy.unravel_index with the volume shape to recover voxel positions.
+        The matrix is built from the voxel mask arrays directly, without a Python loop over voxels. Weights of
+        voxels listed more than once in a ROI are summed. Cell IDs are not kept, see from_sparse.
+        """
+        shape, column, fmt = popargs('shape', 'column', 'format', kwargs)
+        if shape is None:
+            shape = self._volume_shape()
+            if shape is None:
+                raise ValueError("Cannot infer the volume shape of VolumeSegmentation '%s'; provide 'shape'"
+                                 % self.name)
+        matrix = self._roi_weight_matrix(shape, column=column, normalize=False)
+        if fmt == 'COO':
+            import sparse
+
+            return sparse.COO.from_scipy_sparse(matrix)
+        return matrix.asformat(fmt)
+
+    def _roi_weight_matrix(self, shape, column='voxel_mask', normalize=True):
+        """Returns the float32 (ROI x voxel) CSR matrix of voxel weights over a volume of the given (x, y, z) shape.
+
+        Columns are voxels in C order, matching a (x, y, z) volume reshaped to one dimension. With normalize, each
+        row is divided by the total weight of the ROI so that products give weighted means.
+        """
+        from scipy import sparse
+
+        coords, weights, roi_idx, ends = self._voxel_mask_table_arrays(column)
+        shape = tuple(int(n) for n in shape[:3])
+        if len(coords) and np.any(coords.max(axis=0) >= shape):
+            raise ValueError("voxel masks of VolumeSegmentation '%s' extend beyond the volume shape %s"
+                             % (self.name, shape))
+        voxel_idx = np.ravel_multi_index(tuple(coords.T), shape)
+        matrix = sparse.csr_matrix((weights, (roi_idx, voxel_idx)), shape=(len(ends), int(np.prod(shape))),
+                                   dtype=np.float32)
+        matrix.sum_duplicates()
+        if normalize:
+            totals = np.asarray(matrix.sum(axis=1)).ravel()
+            totals[totals == 0] = 1.
+            matrix = sparse.diags((1. / totals).astype(np.float32)) @ matrix
+        return matrix.tocsr()
+
+    @docval({'name': 'series', 'type': TimeSeries,
+             'doc': 'MultiChannelVolumeSeries with (time, x, y, z, channel) data covering the ROIs of this table'},
+            {'name': 'channels', 'type': (int, str, float, list, tuple), 'default': None,
+             'doc': 'channel, or list of channels, given by index, name, description or emission wavelength. '
+                    'Defaults to all channels'},
+            {'name': 'frames_per_chunk', 'type': int, 'default': None,
+             'doc': 'frames read and reduced at once. Defaults to a multiple of the HDF5 chunking of about 64 MiB'},
+            {'name': 'n_workers', 'type': int, 'default': 1,
+             'doc': 'number of processes (threads for in-memory data) reducing frame chunks in parallel'},
+            {'name': 'normalize', 'type': bool, 'default': True,
+             'doc': 'return weighted means over the voxels of each ROI instead of weighted sums'},
+            {'name': 'column', 'type': str, 'default': 'voxel_mask',
+             'doc': "the voxel mask column holding the ROI weights, 'voxel_mask' or 'color_voxel_mask'"})
+    def extract_traces(self, **kwargs):
+        """Extracts the fluorescence trace of every ROI from a MultiChannelVolumeSeries.
+
+        The voxel masks are turned into one sparse (ROI x voxel) weight matrix and the series is streamed in
+        blocks of frames, each reduced with a single sparse matrix product covering all requested channels.
+        Returns a float32 array of shape (time, ROI) for a single channel, or (time, ROI, channel) otherwise,
+        with ROIs in row order. The (time, ROI) traces can be stored in a RoiResponseSeries whose rois come
+        from create_roi_table_region.
+
+        With n_workers > 1, frame blocks are reduced in a process pool whose workers open the HDF5 or Zarr file
+        read-only, or in a thread pool for in-memory data; results are assembled in frame order.
+        """
+        series, channels, frames_per_chunk, n_workers, normalize, column = popargs(
+            'series', 'channels', 'frames_per_chunk', 'n_workers', 'normalize', 'column', kwargs)
+        data = _frame_data(series.data, series.name)
+        shape = get_data_shape(data)
+        if len(shape) != 5:
+            raise ValueError("series data must be (time, x, y, z, channel), got shape %s" % (shape,))
+
+        single_channel = channels is not None and not isinstance(channels, (list, tuple))
+        if channels is None:
+            channel_idx = np.arange(shape[4])
+        else:
+            imaging_volume = getattr(series, 'imaging_volume', None)
+            to_index = imaging_volume.channel_index if imaging_volume is not None else int
+            channel_idx = np.array([to_index(c) for c in ([channels] if single_channel else channels)],
+                                   dtype=np.intp)
+        selection, reorder = _channel_selection(channel_idx)
+
+        # restrict reads to the bounding box of all ROIs and the product to the voxels they cover
+        weights = self._roi_weight_matrix(shape[1:4], column=column, normalize=normalize)
+        voxels = np.unique(weights.indices)
+        traces = np.zeros((shape[0], weights.shape[0], len(np.unique(channel_idx))), dtype=np.float32)
+        if len(voxels) == 0:
+            return traces[..., 0] if single_channel else _reorder_channels(traces, reorder)
+        coords = np.unravel_index(voxels, shape[1:4])
+        box = tuple(slice(int(c.min()), int(c.max()) + 1) for c in coords)
+        box_voxels = np.ravel_multi_index(tuple(c - b.start for c, b in zip(coords, box)),
+                                          tuple(b.stop - b.start for b in box))
+
+        blocks = _frame_blocks(data, frames_per_chunk)
+        executor = 'process' if isinstance(data, h5py.Dataset) or _is_zarr_array(data) else 'thread'
+        # the weights go to each worker process once, instead of with every block
+        func_kwargs = dict(voxels=box_voxels, weights=weights[:, voxels].tocsr())
+        results = _iter_frame_blocks(data, _roi_traces, blocks, selection=box + (selection,), n_workers=n_workers,
+                                     executor=executor, func_kwargs=func_kwargs)
+        for (start, stop), block in zip(blocks, results):
+            traces[start:stop] = block
+
+        traces = _reorder_channels(traces, reorder)
+        return traces[..., 0] if single_channel else traces
+
+    @docval({'name': 'volume', 'type': 'MultiChannelVolume',
+             'doc': 'MultiChannelVolume whose RGBW_channels give the colors of the voxels'},
+            {'name': 'layout', 'type': str, 'default': None,
+             'doc': "layout of the new column, 'compound' (color_voxel_mask) or 'numeric' (numeric_color_voxel_mask). "
+                    "Defaults to the layout of the voxel masks"})
+    def add_color_voxel_mask(self, **kwargs):
+        """Fills the color voxel mask column from the voxel masks and the RGBW channels of a MultiChannelVolume.
+
+        Voxels are grouped by z-slab, following the chunking of the volume, and each slab is read once over the
+        bounding box of its voxels and the RGBW channels, so the volume is never loaded at once. Negative values
+        are stored as 0. Returns a pandas.DataFrame indexed by ROI id with the cell ID, the number of voxels and
+        the mean and median R, G, B and W of every ROI, e.g. for NeuroPAL identity assignment.
+        """
+        import pandas as pd
+
+        volume, layout = popargs('volume', 'layout', kwargs)
+        if layout is None:
+            layout = 'numeric' if 'roi_ID' in self else 'compound'
+        if layout not in ('compound', 'numeric'):
+            raise ValueError("layout must be 'compound' or 'numeric', got '%s'" % layout)
+        column = 'color_voxel_mask' if layout == 'compound' else 'numeric_color_voxel_mask'
+        if column in self:
+            raise ValueError("VolumeSegmentation '%s' already has a '%s' column" % (self.name, column))
+
+        coords, weights, roi_idx, ends = self._voxel_mask_table_arrays('voxel_mask')
+        ids = self._voxel_mask_ids(roi_idx)
+        data = volume.data_view()
+        shape = get_data_shape(data)
+        if len(coords) and np.any(coords.max(axis=0) >= shape[:3]):
+            raise ValueError("voxel masks of VolumeSegmentation '%s' extend beyond the shape %s of MultiChannelVolume "
+                             "'%s'" % (self.name, tuple(shape[:3]), volume.name))
+        # RGBW_channels may repeat a channel
+        selection, reorder = _channel_selection(volume.RGBW_channels[:])
+        z_step = (getattr(data, 'chunks', None) or _volume_chunks(shape, np.dtype(data.dtype).itemsize))[2]
+
+        colors = np.zeros((len(coords), 4), dtype=np.uint32)
+        order = np.argsort(coords[:, 2], kind='stable')
+        bounds = np.searchsorted(coords[order, 2], np.arange(0, shape[2] + z_step, z_step))
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            voxels = order[start:stop]
+            if len(voxels) == 0:
+                continue
+            slab_coords = coords[voxels]
+            lower, upper = slab_coords.min(axis=0), slab_coords.max(axis=0) + 1
+            slab = np.asarray(data[lower[0]:upper[0], lower[1]:upper[1], lower[2]:upper[2], selection])
+            local = slab_coords - lower
+            colors[voxels] = np.maximum(_reorder_channels(slab[local[:, 0], local[:, 1], local[:, 2]], reorder), 0)
+
+        dtype = COLOR_VOXEL_MASK_DTYPE if layout == 'compound' else NUMERIC_COLOR_VOXEL_MASK_DTYPE
+        records = np.empty(len(coords), dtype=dtype)
+        for axis, field in enumerate(('x', 'y', 'z')):
+            records[field] = coords[:, axis]
+        records['weight'] = weights
+        if layout == 'compound':
+            records['ID'] = ids
+        for channel, field in enumerate('RGBW'):
+            records[field] = colors[:, channel]
+        descriptions = {col['name']: col['description'] for col in self.__columns__}
+        rows = np.split(records, ends[:-1]) if len(ends) else []
+        self.add_column(name=column, description=descriptions[column], data=[list(row) for row in rows], index=True)
+
+        counts = np.diff(ends, prepend=0)
+        starts = ends - counts
+        nonempty = counts > 0
+        means = np.full((len(ends), 4), np.nan)
+        medians = np.full((len(ends), 4), np.nan)
+        if nonempty.any():
+            means[nonempty] = np.add.reduceat(colors, starts[nonempty], axis=0) / counts[nonempty, np.newaxis]
+            lower_mid, upper_mid = (starts + (counts - 1) // 2)[nonempty], (starts + counts // 2)[nonempty]
+            for channel in range(4):
+                ranked = colors[np.lexsort((colors[:, channel], roi_idx)), channel].astype(np.float64)
+                medians[nonempty, channel] = (ranked[lower_mid] + ranked[upper_mid]) / 2
+        roi_ids = np.full(len(ends), '', dtype=object)
+        roi_ids[nonempty] = ids[starts[nonempty]]
+        summary = pd.DataFrame({'ID': roi_ids, 'n_voxels': counts}, index=pd.Index(np.asarray(self.id[:]), name='id'))
+        for channel, field in enumerate('RGBW'):
+            summary['mean_' + field] = means[:, channel]
+        for channel, field in enumerate('RGBW'):
+            summary['median_' + field] = medians[:, channel]
+        return summary
+
+    def _volume_shape(self):
+        """Returns the (x, y, z) shape of the label volume, or of a MultiChannelVolume in the same file sharing this
+        ImagingVolume."""
+        if self.label_volume is not None:
+            return tuple(get_data_shape(self.label_volume)[:3])
+        root = self.get_ancestor(data_type='NWBFile')
+        if root is None:
+            return None
+        for obj in root.objects.values():
+            if isinstance(obj, MultiChannelVolume) and obj.imaging_volume is self.imaging_volume:
+                return get_data_shape(obj.data)[:3]
+        return None
+
     @staticmethod
-    def image_to_pixel(image_mask):
-        """Converts an image_mask of a ROI into a pixel_mask"""
-        voxel_mask = []
-        it = np.nditer(image_mask, flags=['multi_index'])
-        while not it.finished:
-            weight = it[0][()]
-            if weight > 0:
-                x = it.multi_index[0]
-                y = it.multi_index[1]
-                z = it.multi_index[2]
-                voxel_mask.append([x, y, z, weight])
-            it.iternext()
+    def image_to_pixel(image_mask, ID=''):
+        """Converts an image_mask of a ROI into a voxel_mask.
+
+        Only voxels with a positive weight are kept. The result is a structured array with the
+        ``voxel_mask`` compound dtype (see ``VOXEL_MASK_DTYPE``) and can be passed straight to
+        ``add_roi``. Sparse masks (``scipy.sparse`` matrices/arrays or ``sparse.COO``) are read from
+        their stored coordinates, so the cost scales with the number of nonzero voxels rather than
+        with the size of the volume. 2-D sparse matrices are treated as a single z-plane.
+        """
+        if hasattr(image_mask, 'tocoo'):
+            # scipy.sparse matrices and arrays
+            image_mask = image_mask.tocoo()
+        if hasattr(image_mask, 'coords'):
+            # scipy.sparse.coo_array (n-D) or sparse.COO
+            coords = np.asarray(image_mask.coords)
+            weights = np.asarray(image_mask.data)
+        elif hasattr(image_mask, 'row') and hasattr(image_mask, 'col'):
+            # scipy.sparse.coo_matrix
+            coords = np.stack((image_mask.row, image_mask.col))
+            weights = np.asarray(image_mask.data)
+        else:
+            image_mask = np.asarray(image_mask)
+            if image_mask.ndim != 3:
+                raise ValueError("image_mask must be 3-D, got shape %s" % (image_mask.shape,))
+            coords = np.nonzero(image_mask > 0)
+            weights = image_mask[coords]
+            coords = np.asarray(coords)
+
+        keep = weights > 0
+        coords = coords[:, keep]
+        if coords.shape[0] > 3:
+            raise ValueError("image_mask must have at most 3 dimensions, got %d" % coords.shape[0])
+
+        voxel_mask = np.zeros(coords.shape[1], dtype=VOXEL_MASK_DTYPE)
+        for axis, field in zip(range(coords.shape[0]), ('x', 'y', 'z')):
+            voxel_mask[field] = coords[axis]
+        voxel_mask['weight'] = weights[keep]
+        voxel_mask['ID'] = ID
         return voxel_mask
 
     @docval({'name': 'description', 'type': str, 'doc': 'a brief description of what the region is'},
@@ -208,6 +1598,81 @@ class VolumeSegmentation(DynamicTable):
     def create_roi_table_region(self, **kwargs):
         return self.create_region(**kwargs)
     
+def _memmap_dataset(dataset):
+    """Returns a read-only numpy.memmap over an HDF5 dataset, or None if its bytes cannot be mapped directly.
+
+    Only contiguous datasets (which cannot have filters, so are never compressed) with allocated storage, a
+    fixed-size dtype and a plain file driver can be mapped.
+    """
+    if not isinstance(dataset, h5py.Dataset) or dataset.chunks is not None or dataset.dtype.hasobject:
+        return None
+    if dataset.file.driver not in ('sec2', 'stdio') or dataset.size == 0 or dataset.external:
+        return None
+    offset = dataset.id.get_offset()
+    if offset is None:
+        return None
+    return np.memmap(dataset.file.filename, dtype=dataset.dtype, mode='r', offset=offset, shape=dataset.shape)
+
+
+def _data_view(container):
+    """Returns the data of a volume container for slicing, memory-mapped when its dataset allows it.
+
+    The memmap is created on first use and cached on the container.
+    """
+    data = container.data.data if isinstance(container.data, DataIO) else container.data
+    view = getattr(container, '_mapped_data', None)
+    if view is None or view[0] is not data:
+        mapped = _memmap_dataset(data)
+        view = (data, data if mapped is None else mapped)
+        container._mapped_data = view
+    return view[1]
+
+
+def _block_reduce(block, factors, ufunc, dtype=None):
+    """Reduces blocks of factors[i] elements along each leading axis i of block with a ufunc.
+
+    Blocks at the upper edge may be partial; ufunc.reduceat reduces whatever elements they contain.
+    """
+    for axis, factor in enumerate(factors):
+        if factor > 1:
+            block = ufunc.reduceat(block, np.arange(0, block.shape[axis], factor), axis=axis, dtype=dtype)
+    return block
+
+
+def _block_counts(shape, factors):
+    """Returns the number of elements in each (possibly partial) block of a _block_reduce over shape."""
+    counts = np.ones((1,) * len(shape))
+    for axis, (n, factor) in enumerate(zip(shape, factors)):
+        starts = np.arange(0, n, factor)
+        per_axis = np.minimum(factor, n - starts).reshape((-1,) + (1,) * (len(shape) - axis - 1))
+        counts = counts * per_axis
+    return counts
+
+
+@register_class('VolumePyramidLevel', 'ndx-multichannel-volume')
+class VolumePyramidLevel(NWBData):
+    """A downsampled level of the data of a MultiChannelVolume."""
+
+    __nwbfields__ = ('downsampling',
+                     'resolution',
+                     'grid_spacing')
+
+    @docval(*get_docval(NWBData.__init__, 'name'),  # required
+            {'name': 'data', 'doc': 'downsampled (x, y, z, channel) data', 'type': ('array_data', 'data'),
+             'shape': [None]*4},
+            {'name': 'downsampling', 'type': 'array_data', 'shape': [3],
+             'doc': 'downsampling factor relative to the full-resolution data in x, y and z'},
+            {'name': 'resolution', 'type': 'array_data', 'shape': [3], 'doc': 'pixel resolution of this level'},
+            {'name': 'grid_spacing', 'type': 'array_data', 'shape': [3], 'default': None,
+             'doc': 'grid_spacing of the ImagingVolume scaled by downsampling'})
+    def __init__(self, **kwargs):
+        downsampling, resolution, grid_spacing = popargs('downsampling', 'resolution', 'grid_spacing', kwargs)
+        super().__init__(**kwargs)
+        self.downsampling = downsampling
+        self.resolution = resolution
+        self.grid_spacing = grid_spacing
+
+
 @register_class('MultiChannelVolume', 'ndx-multichannel-volume')
 class MultiChannelVolume(NWBDataInterface):
     """An imaging plane and its metadata."""
@@ -217,7 +1682,8 @@ class MultiChannelVolume(NWBDataInterface):
                      'RGBW_channels',
                      'data',
                      'imaging_volume',
-                     'Order_optical_channels'
+                     'Order_optical_channels',
+                     {'name': 'volume_pyramid_levels', 'child': True}
                      )
 
     @docval(*get_docval(NWBDataInterface.__init__, 'name'),  # required
@@ -225,8 +1691,13 @@ class MultiChannelVolume(NWBDataInterface):
             {'name': 'imaging_volume', 'type': ImagingVolume, 'doc': 'the Imaging Volume the data was generated from'},
             {'name': 'description', 'type': str, 'doc':'description of image'},
             {'name': 'RGBW_channels', 'doc': 'which channels in image map to RGBW', 'type': 'array_data', 'shape':[None]},
-            {'name': 'data', 'doc': 'Volumetric multichannel data', 'type': 'array_data', 'shape':[None]*4},
-            {'name': 'Order_optical_channels', 'type':OpticalChannelReferences, 'doc':'Order of the optical channels in the data'}
+            {'name': 'data', 'doc': 'Volumetric multichannel data', 'type': ('array_data', _DASK_ARRAY),
+             'shape':[None]*4},
+            {'name': 'Order_optical_channels', 'type':OpticalChannelReferences, 'doc':'Order of the optical channels in the data'},
+            {'name': 'volume_pyramid_levels', 'type': (list, tuple), 'default': None,
+             'doc': 'VolumePyramidLevels with downsampled copies of data, from finest to coarsest'},
+            *_dtype_docval,
+            *_data_io_docval
     )
     
     def __init__(self, **kwargs):
@@ -235,10 +1706,872 @@ class MultiChannelVolume(NWBDataInterface):
                        'RGBW_channels',
                        'data',
                        'imaging_volume',
-                       'Order_optical_channels'
+                       'Order_optical_channels',
+                       'volume_pyramid_levels'
                        )
         args_to_set = popargs_to_dict(keys_to_set, kwargs)
+        conversion, value_range = popargs('dtype_conversion', 'value_range', kwargs)
+        io_settings = popargs('compression', 'compression_opts', 'shuffle', 'chunks', 'backend', kwargs)
+        data, dtype_conversion_stats = _convert_volume_data(
+            args_to_set['data'], conversion, value_range, "MultiChannelVolume '%s'" % kwargs['name'])
+        args_to_set['data'] = _wrap_volume_data(data, False, *io_settings)
         super().__init__(**kwargs)
+        self.dtype_conversion_stats = dtype_conversion_stats
+
+        for key, val in args_to_set.items():
+            setattr(self, key, val)
+
+    def channel_index(self, channel):
+        """Returns the position along the channel axis of a channel given by index, name, description or
+        emission wavelength."""
+        try:
+            return self.imaging_volume.channel_index(channel, order=self.Order_optical_channels)
+        except KeyError:
+            raise KeyError("MultiChannelVolume '%s' has no channel '%s'" % (self.name, channel)) from None
+
+    def data_view(self):
+        """Returns data for NumPy-style slicing with as few copies as possible.
+
+        For an uncompressed, contiguous dataset in an HDF5 file this is a read-only numpy.memmap over the bytes of
+        the dataset, so that channel and z-plane slices are views instead of fresh arrays. Chunked or compressed
+        datasets, and data in memory, are returned as they are. The accessors of this class read through it.
+        """
+        return _data_view(self)
+
+    def _read(self, z, channels):
+        """Reads the given z selection of the given channels, touching only the hyperslabs that are needed."""
+        data = self.data_view()
+        if isinstance(channels, (int, np.integer)):
+            return data[:, :, z, channels]
+        selection, reorder = _channel_selection(channels)
+        return _reorder_channels(data[:, :, z, selection], reorder)
+
+    @docval({'name': 'channel', 'type': (int, str, float),
+             'doc': 'channel index, name, description (e.g. 561-700-75m) or emission wavelength in nm'},
+            {'name': 'z', 'type': (int, slice), 'default': None, 'doc': 'z-plane or z-range to read. Defaults to all'})
+    def get_channel(self, **kwargs):
+        """Reads one channel, optionally restricted to a z-plane or z-range.
+
+        Returns a (x, y, z) array, or (x, y) if z is a single plane.
+        """
+        channel, z = popargs('channel', 'z', kwargs)
+        return self._read(slice(None) if z is None else z, self.channel_index(channel))
+
+    @docval({'name': 'start', 'type': int, 'doc': 'first z-plane of the slab'},
+            {'name': 'stop', 'type': int, 'doc': 'z-plane after the last plane of the slab'},
+            {'name': 'channels', 'type': (list, tuple), 'default': None,
+             'doc': 'channel indices, names or descriptions to read, in output order. Defaults to all channels'})
+    def get_zslab(self, **kwargs):
+        """Reads a slab of z-planes of some or all channels as an (x, y, z, channel) array."""
+        start, stop, channels = popargs('start', 'stop', 'channels', kwargs)
+        if channels is None:
+            return self.data_view()[:, :, start:stop, :]
+        return self._read(slice(start, stop), [self.channel_index(c) for c in channels])
+
+    @docval({'name': 'z', 'type': (int, slice), 'default': None, 'doc': 'z-plane or z-range to read. Defaults to all'})
+    def get_rgbw(self, **kwargs):
+        """Reads the channels listed in RGBW_channels as an (x, y, z, 4) RGBW composite.
+
+        Channels that are not part of the composite are not read. Returns (x, y, 4) if z is a single plane.
+        """
+        z = popargs('z', kwargs)
+        return self._read(slice(None) if z is None else z, [int(c) for c in self.RGBW_channels[:]])
+
+    @docval({'name': 'factors', 'type': (list, tuple), 'default': (2, 4, 8),
+             'doc': 'increasing downsampling factor of each level in x and y'},
+            {'name': 'downsample_z', 'type': bool, 'default': False,
+             'doc': 'also downsample z by the same factors'},
+            {'name': 'method', 'type': str, 'default': 'mean',
+             'doc': "how voxels are combined, 'mean' or 'max'"},
+            *_data_io_docval)
+    def build_pyramid(self, **kwargs):
+        """Builds downsampled copies of data in one streaming pass and stores them as volume_pyramid_levels.
+
+        data is read once, in z-slabs of about 64 MiB. Each level is reduced from the previous one when its factor
+        is a multiple of the previous factor, and from the slab otherwise. Only the slab and the levels, together
+        less than a third of data for factors of 2 and up, are held in memory. Each level is stored with its
+        factors and with resolution and the grid_spacing of the ImagingVolume scaled by them.
+        """
+        factors, downsample_z, method = popargs('factors', 'downsample_z', 'method', kwargs)
+        io_settings = popargs('compression', 'compression_opts', 'shuffle', 'chunks', 'backend', kwargs)
+        if self.volume_pyramid_levels is not None:
+            raise ValueError("MultiChannelVolume '%s' already has a pyramid" % self.name)
+        if method not in ('mean', 'max'):
+            raise ValueError("method must be 'mean' or 'max', got '%s'" % method)
+        factors = [int(f) for f in factors]
+        if not factors or factors[0] < 2 or np.any(np.diff(factors) <= 0):
+            raise ValueError("factors must be increasing and at least 2, got %s" % (factors,))
+        level_factors = [(f, f, f if downsample_z else 1) for f in factors]
+
+        data = self.data_view()
+        shape = tuple(int(n) for n in get_data_shape(data))
+        dtype = getattr(data, 'dtype', None)
+        dtype = np.dtype(dtype if dtype is not None else np.int16)
+        levels = [np.zeros(tuple(-(-n // f) for n, f in zip(shape[:3], fs)) + shape[3:], dtype=dtype)
+                  for fs in level_factors]
+
+        # z-slabs hold whole blocks of every level so that no block straddles two slabs
+        z_step = int(np.lcm.reduce([fs[2] for fs in level_factors]))
+        plane_bytes = max(shape[0] * shape[1] * shape[3] * dtype.itemsize, 1)
+        slab_z = max(1, _FRAME_BLOCK_TARGET_BYTES // plane_bytes // z_step) * z_step
+        ufunc = np.add if method == 'mean' else np.maximum
+        for z0 in range(0, shape[2], slab_z):
+            slab = np.asarray(data[:, :, z0:z0 + slab_z, :])
+            previous, previous_factors = None, None
+            for level, fs in zip(levels, level_factors):
+                if previous is not None and all(f % p == 0 for f, p in zip(fs, previous_factors)):
+                    reduced = _block_reduce(previous, [f // p for f, p in zip(fs, previous_factors)], ufunc)
+                else:
+                    reduced = _block_reduce(slab, fs, ufunc, dtype=np.int64 if method == 'mean' else None)
+                previous, previous_factors = reduced, fs
+                if method == 'mean':
+                    reduced = np.rint(reduced / _block_counts(slab.shape[:3], fs)[..., np.newaxis])
+                level[:, :, z0 // fs[2]:z0 // fs[2] + reduced.shape[2]] = reduced
+
+        resolution = np.asarray(self.resolution[:], dtype=np.float64)
+        grid_spacing = getattr(self.imaging_volume, 'grid_spacing', None)
+        pyramid = list()
+        for level, fs in zip(levels, level_factors):
+            pyramid.append(VolumePyramidLevel(
+                name = 'pyramid_%dx' % fs[0],
+                data = _wrap_volume_data(level, False, *io_settings),
+                downsampling = np.asarray(fs, dtype=np.uint16),
+                resolution = resolution[:3] * fs,
+                grid_spacing = None if grid_spacing is None else np.asarray(grid_spacing[:], dtype=np.float64) * fs
+            ))
+        self.volume_pyramid_levels = pyramid
+        return pyramid
+
+    @docval({'name': 'shape', 'type': (list, tuple),
+             'doc': 'minimum output size in (x, y) or (x, y, z)'})
+    def pyramid_level(self, **kwargs):
+        """Returns the coarsest pyramid level whose data is at least shape in every given dimension.
+
+        Returns this MultiChannelVolume itself if no downsampled level is large enough or there is no pyramid.
+        Like the returned VolumePyramidLevel, it has data and resolution.
+        """
+        shape = popargs('shape', kwargs)
+        # levels read from a file come back in name order, so sort them by their downsampling
+        levels = sorted(self.volume_pyramid_levels or [], key=lambda level: int(np.prod(level.downsampling[:])))
+        for level in reversed(levels):
+            if all(n >= m for n, m in zip(get_data_shape(level.data), shape)):
+                return level
+        return self
+
+    @docval({'name': 'shape', 'type': (list, tuple),
+             'doc': 'minimum output size in (x, y) or (x, y, z)'},
+            {'name': 'channels', 'type': (list, tuple), 'default': None,
+             'doc': 'channel indices, names or descriptions to read, in output order. Defaults to all channels'})
+    def get_overview(self, **kwargs):
+        """Reads the coarsest level of the pyramid that is at least shape, as an (x, y, z, channel) array."""
+        shape, channels = popargs('shape', 'channels', kwargs)
+        level = self.pyramid_level(shape)
+        data = _data_view(level)
+        if channels is None:
+            return data[:]
+        selection, reorder = _channel_selection([self.channel_index(c) for c in channels])
+        return _reorder_channels(data[:, :, :, selection], reorder)
+
+    @classmethod
+    @docval({'name': 'paths', 'type': (str, list, tuple),
+             'doc': 'TIFF/OME-TIFF stack with all channels, or one stack per channel in channel order'},
+            {'name': 'axes', 'type': str, 'default': None,
+             'doc': "axis order of each stack, e.g. 'ZCYX'. Defaults to the axes reported by tifffile"},
+            allow_extra=True)
+    def from_tiff(cls, **kwargs):
+        """Creates a MultiChannelVolume whose data is read lazily from TIFF stacks while it is written.
+
+        The remaining keyword arguments are passed to the constructor.
+        """
+        paths, axes = popargs('paths', 'axes', kwargs)
+        return cls(data=TiffVolumeIterator(paths=paths, axes=axes), **kwargs)
+
+
+class FrameBlockCache:
+    """Read-only, NumPy-sliceable view of (frame, ...) data that keeps recently read blocks of frames in memory.
+
+    Frames are read in blocks of whole frames, by default one HDF5 chunk long along the frame axis, and
+    decoded blocks are kept in an LRU cache bounded by max_bytes. After each read, up to prefetch blocks on each
+    side of the frames read are loaded in a background thread. Slicing follows NumPy semantics and returns
+    read-only arrays, which may be views of cached blocks. hits, misses and prefetched count block lookups served
+    from the cache (or from a prefetch in flight), blocks read on demand and blocks loaded in the background.
+    """
+
+    @docval({'name': 'data', 'type': None, 'doc': '(frame, ...) data to read from, e.g. an h5py.Dataset'},
+            {'name': 'max_bytes', 'type': int, 'default': 256 * 1024 ** 2,
+             'doc': 'maximum size of the decoded frame blocks kept in memory, in bytes'},
+            {'name': 'prefetch', 'type': int, 'default': 2,
+             'doc': 'number of blocks on each side of every read loaded in a background thread. 0 disables prefetch'},
+            {'name': 'frames_per_block', 'type': int, 'default': None,
+             'doc': 'frames read and cached together. Defaults to the chunk length of data along the frame axis'})
+    def __init__(self, **kwargs):
+        data, max_bytes, prefetch, frames_per_block = popargs('data', 'max_bytes', 'prefetch', 'frames_per_block',
+                                                              kwargs)
+        self.data = data
+        self.shape = tuple(get_data_shape(data))
+        self.dtype = np.dtype(data.dtype)
+        self.chunks = getattr(data, 'chunks', None)
+        self.max_bytes = max_bytes
+        self.prefetch = prefetch
+        self.frames_per_block = frames_per_block or (self.chunks[0] if self.chunks else 1)
+        self.n_blocks = -(-self.shape[0] // self.frames_per_block)
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.nbytes = 0
+        self._blocks = OrderedDict()
+        self._pending = dict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[:], dtype=dtype)
+
+    def _read_block(self, block):
+        start = block * self.frames_per_block
+        frames = np.asarray(self.data[start:start + self.frames_per_block])
+        frames.flags.writeable = False
+        return frames
 
+    def _store(self, block, frames):
+        with self._lock:
+            if frames.nbytes > self.max_bytes or block in self._blocks:
+                return
+            self._blocks[block] = frames
+            self.nbytes += frames.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._blocks.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def _prefetch_block(self, block):
+        try:
+            frames = self._read_block(block)
+            self._store(block, frames)
+            with self._lock:
+                self.prefetched += 1
+            return frames
+        finally:
+            # a failed read is forgotten, so that the block is read again on demand or prefetched later
+            with self._lock:
+                self._pending.pop(block, None)
+
+    def _get_block(self, block):
+        with self._lock:
+            frames = self._blocks.get(block)
+            if frames is not None:
+                self._blocks.move_to_end(block)
+                self.hits += 1
+                return frames
+            future = self._pending.get(block)
+        if future is not None:
+            try:
+                frames = future.result()
+            except Exception:
+                # the background read failed; read the block again here, raising if it fails again
+                pass
+            else:
+                with self._lock:
+                    self.hits += 1
+                return frames
+        with self._lock:
+            self.misses += 1
+        frames = self._read_block(block)
+        self._store(block, frames)
+        return frames
+
+    def _schedule_prefetch(self, first, last):
+        if self.prefetch <= 0:
+            return
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                                                                   thread_name_prefix='FrameBlockCache')
+        # nearest blocks first, alternating forward and backward since viewers scrub both ways
+        for distance in range(1, self.prefetch + 1):
+            for block in (last + distance, first - distance):
+                if not 0 <= block < self.n_blocks:
+                    continue
+                with self._lock:
+                    if block in self._blocks or block in self._pending:
+                        continue
+                    self._pending[block] = self._executor.submit(self._prefetch_block, block)
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        if len(key) == 0 or key[0] is Ellipsis:
+            frame_key, rest = slice(None), key
+        else:
+            frame_key, rest = key[0], key[1:]
+        if isinstance(frame_key, (int, np.integer)):
+            # single frames, the common case when scrubbing, skip the general index handling
+            frame = int(frame_key) + self.shape[0] if frame_key < 0 else int(frame_key)
+            if not 0 <= frame < self.shape[0]:
+                raise IndexError("frame index %d out of range for %d frames" % (frame_key, self.shape[0]))
+            block = frame // self.frames_per_block
+            frames = self._get_block(block)
+            self._schedule_prefetch(block, block)
+            return frames[(frame - block * self.frames_per_block,) + rest]
+        if isinstance(frame_key, slice):
+            frames = range(*frame_key.indices(self.shape[0]))
+            if len(frames) == 0:
+                return np.empty((0,) + self.shape[1:], dtype=self.dtype)[(slice(None),) + rest]
+            start, stop = min(frames[0], frames[-1]), max(frames[0], frames[-1]) + 1
+        else:
+            frame_key = np.asarray(frame_key)
+            if not np.issubdtype(frame_key.dtype, np.integer):
+                raise IndexError("frames must be selected with an integer, a slice or integer indices")
+            frame_key = np.where(frame_key < 0, frame_key + self.shape[0], frame_key)
+            if frame_key.size and (frame_key.min() < 0 or frame_key.max() >= self.shape[0]):
+                raise IndexError("frame index out of range for %d frames" % self.shape[0])
+            if frame_key.size == 0:
+                return np.empty((0,) + self.shape[1:], dtype=self.dtype)[(slice(None),) + rest]
+            start, stop = int(frame_key.min()), int(frame_key.max()) + 1
+
+        first, last = start // self.frames_per_block, (stop - 1) // self.frames_per_block
+        blocks = [self._get_block(block) for block in range(first, last + 1)]
+        self._schedule_prefetch(first, last)
+        offset = first * self.frames_per_block
+        frames = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+        if isinstance(frame_key, slice):
+            step = frame_key.step or 1
+            if step > 0:
+                local = slice(start - offset, stop - offset, step)
+            else:
+                local = slice(stop - 1 - offset, None if start == offset else start - offset - 1, step)
+        else:
+            local = frame_key - offset
+        return frames[(local,) + rest]
+
+    def clear(self):
+        """Drops all cached blocks and resets the counters."""
+        with self._lock:
+            self._blocks.clear()
+            self._pending.clear()
+            self.nbytes = 0
+            self.hits = self.misses = self.prefetched = 0
+
+    def close(self):
+        """Waits for prefetches in flight, stops the background thread and drops all cached blocks."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.clear()
+
+
+@register_class('MultiChannelVolumeSeries', 'ndx-multichannel-volume')
+class MultiChannelVolumeSeries(TimeSeries):
+    """Time series of volumetric data with multiple channels."""
+
+    __nwbfields__ = ('RGBW_channels',
+                     'imaging_volume',
+                     'device',
+                     'scan_line_rate',
+                     'binning',
+                     'pmt_gain',
+                     'exposure_time',
+                     'power',
+                     'data_resolution'
+                     )
+
+    @docval(*get_docval(TimeSeries.__init__, 'name'),  # required
+            {'name': 'data', 'doc': 'Multichannel volumetric images across frames (frame, x, y, z, channel)',
+             'type': ('array_data', 'data', TimeSeries, _DASK_ARRAY), 'shape': [None]*5},
+            {'name': 'resolution', 'type': 'array_data', 'doc': 'pixel resolution of each image', 'shape': [3]},
+            {'name': 'RGBW_channels', 'doc': 'which channels in image map to RGBW', 'type': 'array_data', 'shape': [4]},
+            {'name': 'imaging_volume', 'type': ImagingVolume, 'doc': 'the Imaging Volume the data was generated from'},
+            {'name': 'device', 'type': Device, 'doc': 'the device that was used to capture these images'},
+            {'name': 'unit', 'type': str, 'doc': 'The base unit of measurement (should be SI unit)', 'default': 'n/a'},
+            {'name': 'data_resolution', 'type': float, 'default': -1.0,
+             'doc': 'Smallest meaningful difference between values in data. If unknown, use -1.0.'},
+            {'name': 'scan_line_rate', 'type': float, 'doc': 'Lines imaged per second.', 'default': None},
+            {'name': 'binning', 'type': int, 'doc': 'Amount of pixels combined into bins; could be 1, 2, 4, 8, etc.',
+             'default': None},
+            {'name': 'pmt_gain', 'type': 'array_data', 'doc': 'Photomultiplier gain for each channel',
+             'shape': [None], 'default': None},
+            {'name': 'exposure_time', 'type': 'array_data', 'shape': [None], 'default': None,
+             'doc': 'Exposure time of the sample for each channel, in seconds'},
+            {'name': 'power', 'type': 'array_data', 'doc': 'Power of the excitation in mW for each channel, if known.',
+             'shape': [None], 'default': None},
+            *get_docval(TimeSeries.__init__, 'conversion', 'offset', 'timestamps', 'starting_time', 'rate',
+                        'comments', 'description', 'control', 'control_description', 'continuity'),
+            *_dtype_docval,
+            *_data_io_docval)
+    def __init__(self, **kwargs):
+        keys_to_set = ('RGBW_channels',
+                       'imaging_volume',
+                       'device',
+                       'scan_line_rate',
+                       'binning',
+                       'pmt_gain',
+                       'exposure_time',
+                       'power')
+        args_to_set = popargs_to_dict(keys_to_set, kwargs)
+        resolution, data_resolution = popargs('resolution', 'data_resolution', kwargs)
+        conversion, value_range = popargs('dtype_conversion', 'value_range', kwargs)
+        io_settings = popargs('compression', 'compression_opts', 'shuffle', 'chunks', 'backend', kwargs)
+        dtype_conversion_stats = None
+        if not isinstance(kwargs['data'], TimeSeries):
+            data, dtype_conversion_stats = _convert_volume_data(
+                kwargs['data'], conversion, value_range, "MultiChannelVolumeSeries '%s'" % kwargs['name'])
+            kwargs['data'] = _wrap_volume_data(data, True, *io_settings)
+        super().__init__(resolution=data_resolution, **kwargs)
+        self.dtype_conversion_stats = dtype_conversion_stats
+        self.frame_cache = None
+
+        # TimeSeries keeps the resolution of data values in 'resolution', which this type uses for the voxel scale
+        self.fields.pop('resolution')
+        self.resolution = resolution
+        self.data_resolution = data_resolution
         for key, val in args_to_set.items():
             setattr(self, key, val)
+
+    @classmethod
+    @docval({'name': 'frames', 'type': Iterable,
+             'doc': 'iterable of (x, y, z, channel) frames, e.g. a generator or iter_tiff_frames'},
+            {'name': 'n_frames', 'type': int, 'default': None,
+             'doc': 'number of frames, if known in advance. Fixes the maximum shape of data'},
+            {'name': 'timestamps', 'type': Iterable, 'default': None,
+             'doc': 'timestamps of the frames. An iterator is consumed in lockstep with frames'},
+            {'name': 'buffer_size', 'type': int, 'default': 1,
+             'doc': 'number of frames held in memory and written at once'},
+            allow_extra=True)
+    def from_frames(cls, **kwargs):
+        """Creates a MultiChannelVolumeSeries whose data is written frame by frame from an iterable.
+
+        Only the first frame is read up front, to determine the frame shape and dtype. The remaining keyword
+        arguments are passed to the constructor.
+        """
+        frames, n_frames, timestamps, buffer_size = popargs('frames', 'n_frames', 'timestamps', 'buffer_size',
+                                                            kwargs)
+        frames = iter(frames)
+        try:
+            first = np.asarray(next(frames))
+        except StopIteration:
+            raise ValueError("Cannot create a MultiChannelVolumeSeries from an empty iterable of frames")
+        if first.ndim != 4:
+            raise ValueError("frames must be (x, y, z, channel) arrays, got shape %s" % (first.shape,))
+        frames = itertools.chain([first], frames)
+
+        if timestamps is not None and not isinstance(timestamps, (list, tuple, np.ndarray)):
+            # round-robin writing of the two iterators keeps the tee buffer at about one frame
+            timestamp_pairs, frame_pairs = itertools.tee(zip(timestamps, frames))
+            frames = (frame for _, frame in frame_pairs)
+            timestamps = DataChunkIterator(data=(float(t) for t, _ in timestamp_pairs), maxshape=(n_frames,),
+                                           dtype=np.dtype(np.float64), buffer_size=buffer_size)
+        data = DataChunkIterator(data=frames, maxshape=(n_frames,) + first.shape, dtype=first.dtype,
+                                 buffer_size=buffer_size)
+        return cls(data=data, timestamps=timestamps, **kwargs)
+
+    def data_view(self):
+        """Returns data for NumPy-style slicing with as few copies as possible.
+
+        For an uncompressed, contiguous dataset in an HDF5 file this is a read-only numpy.memmap over the bytes of
+        the dataset, so that frame, channel and z-plane slices are views instead of fresh arrays. Chunked or
+        compressed datasets, and data in memory, are returned as they are. With enable_frame_cache, the
+        FrameBlockCache over them is returned instead.
+        """
+        if self.frame_cache is not None:
+            return self.frame_cache
+        return _data_view(self)
+
+    @docval(*get_docval(FrameBlockCache.__init__, 'max_bytes', 'prefetch', 'frames_per_block'))
+    def enable_frame_cache(self, **kwargs):
+        """Puts an LRU cache of decoded frame blocks behind data_view and returns it.
+
+        Meant for viewers that move back and forth over frames of chunked, compressed data, where every step would
+        otherwise read and decompress the same chunks again. The returned FrameBlockCache is sliced like data and
+        counts cache hits and misses.
+        """
+        self.disable_frame_cache()
+        self.frame_cache = FrameBlockCache(data=_data_view(self), **kwargs)
+        return self.frame_cache
+
+    def disable_frame_cache(self):
+        """Removes the frame cache from data_view, stopping its prefetch thread and freeing its blocks."""
+        if self.frame_cache is not None:
+            self.frame_cache.close()
+            self.frame_cache = None
+
+    def _frame_block_results(self, func, frames_per_chunk, n_workers, executor, max_pending):
+        data = _frame_data(self.data, self.name)
+        blocks = _frame_blocks(data, frames_per_chunk)
+        return blocks, _iter_frame_blocks(data, func, blocks, n_workers=n_workers, executor=executor,
+                                          max_pending=max_pending)
+
+    @docval({'name': 'func', 'type': Callable,
+             'doc': 'function mapping a (time, x, y, z, channel) block of frames to a (time, x, y, z, channel) '
+                    'block with the same number of frames'},
+            {'name': 'name', 'type': str, 'doc': 'name of the new MultiChannelVolumeSeries'},
+            *_frame_engine_docval,
+            allow_extra=True)
+    def map_frames(self, **kwargs):
+        """Applies func to blocks of frames and returns a new MultiChannelVolumeSeries with the results.
+
+        The data of the new series is an iterator: blocks are read, processed in the pool and written in frame
+        order when the series is written, so at most max_pending blocks are held in memory. Only the first
+        block is processed up front, to determine the output shape and dtype. Metadata and timing are copied
+        from this series (timestamps are linked) unless given as keyword arguments, e.g. resolution after
+        downsampling.
+        """
+        func, name, frames_per_chunk, n_workers, executor, max_pending = popargs(
+            'func', 'name', 'frames_per_chunk', 'n_workers', 'executor', 'max_pending', kwargs)
+        blocks, results = self._frame_block_results(func, frames_per_chunk, n_workers, executor, max_pending)
+        results = iter(results)
+        if not blocks:
+            raise ValueError("MultiChannelVolumeSeries '%s' has no frames to map" % self.name)
+        first = np.asarray(next(results))
+        if first.ndim != 5 or first.shape[0] != blocks[0][1] - blocks[0][0]:
+            raise ValueError("func must return a (time, x, y, z, channel) block with one frame per input frame, "
+                             "got shape %s for %d frames" % (first.shape, blocks[0][1] - blocks[0][0]))
+        frames = (frame for block in itertools.chain([first], results) for frame in block)
+        data = DataChunkIterator(data=frames, maxshape=(blocks[-1][1],) + first.shape[1:], dtype=first.dtype,
+                                 buffer_size=first.shape[0])
+
+        for key in ('resolution', 'RGBW_channels', 'pmt_gain', 'exposure_time', 'power'):
+            value = getattr(self, key)
+            kwargs.setdefault(key, None if value is None else np.asarray(value[:]))
+        for key in ('imaging_volume', 'device', 'unit', 'scan_line_rate', 'binning', 'conversion', 'offset',
+                    'comments', 'description'):
+            kwargs.setdefault(key, getattr(self, key))
+        if 'timestamps' not in kwargs and 'rate' not in kwargs:
+            if self.timestamps is not None:
+                kwargs['timestamps'] = self
+            else:
+                kwargs.update(rate=self.rate, starting_time=self.starting_time)
+        return type(self)(name=name, data=data, **kwargs)
+
+    @docval({'name': 'func', 'type': Callable,
+             'doc': 'function mapping a (time, x, y, z, channel) block of frames to a partial result'},
+            {'name': 'reduce', 'type': Callable,
+             'doc': 'function combining two partial results, e.g. numpy.maximum or operator.add'},
+            {'name': 'initial', 'type': None, 'default': None,
+             'doc': 'starting value of the reduction. Defaults to the result of the first block'},
+            *_frame_engine_docval)
+    def reduce_frames(self, **kwargs):
+        """Applies func to blocks of frames and combines the results in frame order with reduce.
+
+        For example a maximum projection over time is
+        ``series.reduce_frames(lambda block: block.max(axis=0), numpy.maximum)``. Blocks are processed in the
+        pool while the results of earlier blocks are being combined, with at most max_pending blocks in flight.
+        """
+        func, reduce, initial = popargs('func', 'reduce', 'initial', kwargs)
+        _, results = self._frame_block_results(func, *popargs('frames_per_chunk', 'n_workers', 'executor',
+                                                              'max_pending', kwargs))
+        if initial is None:
+            return functools.reduce(reduce, results)
+        return functools.reduce(reduce, results, initial)
+
+    @docval({'name': 'batch', 'type': int, 'default': 1, 'doc': 'number of frames in each yielded block'},
+            {'name': 'prefetch', 'type': int, 'default': 2,
+             'doc': 'number of batches read ahead in a background thread. 0 reads each batch when it is requested'},
+            {'name': 'channels', 'type': (list, tuple), 'default': None,
+             'doc': 'channel indices, names or descriptions to read, in output order. Defaults to all channels'},
+            {'name': 'z', 'type': (int, slice), 'default': None, 'doc': 'z-plane or z-range to read. Defaults to all'},
+            {'name': 'start', 'type': int, 'default': 0, 'doc': 'first frame'},
+            {'name': 'stop', 'type': int, 'default': None, 'doc': 'frame after the last frame. Defaults to all frames'},
+            {'name': 'executor', 'type': str, 'default': 'thread',
+             'doc': "'thread', or 'process' to read batches of data in an HDF5 or Zarr file in a worker process"})
+    def iter_frames(self, **kwargs):
+        """Iterates over batches of frames, reading the next batches in the background.
+
+        Yields (batch, x, y, z, channel) arrays in frame order, the last one possibly shorter, or (batch, x, y,
+        channel) if z is a single plane. The channel and z selections are part of each read, so only the requested
+        hyperslabs are read and decompressed. While the consumer works on one batch, up to prefetch further batches
+        are read, which keeps the disk busy during CPU-bound processing. h5py holds the GIL while it decompresses,
+        so for compressed HDF5 data and a consumer that runs Python code, executor='process' overlaps better than
+        a thread. Batches are fresh arrays that the consumer may modify. Stopping the iteration early, e.g. with
+        break, waits for the reads in flight.
+        """
+        batch, prefetch, channels, z, start, stop, executor = popargs('batch', 'prefetch', 'channels', 'z', 'start',
+                                                                      'stop', 'executor', kwargs)
+        if batch < 1:
+            raise ValueError("batch must be at least 1, got %d" % batch)
+        data = _frame_data(self.data, self.name)
+        shape = get_data_shape(data)
+        start, stop, _ = slice(start, stop).indices(shape[0])
+
+        func = None
+        channel_selection = slice(None)
+        if channels is not None:
+            channel_selection, reorder = _channel_selection([self.imaging_volume.channel_index(c) for c in channels])
+            if reorder is not None:
+                func = functools.partial(np.take, indices=reorder, axis=-1)
+        selection = (slice(None), slice(None), slice(None) if z is None else z, channel_selection)
+
+        blocks = [(block_start, min(block_start + batch, stop)) for block_start in range(start, stop, batch)]
+        if func is None:
+            # slices of in-memory data are views, copy them so that batches never alias data
+            func = np.array if isinstance(data, np.ndarray) else np.asarray
+        yield from _iter_frame_blocks(data, func, blocks, selection, executor=executor,
+                                      max_pending=prefetch + 1 if prefetch > 0 else None)
+
+
+def _as_affine_transforms(transforms):
+    """Returns per-frame transforms as a float32 (frame, 3, 4) array of affine matrices.
+
+    Accepts (frame, 3) translations, (frame, 3, 4) affine matrices or (frame, 4, 4) homogeneous matrices.
+    """
+    transforms = np.asarray(transforms, dtype=np.float32)
+    if transforms.ndim == 2 and transforms.shape[1] == 3:
+        affine = np.zeros((len(transforms), 3, 4), dtype=np.float32)
+        affine[:, :, :3] = np.eye(3, dtype=np.float32)
+        affine[:, :, 3] = transforms
+        return affine
+    if transforms.ndim == 3 and transforms.shape[1:] == (4, 4):
+        if not np.allclose(transforms[:, 3], [0, 0, 0, 1]):
+            raise ValueError("the last row of homogeneous transforms must be (0, 0, 0, 1)")
+        return np.ascontiguousarray(transforms[:, :3])
+    if transforms.ndim == 3 and transforms.shape[1:] == (3, 4):
+        return transforms
+    raise ValueError("transforms must be (frame, 3) translations or (frame, 3, 4) or (frame, 4, 4) affine "
+                     "matrices, got shape %s" % (transforms.shape,))
+
+
+@register_class('VolumeMotionCorrection', 'ndx-multichannel-volume')
+class VolumeMotionCorrection(NWBDataInterface):
+    """Per-frame 3-D rigid or affine transforms registering the frames of a MultiChannelVolumeSeries."""
+
+    __nwbfields__ = ('transforms',
+                     'original',
+                     'reference_frame')
+
+    @docval({'name': 'name', 'type': str, 'doc': 'the name of this container', 'default': 'VolumeMotionCorrection'},
+            {'name': 'original', 'type': MultiChannelVolumeSeries, 'doc': 'the series whose frames are registered'},
+            {'name': 'transforms', 'type': 'array_data',
+             'doc': 'transform of each frame from registered to recorded voxel positions: (frame, 3) translations, '
+                    '(frame, 3, 4) affine matrices or (frame, 4, 4) homogeneous matrices'},
+            {'name': 'reference_frame', 'type': ('int', 'uint'), 'default': None,
+             'doc': 'frame of the original series that defines the registered space'},
+            {'name': 'cache_size', 'type': int, 'default': 16,
+             'doc': 'number of registered frames kept in memory by get_registered'})
+    def __init__(self, **kwargs):
+        original, transforms, reference_frame, cache_size = popargs('original', 'transforms', 'reference_frame',
+                                                                    'cache_size', kwargs)
+        if not isinstance(transforms, (HDMFDataset, h5py.Dataset)) and not _is_zarr_array(transforms):
+            transforms = _as_affine_transforms(transforms)
+        n_frames = get_data_shape(original.data)[0]
+        if n_frames is not None and len(transforms) != n_frames:
+            raise ValueError("Got %d transforms for the %d frames of MultiChannelVolumeSeries '%s'"
+                             % (len(transforms), n_frames, original.name))
+        super().__init__(**kwargs)
+        self.original = original
+        self.transforms = transforms
+        self.reference_frame = None if reference_frame is None else np.uint32(reference_frame)
+        self.cache_size = cache_size
+        self._registered_cache = OrderedDict()
+
+    def clear_cache(self):
+        """Drops the registered frames kept by get_registered."""
+        self._registered_cache.clear()
+
+    @docval({'name': 'frame', 'type': int, 'doc': 'frame to read'},
+            {'name': 'x', 'type': slice, 'default': None, 'doc': 'x-range of the registered space. Defaults to all'},
+            {'name': 'y', 'type': slice, 'default': None, 'doc': 'y-range of the registered space. Defaults to all'},
+            {'name': 'z', 'type': slice, 'default': None, 'doc': 'z-range of the registered space. Defaults to all'},
+            {'name': 'channels', 'type': (list, tuple), 'default': None,
+             'doc': 'channel indices, names or descriptions to read, in output order. Defaults to all channels'},
+            {'name': 'order', 'type': int, 'default': 1,
+             'doc': 'spline order of the resampling, 0 (nearest) to 5. 1 is trilinear'},
+            {'name': 'cval', 'type': float, 'default': 0.,
+             'doc': 'value of registered voxels that fall outside the recorded frame'})
+    def get_registered(self, **kwargs):
+        """Reads a sub-volume of one frame resampled into the registered space, as an (x, y, z, channel) array.
+
+        Only the bounding box of the recorded frame that the requested sub-volume maps to is read, and each
+        channel is resampled from it with one scipy.ndimage.affine_transform call. Results are float32, or the
+        dtype of data for order 0, and the last cache_size of them are kept in an LRU cache so that moving back
+        and forth over frames with the same view does not read or resample again. The returned arrays are shared
+        with the cache and must not be modified.
+        """
+        from scipy import ndimage
+
+        frame, x, y, z, channels, order, cval = popargs('frame', 'x', 'y', 'z', 'channels', 'order', 'cval', kwargs)
+        data = self.original.data_view()
+        shape = get_data_shape(data)
+        if frame < 0:
+            frame += shape[0]
+        if not 0 <= frame < shape[0]:
+            raise IndexError("frame %d is out of range for %d frames" % (frame, shape[0]))
+        box = tuple((s or slice(None)).indices(n)[:2] for s, n in zip((x, y, z), shape[1:4]))
+        if any((s or slice(None)).step not in (None, 1) for s in (x, y, z)):
+            raise ValueError("x, y and z must be contiguous ranges")
+        if channels is None:
+            channels = list(range(shape[4]))
+        else:
+            channels = [self.original.imaging_volume.channel_index(c) for c in channels]
+
+        key = (frame, box, tuple(channels), order, cval)
+        registered = self._registered_cache.get(key)
+        if registered is not None:
+            self._registered_cache.move_to_end(key)
+            return registered
+
+        transform = np.asarray(self.transforms[frame], dtype=np.float64)
+        linear, translation = transform[:, :3], transform[:, 3]
+        out_start = np.array([start for start, _ in box], dtype=np.float64)
+        out_shape = tuple(max(stop - start, 0) for start, stop in box)
+        dtype = np.dtype(data.dtype) if order == 0 else np.dtype(np.float32)
+        # channel-first so that each channel is a contiguous output of affine_transform
+        registered = np.full((len(channels),) + out_shape, cval, dtype=dtype)
+
+        # an affine map sends the corners of the requested box to the corners of the region it reads from
+        corners = np.array(list(itertools.product(*[(0, max(n - 1, 0)) for n in out_shape])), dtype=np.float64)
+        sources = (corners + out_start) @ linear.T + translation
+        margin = order // 2 + 1
+        lower = np.maximum(np.floor(sources.min(axis=0)).astype(np.int64) - margin, 0)
+        upper = np.minimum(np.ceil(sources.max(axis=0)).astype(np.int64) + margin + 1, shape[1:4])
+        if min(out_shape) > 0 and np.all(upper > lower):
+            selection, reorder = _channel_selection(channels)
+            # a frame slice keeps numpy from moving the channel axis first when mixing an integer and a list
+            source = np.asarray(data[frame:frame + 1, lower[0]:upper[0], lower[1]:upper[1], lower[2]:upper[2],
+                                     selection])[0]
+            offset = linear @ out_start + translation - lower
+            for channel, position in enumerate(range(len(channels)) if reorder is None else reorder):
+                ndimage.affine_transform(source[..., position], linear, offset=offset, output_shape=out_shape,
+                                         output=registered[channel], order=order, mode='constant', cval=cval)
+
+        registered = np.moveaxis(registered, 0, -1)
+        registered.flags.writeable = False
+        self._registered_cache[key] = registered
+        while len(self._registered_cache) > max(self.cache_size, 0):
+            self._registered_cache.popitem(last=False)
+        return registered
+
+
+def _to_xyzc(image, axes):
+    """Reorders an image with the given axes (a string of X, Y, Z and C) to (x, y, z, channel).
+
+    Missing Z or C axes are added as singleton dimensions.
+    """
+    axes = axes.upper()
+    if len(axes) != image.ndim or set(axes) - set('XYZC') or len(set(axes)) != len(axes):
+        raise ValueError("axes '%s' do not describe an image of shape %s" % (axes, image.shape))
+    for axis in 'ZC':
+        if axis not in axes:
+            image = image[..., np.newaxis]
+            axes += axis
+    return np.transpose(image, [axes.index(axis) for axis in 'XYZC'])
+
+
+def _cast_chunk(chunk, dtype, stats=None):
+    """Casts a chunk to an integer dtype, rounding and clipping values outside of its range and zeroing NaN.
+
+    The number of values, and of those with a fractional part, clipped below, above or NaN, are added to stats if
+    given.
+    """
+    chunk = np.asarray(chunk)
+    if chunk.dtype == dtype or np.can_cast(chunk.dtype, dtype):
+        if stats is not None:
+            stats.add(values=chunk.size)
+        return chunk.astype(dtype, copy=False)
+    info = np.iinfo(dtype)
+    if np.issubdtype(chunk.dtype, np.integer):
+        source = np.iinfo(chunk.dtype)
+        above = int(np.count_nonzero(chunk > info.max)) if source.max > info.max else 0
+        below = int(np.count_nonzero(chunk < info.min)) if source.min < info.min else 0
+        if stats is not None:
+            stats.add(values=chunk.size, above=above, below=below)
+        return np.clip(chunk, max(source.min, info.min), min(source.max, info.max)).astype(dtype)
+    nan = np.isnan(chunk)
+    rounded = np.rint(chunk)
+    if stats is not None:
+        n_nan = int(np.count_nonzero(nan))
+        # NaN compares unequal to itself and is counted separately
+        stats.add(values=chunk.size, rounded=int(np.count_nonzero(rounded != chunk)) - n_nan,
+                  below=int(np.count_nonzero(rounded < info.min)), above=int(np.count_nonzero(rounded > info.max)),
+                  nan=n_nan)
+    chunk = np.clip(rounded, info.min, info.max)
+    chunk[nan] = 0
+    return chunk.astype(dtype)
+
+
+def _open_tiff(path, axes=None):
+    """Returns a lazy (x, y, z, channel) view of the first image series of a TIFF/OME-TIFF file."""
+    import tifffile
+
+    if axes is None:
+        with tifffile.TiffFile(path) as tif:
+            axes = tif.series[0].axes
+        # tifffile labels the planes of plain multi-page files as Q or I, and RGB samples as S
+        if 'Z' not in axes:
+            axes = axes.replace('Q', 'Z', 1).replace('I', 'Z', 1)
+        if 'C' not in axes:
+            axes = axes.replace('S', 'C', 1)
+    try:
+        image = tifffile.memmap(path, mode='r')
+    except ValueError:
+        # compressed or fragmented image data is decoded page by page into a temporary memory-mapped file
+        image = tifffile.imread(path, out='memmap')
+    return _to_xyzc(image, axes)
+
+
+class TiffVolumeIterator(GenericDataChunkIterator):
+    """Reads (x, y, z, channel) volume data from TIFF/OME-TIFF stacks one chunk at a time.
+
+    Uncompressed stacks are memory-mapped. Each chunk is read, reordered and cast to the int16 dtype of the
+    spec on its own, so peak memory stays near one chunk regardless of the size of the stacks.
+    """
+
+    @docval({'name': 'paths', 'type': (str, list, tuple),
+             'doc': 'TIFF/OME-TIFF stack with all channels, or one stack per channel in channel order'},
+            {'name': 'axes', 'type': str, 'default': None,
+             'doc': "axis order of each stack, e.g. 'ZCYX'. Defaults to the axes reported by tifffile"},
+            *get_docval(GenericDataChunkIterator.__init__))
+    def __init__(self, **kwargs):
+        paths, axes = popargs('paths', 'axes', kwargs)
+        if isinstance(paths, str):
+            paths = [paths]
+        self._volumes = [_open_tiff(path, axes) for path in paths]
+        if len({volume.shape[:3] for volume in self._volumes}) > 1:
+            raise ValueError("TIFF stacks %s do not have the same (x, y, z) shape" % (list(paths),))
+        self._channel_offsets = np.cumsum([0] + [volume.shape[3] for volume in self._volumes])
+        if kwargs['chunk_shape'] is None and kwargs['chunk_mb'] is None:
+            kwargs['chunk_shape'] = _volume_chunks(self._get_maxshape(), np.dtype(np.int16).itemsize)
+        if kwargs['buffer_shape'] is None and kwargs['buffer_gb'] is None:
+            kwargs['buffer_shape'] = kwargs['chunk_shape']
+        super().__init__(**kwargs)
+
+    def _get_data(self, selection):
+        x, y, z, channels = selection
+        start, stop, _ = channels.indices(self._channel_offsets[-1])
+        parts = []
+        for volume, offset in zip(self._volumes, self._channel_offsets):
+            lo, hi = max(start - offset, 0), min(stop - offset, volume.shape[3])
+            if lo < hi:
+                parts.append(_cast_chunk(volume[x, y, z, lo:hi], np.int16))
+        return np.concatenate(parts, axis=3)
+
+    def _get_maxshape(self):
+        return self._volumes[0].shape[:3] + (int(self._channel_offsets[-1]),)
+
+    def _get_dtype(self):
+        return np.dtype(np.int16)
+
+
+def iter_tiff_frames(path, axes='ZCYX', pattern='*.tif*'):
+    """Yields the (x, y, z, channel) frames stored in a directory of TIFF stacks, one file per frame.
+
+    Files are read one at a time in sorted order; axes gives the axis order of each stack.
+    """
+    import skimage.io as skio
+
+    for filename in sorted(glob.glob(os.path.join(path, pattern))):
+        yield _to_xyzc(skio.imread(filename), axes)
+
+
+@register_map(MultiChannelVolumeSeries)
+class MultiChannelVolumeSeriesMap(TimeSeriesMap):
+
+    def __init__(self, spec):
+        super().__init__(spec)
+        self.map_spec('data_resolution', self.spec.get_dataset('data').get_attribute('resolution'))
+        self.map_spec('resolution', self.spec.get_dataset('resolution'))
+        # the text description is the TimeSeries attribute; the optional float32 'description' dataset is not used
+        self.unmap(self.spec.get_dataset('description'))
+        self.map_spec('description', self.spec.get_attribute('description'))
@@ -0,0 +1,97 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from hdmf.build import TypeMap
+from hdmf.spec.namespace import YAMLSpecReader
+from pynwb.testing import TestCase
+
+
+class TestImport(TestCase):
+
+    def test_optional_dependencies_deferred(self):
+        """Importing the extension must not load the optional dependencies used by the TIFF readers."""
+        code = ("import sys, ndx_multichannel_volume; "
+                "print(' '.join(m for m in ('skimage', 'scipy.io', 'tifffile') if m in sys.modules))")
+        out = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+        self.assertEqual(out.strip(), '')
+
+    def test_classes_registered(self):
+        from pynwb import get_class
+        import ndx_multichannel_volume
+
+        self.assertIs(get_class('MultiChannelVolumeSeries', 'ndx-multichannel-volume'),
+                      ndx_multichannel_volume.MultiChannelVolumeSeries)
+        self.assertIs(get_class('VolumeSegmentation', 'ndx-multichannel-volume'),
+                      ndx_multichannel_volume.VolumeSegmentation)
+
+
+class TestSpecCache(TestCase):
+
+    def setUp(self):
+        from ndx_multichannel_volume import ndx_multichannel_volume as ext
+
+        self.ext = ext
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ('ndx-multichannel-volume.namespace.yaml', 'ndx-multichannel-volume.extensions.yaml'):
+            shutil.copy(os.path.join(os.path.dirname(ext.MultiChannelVol_specpath), name), self.tmpdir)
+        self.namespace_path = os.path.join(self.tmpdir, 'ndx-multichannel-volume.namespace.yaml')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_cache(self):
+        """Writes the cache the way setup.py builds it."""
+        reader = YAMLSpecReader(indir=self.tmpdir)
+        names = ('ndx-multichannel-volume.namespace.yaml', 'ndx-multichannel-volume.extensions.yaml')
+        cache = dict(
+            sources = {name: self.ext._file_digest(os.path.join(self.tmpdir, name)) for name in names},
+            namespaces = reader.read_namespace(self.namespace_path),
+            specs = {names[1]: reader.read_spec(names[1])},
+        )
+        with open(self.ext._spec_cache_path(self.namespace_path), 'w') as f:
+            json.dump(cache, f)
+
+    def test_roundtrip(self):
+        self.assertIsNone(self.ext._read_spec_cache(self.namespace_path))
+        self.write_cache()
+
+        cache = self.ext._read_spec_cache(self.namespace_path)
+        yaml_reader = YAMLSpecReader(indir=self.tmpdir)
+        self.assertEqual(cache['namespaces'], yaml_reader.read_namespace(self.namespace_path))
+        self.assertEqual(cache['specs']['ndx-multichannel-volume.extensions.yaml'],
+                         yaml_reader.read_spec('ndx-multichannel-volume.extensions.yaml'))
+
+    def test_stale(self):
+        self.write_cache()
+        with open(os.path.join(self.tmpdir, 'ndx-multichannel-volume.extensions.yaml'), 'a') as f:
+            f.write('# edited\n')
+
+        self.assertIsNone(self.ext._read_spec_cache(self.namespace_path))
+
+    def test_corrupt(self):
+        with open(self.ext._spec_cache_path(self.namespace_path), 'w') as f:
+            f.write('{')
+
+        self.assertIsNone(self.ext._read_spec_cache(self.namespace_path))
+
+    def test_shipped(self):
+        """The cache built by setup.py matches the packaged YAML and is not rewritten at import."""
+        cache_path = self.ext._spec_cache_path(self.ext.MultiChannelVol_specpath)
+        mtime = os.stat(cache_path).st_mtime_ns
+        subprocess.run([sys.executable, '-c', 'import ndx_multichannel_volume'], check=True)
+
+        self.assertIsNotNone(self.ext._read_spec_cache(self.ext.MultiChannelVol_specpath))
+        self.assertEqual(os.stat(cache_path).st_mtime_ns, mtime)
+
+    def test_pynwb_type_map(self):
+        """The cache is loaded into pynwb's private global type map; this fails if a pynwb release renames it."""
+        import pynwb
+
+        type_map = self.ext._pynwb_type_map()
+        self.assertIsInstance(type_map, TypeMap)
+        self.assertIn('ndx-multichannel-volume', type_map.namespace_catalog.namespaces)
+        self.assertEqual(type_map.namespace_catalog.namespaces, pynwb.available_namespaces())
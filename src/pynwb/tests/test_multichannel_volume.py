@@ -0,0 +1,842 @@
+import functools
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+
+from hdmf.data_utils import DataChunkIterator
+from pynwb import NWBHDF5IO
+from pynwb.testing import TestCase, remove_test_file
+
+from ndx_multichannel_volume import (MultiChannelVolume, MultiChannelVolumeSeries, VolumeSegmentation,
+                                     VolumeMotionCorrection, FrameBlockCache)
+from ndx_multichannel_volume.ndx_multichannel_volume import _convert_volume_data
+
+from .utils import create_im_vol
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+try:
+    import dask.array as da
+except ImportError:
+    da = None
+
+try:
+    from hdmf_zarr.nwb import NWBZarrIO
+except ImportError:
+    NWBZarrIO = None
+
+
+class TestVolumeDataIO(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol(
+            channels = [("mNeptune 2.5", "561-700-75m"), ("Tag RGP-T", "561-605-70m")]
+        )
+        self.path = 'test_multichannel_volume.nwb'
+
+    def tearDown(self):
+        remove_test_file(self.path)
+
+    def create_series(self, data, **kwargs):
+        return MultiChannelVolumeSeries(
+            name = 'MultiChannelVolumeSeries',
+            data = data,
+            resolution = [0.25, 0.3, 1.0],
+            RGBW_channels = [0, 1, 0, 1],
+            imaging_volume = self.ImagingVol,
+            device = self.ImagingVol.device,
+            rate = 2.,
+            description = 'description',
+            **kwargs
+        )
+
+    def test_volume_roundtrip(self):
+        data = np.random.randint(0, 1000, size=(60, 40, 12, 2)).astype(np.int16)
+        image = MultiChannelVolume(
+            name = 'multichanvol',
+            resolution = [0.25, 0.3, 1.0],
+            description = 'description',
+            RGBW_channels = [0, 1, 0, 1],
+            data = data,
+            imaging_volume = self.ImagingVol,
+            Order_optical_channels = self.ImagingVol.Order_optical_channels
+        )
+        self.assertEqual(image.data.io_settings['chunks'], (60, 40, 12, 2))
+        self.nwbfile.add_acquisition(image)
+
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            read_image = io.read().acquisition['multichanvol']
+            self.assertEqual(read_image.data.compression, 'gzip')
+            self.assertTrue(read_image.data.shuffle)
+            np.testing.assert_array_equal(read_image.data[:], data)
+
+    def test_series_chunks(self):
+        data = np.zeros((3, 1000, 240, 50, 2), dtype=np.int16)
+        series = self.create_series(data, compression_opts=2)
+
+        self.assertEqual(series.data.io_settings['chunks'], (1, 1000, 240, 1, 2))
+        self.assertEqual(series.data.io_settings['compression_opts'], 2)
+
+    def test_series_uncompressed(self):
+        data = np.zeros((3, 10, 10, 5, 2), dtype=np.int16)
+        series = self.create_series(data, compression=False)
+
+        self.assertIs(series.data, data)
+
+    def test_series_roundtrip(self):
+        data = np.random.randint(0, 1000, size=(4, 30, 20, 10, 2)).astype(np.int16)
+        series = self.create_series(data, data_resolution=0.5)
+        self.nwbfile.add_acquisition(series)
+
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            read_series = io.read().acquisition['MultiChannelVolumeSeries']
+            self.assertEqual(read_series.data.chunks, (1, 30, 20, 10, 2))
+            np.testing.assert_array_equal(read_series.data[:], data)
+            np.testing.assert_array_equal(read_series.resolution[:], [0.25, 0.3, 1.0])
+            self.assertEqual(read_series.data_resolution, 0.5)
+            self.assertEqual(read_series.description, 'description')
+            self.assertEqual(read_series.imaging_volume.name, self.ImagingVol.name)
+
+    def test_series_from_frames(self):
+        data = np.random.randint(0, 1000, size=(5, 30, 20, 10, 2)).astype(np.int16)
+        consumed = []
+
+        def frames():
+            for frame in data:
+                consumed.append(len(consumed))
+                yield frame
+
+        series = MultiChannelVolumeSeries.from_frames(
+            frames = frames(),
+            timestamps = iter(np.arange(5) * 0.5),
+            name = 'MultiChannelVolumeSeries',
+            resolution = [0.25, 0.3, 1.0],
+            RGBW_channels = [0, 1, 0, 1],
+            imaging_volume = self.ImagingVol,
+            device = self.ImagingVol.device
+        )
+        self.assertEqual(consumed, [0])
+        self.nwbfile.add_acquisition(series)
+
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            read_series = io.read().acquisition['MultiChannelVolumeSeries']
+            self.assertEqual(read_series.data.chunks, (1, 30, 20, 10, 2))
+            np.testing.assert_array_equal(read_series.data[:], data)
+            np.testing.assert_array_equal(read_series.timestamps[:], np.arange(5) * 0.5)
+
+    @unittest.skipIf(tifffile is None, 'tifffile is not installed')
+    def test_volume_from_tiff(self):
+        stack = np.random.randint(0, 40000, size=(6, 40, 30)).astype(np.uint16)  # (z, y, x)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = [os.path.join(tmpdir, 'channel0.tif'), os.path.join(tmpdir, 'channel1.tif')]
+            tifffile.imwrite(paths[0], stack, metadata={'axes': 'ZYX'})
+            tifffile.imwrite(paths[1], stack // 2, compression='zlib')
+
+            image = MultiChannelVolume.from_tiff(
+                paths = paths,
+                name = 'multichanvol',
+                resolution = [0.25, 0.3, 1.0],
+                description = 'description',
+                RGBW_channels = [0, 1, 0, 1],
+                imaging_volume = self.ImagingVol,
+                Order_optical_channels = self.ImagingVol.Order_optical_channels
+            )
+            self.nwbfile.add_acquisition(image)
+
+            with NWBHDF5IO(self.path, mode='w') as io:
+                io.write(self.nwbfile)
+
+        expected = np.stack([np.minimum(stack, 32767), stack // 2], axis=-1).transpose(2, 1, 0, 3)
+        with NWBHDF5IO(self.path, mode='r') as io:
+            read_image = io.read().acquisition['multichanvol']
+            self.assertEqual(read_image.data.dtype, np.int16)
+            np.testing.assert_array_equal(read_image.data[:], expected)
+
+
+class TestDtypeConversion(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol(
+            channels = [("mNeptune 2.5", "561-700-75m"), ("Tag RGP-T", "561-605-70m")]
+        )
+        self.path = 'test_dtype_conversion.nwb'
+        self.data = np.random.default_rng(0).uniform(0, 1000, size=(30, 20, 8, 2))
+        self.data[0, 0, 0, 0] = 40000.
+        self.data[1, 0, 0, 0] = np.nan
+
+    def tearDown(self):
+        remove_test_file(self.path)
+
+    def create_volume(self, data, **kwargs):
+        return MultiChannelVolume(
+            name = 'multichanvol',
+            resolution = [0.25, 0.3, 1.0],
+            description = 'description',
+            RGBW_channels = [0, 1, 0, 1],
+            data = data,
+            imaging_volume = self.ImagingVol,
+            Order_optical_channels = self.ImagingVol.Order_optical_channels,
+            **kwargs
+        )
+
+    def create_series(self, data, **kwargs):
+        return MultiChannelVolumeSeries(
+            name = 'MultiChannelVolumeSeries',
+            data = data,
+            resolution = [0.25, 0.3, 1.0],
+            RGBW_channels = [0, 1, 0, 1],
+            imaging_volume = self.ImagingVol,
+            device = self.ImagingVol.device,
+            rate = 2.,
+            description = 'description',
+            **kwargs
+        )
+
+    def test_cast(self):
+        original = self.data.copy()
+        with self.assertWarnsRegex(UserWarning, '9598 of 9600 values had a fractional part .* 1 were clipped .* 1 NaN'):
+            image = self.create_volume(self.data)
+
+        data = image.data.data
+        self.assertEqual(data.dtype, np.int16)
+        self.assertEqual(data[0, 0, 0, 0], 32767)
+        self.assertEqual(data[1, 0, 0, 0], 0)
+        np.testing.assert_array_equal(data[2:], np.rint(self.data[2:]))
+        self.assertEqual(image.dtype_conversion_stats,
+                         {'values': 9600, 'rounded': 9598, 'below': 0, 'above': 1, 'nan': 1})
+        np.testing.assert_array_equal(self.data, original)
+
+    def test_rescale(self):
+        data = np.linspace(-1., 1., 30 * 20 * 8 * 2).reshape(30, 20, 8, 2)
+        image = self.create_volume(data, dtype_conversion='rescale')
+
+        self.assertEqual(image.data.data.min(), 0)
+        self.assertEqual(image.data.data.max(), 32767)
+
+        with self.assertWarns(UserWarning):
+            image = self.create_volume(data, dtype_conversion='rescale', value_range=(0., 1.))
+        self.assertEqual(image.dtype_conversion_stats['below'], 9600 // 2)
+
+    def test_cast_fractional(self):
+        with self.assertWarnsRegex(UserWarning, "rounded.*dtype_conversion='rescale'"):
+            image = self.create_volume(np.random.rand(10, 8, 4, 2))
+        self.assertEqual(image.dtype_conversion_stats['rounded'], 10 * 8 * 4 * 2)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            image = self.create_volume(np.arange(640.).reshape(10, 8, 4, 2))
+        self.assertEqual(image.dtype_conversion_stats['rounded'], 0)
+
+    def test_no_conversion(self):
+        data = np.nan_to_num(self.data).astype(np.int16)
+        self.assertIs(self.create_volume(data, compression=False).data, data)
+        self.assertIs(self.create_volume(self.data, compression=False, dtype_conversion='none').data, self.data)
+
+    def test_iterator(self):
+        data = np.random.default_rng(0).uniform(0, 1000, size=(3, 10, 10, 4, 2))
+        data[2, 0, 0, 0, 0] = -50000.
+        series = self.create_series(DataChunkIterator(data=iter(data), maxshape=data.shape, buffer_size=1))
+        self.assertEqual(series.dtype_conversion_stats['values'], 0)
+        self.nwbfile.add_acquisition(series)
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            with NWBHDF5IO(self.path, mode='w') as io:
+                io.write(self.nwbfile)
+        self.assertEqual(len([w for w in caught if 'clipped' in str(w.message)]), 1)
+        self.assertEqual(series.dtype_conversion_stats['below'], 1)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            read_series = io.read().acquisition['MultiChannelVolumeSeries']
+            self.assertEqual(read_series.data.dtype, np.int16)
+            self.assertEqual(read_series.data[2, 0, 0, 0, 0], -32768)
+            np.testing.assert_array_equal(read_series.data[:2], np.rint(data[:2]))
+
+    def test_iterator_rescale_needs_range(self):
+        data = np.zeros((3, 10, 10, 4, 2))
+        with self.assertRaises(ValueError):
+            self.create_series(DataChunkIterator(data=iter(data), maxshape=data.shape), dtype_conversion='rescale')
+
+    @unittest.skipIf(da is None, 'dask is not installed')
+    def test_dask(self):
+        values = np.linspace(0., 2., 30 * 20 * 8 * 2).reshape(30, 20, 8, 2)
+        values[0, 0, 0, 0] = np.nan
+        data = da.from_array(values, chunks=(30, 20, 2, 2))
+        image = self.create_volume(data, dtype_conversion='rescale')
+        self.assertNotIsInstance(image.data.data, np.ndarray)
+        self.assertEqual(image.data.data.dtype, np.int16)
+        self.assertEqual(image.dtype_conversion_stats['values'], 0)
+        self.nwbfile.add_acquisition(image)
+
+        with self.assertWarnsRegex(UserWarning, 'NaN'):
+            with NWBHDF5IO(self.path, mode='w') as io:
+                io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            read_image = io.read().acquisition['multichanvol']
+            self.assertEqual(read_image.data.dtype, np.int16)
+            self.assertEqual(read_image.data[0, 0, 0, 0], 0)
+            self.assertEqual(read_image.data[-1, -1, -1, -1], 32767)
+        self.assertEqual(image.dtype_conversion_stats['values'], data.size)
+
+    def test_dask_threaded_counts(self):
+        """Blocks converted concurrently by dask worker threads all add their counts."""
+        values = np.full((64, 10, 10, 2), 0.5)
+        values[:, 0, 0, 0] = 40000.
+        values[:, 0, 0, 1] = np.nan
+        data = da.from_array(values, chunks=(1, 10, 10, 2))
+        converted, stats = _convert_volume_data(data, 'cast', None, 'multichanvol')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            converted.compute(scheduler='threads', num_workers=8)
+
+        self.assertEqual((stats['values'], stats['above'], stats['nan']), (values.size, 64, 64))
+        self.assertEqual(stats['rounded'], values.size - 128)
+
+
+class TestVolumeAccessors(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol(
+            channels = [("mNeptune 2.5", "561-700-75m"), ("Tag RGP-T", "561-605-70m"), ("CyOFP1", "488-610-40m")]
+        )
+        self.path = 'test_multichannel_volume.nwb'
+        self.data = np.random.randint(0, 1000, size=(30, 20, 8, 3)).astype(np.int16)
+        self.image = MultiChannelVolume(
+            name = 'multichanvol',
+            resolution = [0.25, 0.3, 1.0],
+            description = 'description',
+            RGBW_channels = [2, 0, 1, 0],
+            data = self.data,
+            imaging_volume = self.ImagingVol,
+            Order_optical_channels = self.ImagingVol.Order_optical_channels
+        )
+        self.nwbfile.add_acquisition(self.image)
+
+    def tearDown(self):
+        remove_test_file(self.path)
+
+    def check_accessors(self, image):
+        np.testing.assert_array_equal(image.get_channel('561-605-70m'), self.data[..., 1])
+        np.testing.assert_array_equal(image.get_channel('CyOFP1', z=3), self.data[:, :, 3, 2])
+        np.testing.assert_array_equal(image.get_channel(0, z=slice(2, 5)), self.data[:, :, 2:5, 0])
+        np.testing.assert_array_equal(image.get_channel(610.), self.data[..., 2])
+        np.testing.assert_array_equal(image.get_zslab(2, 4), self.data[:, :, 2:4])
+        np.testing.assert_array_equal(image.get_zslab(2, 4, channels=['CyOFP1', 0]), self.data[:, :, 2:4][..., [2, 0]])
+        np.testing.assert_array_equal(image.get_rgbw(), self.data[..., [2, 0, 1, 0]])
+        np.testing.assert_array_equal(image.get_rgbw(z=6), self.data[:, :, 6][..., [2, 0, 1, 0]])
+        with self.assertRaises(KeyError):
+            image.get_channel('GCaMP')
+
+    def test_accessors(self):
+        self.check_accessors(self.image)
+
+    def test_accessors_roundtrip(self):
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            self.check_accessors(io.read().acquisition['multichanvol'])
+
+    def test_data_view_memmap(self):
+        contiguous = MultiChannelVolume(
+            name = 'contiguous',
+            resolution = [0.25, 0.3, 1.0],
+            description = 'description',
+            RGBW_channels = [2, 0, 1, 0],
+            data = self.data,
+            imaging_volume = self.ImagingVol,
+            Order_optical_channels = self.ImagingVol.Order_optical_channels,
+            compression = False
+        )
+        self.nwbfile.add_acquisition(contiguous)
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            acquisition = io.read().acquisition
+            view = acquisition['contiguous'].data_view()
+            self.assertIsInstance(view, np.memmap)
+            self.assertIs(acquisition['contiguous'].data_view(), view)
+            np.testing.assert_array_equal(view, self.data)
+            self.check_accessors(acquisition['contiguous'])
+            # chunked, compressed data falls back to h5py
+            self.assertIs(acquisition['multichanvol'].data_view(), acquisition['multichanvol'].data)
+
+    def test_channel_index_cache(self):
+        self.assertEqual(self.ImagingVol.channel_index('Tag RGP-T'), 1)
+        self.assertEqual(self.ImagingVol.channel_index('488-610-40m'), 2)
+        self.assertEqual(self.ImagingVol.channel_index(700.), 0)
+
+        # the cached lookup is rebuilt when the channel list changes
+        self.ImagingVol.Order_optical_channels.channels.reverse()
+        self.assertEqual(self.ImagingVol.channel_index('488-610-40m'), 2)
+        self.ImagingVol.clear_channel_index()
+        self.assertEqual(self.ImagingVol.channel_index('488-610-40m'), 0)
+        self.ImagingVol.Order_optical_channels.channels.pop()
+        self.assertEqual(self.ImagingVol.channel_index('Tag RGP-T'), 1)
+        with self.assertRaises(KeyError):
+            self.ImagingVol.channel_index(700.)
+
+
+class TestFrameEngine(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol(
+            channels = [("mNeptune 2.5", "561-700-75m"), ("Tag RGP-T", "561-605-70m")]
+        )
+        self.path = 'test_frame_engine.nwb'
+        self.data = np.random.randint(0, 1000, size=(7, 12, 10, 4, 2)).astype(np.int16)
+        self.series = MultiChannelVolumeSeries(
+            name = 'MultiChannelVolumeSeries',
+            data = self.data,
+            resolution = [0.25, 0.3, 1.0],
+            RGBW_channels = [0, 1, 0, 1],
+            imaging_volume = self.ImagingVol,
+            device = self.ImagingVol.device,
+            timestamps = np.arange(7) * 0.5,
+            description = 'description',
+            compression = False
+        )
+        self.nwbfile.add_acquisition(self.series)
+
+    def tearDown(self):
+        remove_test_file(self.path)
+
+    def test_map_frames(self):
+        def downsample(block):
+            return block[:, ::2, ::2]
+
+        mapped = self.series.map_frames(downsample, 'Downsampled', frames_per_chunk=2, n_workers=3,
+                                        max_pending=2, resolution=[0.5, 0.6, 1.0])
+        self.nwbfile.add_acquisition(mapped)
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            read_series = io.read().acquisition['Downsampled']
+            np.testing.assert_array_equal(read_series.data[:], self.data[:, ::2, ::2])
+            np.testing.assert_array_equal(read_series.timestamps[:], np.arange(7) * 0.5)
+            np.testing.assert_array_equal(read_series.resolution[:], [0.5, 0.6, 1.0])
+            self.assertEqual(read_series.description, 'description')
+
+    def test_map_frames_bad_shape(self):
+        with self.assertRaises(ValueError):
+            self.series.map_frames(lambda block: block[0], 'Projected')
+
+    def test_reduce_frames(self):
+        projection = self.series.reduce_frames(lambda block: block.max(axis=0), np.maximum,
+                                               frames_per_chunk=3, n_workers=2)
+        np.testing.assert_array_equal(projection, self.data.max(axis=0))
+
+        total = self.series.reduce_frames(lambda block: block.sum(axis=0, dtype=np.int64), np.add, initial=1)
+        np.testing.assert_array_equal(total, self.data.sum(axis=0) + 1)
+
+    def test_iter_frames(self):
+        batches = list(self.series.iter_frames(batch=3))
+        self.assertEqual([len(b) for b in batches], [3, 3, 1])
+        np.testing.assert_array_equal(np.concatenate(batches), self.data)
+        batches[0][...] = -1
+        np.testing.assert_array_equal(self.series.data[:3], self.data[:3])
+
+        batches = list(self.series.iter_frames(batch=2, prefetch=0, channels=['561-605-70m', 0], z=slice(1, 3),
+                                               start=1, stop=6))
+        np.testing.assert_array_equal(np.concatenate(batches), self.data[1:6, :, :, 1:3][..., [1, 0]])
+
+    def test_iter_frames_file(self):
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            read_series = io.read().acquisition['MultiChannelVolumeSeries']
+            for prefetch in (0, 3):
+                batches = list(read_series.iter_frames(batch=2, prefetch=prefetch, channels=[1], z=2))
+                np.testing.assert_array_equal(np.concatenate(batches), self.data[:, :, :, 2, 1:2])
+            batches = list(read_series.iter_frames(batch=3, channels=[1, 0], executor='process'))
+            np.testing.assert_array_equal(np.concatenate(batches), self.data[..., [1, 0]])
+            frames = read_series.iter_frames(prefetch=2)
+            np.testing.assert_array_equal(next(frames), self.data[:1])
+            frames.close()
+
+    def test_reduce_frames_process(self):
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            read_series = io.read().acquisition['MultiChannelVolumeSeries']
+            projection = read_series.reduce_frames(functools.partial(np.max, axis=0), np.maximum,
+                                                   frames_per_chunk=2, n_workers=2, executor='process')
+        np.testing.assert_array_equal(projection, self.data.max(axis=0))
+
+
+class TestFrameBlockCache(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol(
+            channels = [("mNeptune 2.5", "561-700-75m"), ("Tag RGP-T", "561-605-70m")]
+        )
+        self.path = 'test_frame_cache.nwb'
+        self.data = np.random.randint(0, 1000, size=(9, 12, 10, 4, 2)).astype(np.int16)
+        series = MultiChannelVolumeSeries(
+            name = 'MultiChannelVolumeSeries',
+            data = self.data,
+            resolution = [0.25, 0.3, 1.0],
+            RGBW_channels = [0, 1, 0, 1],
+            imaging_volume = self.ImagingVol,
+            device = self.ImagingVol.device,
+            rate = 2.,
+            description = 'description',
+            chunks = (2, 12, 10, 4, 2)
+        )
+        self.nwbfile.add_acquisition(series)
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+    def tearDown(self):
+        remove_test_file(self.path)
+
+    def test_slicing(self):
+        with NWBHDF5IO(self.path, mode='r') as io:
+            series = io.read().acquisition['MultiChannelVolumeSeries']
+            cache = series.enable_frame_cache(prefetch=0)
+            self.assertIs(series.data_view(), cache)
+            self.assertEqual(cache.frames_per_block, 2)
+            for key in (3, -1, slice(None), slice(1, 6), slice(7, 0, -3), (4, slice(2, 5), 3, 1, [1, 0]),
+                        [8, 0, 3], (Ellipsis, 0), (slice(2, 2),)):
+                np.testing.assert_array_equal(cache[key], self.data[key])
+            np.testing.assert_array_equal(np.asarray(cache), self.data)
+            self.assertFalse(cache[0].flags.writeable)
+            series.disable_frame_cache()
+            self.assertIsNot(series.data_view(), cache)
+
+    def test_counters(self):
+        with NWBHDF5IO(self.path, mode='r') as io:
+            series = io.read().acquisition['MultiChannelVolumeSeries']
+            cache = series.enable_frame_cache(prefetch=0)
+            cache[0]
+            cache[1]
+            cache[0:4]
+            self.assertEqual((cache.hits, cache.misses), (2, 2))
+            self.assertEqual(cache.nbytes, 4 * self.data[0].nbytes)
+            series.disable_frame_cache()
+
+    def test_max_bytes(self):
+        with NWBHDF5IO(self.path, mode='r') as io:
+            series = io.read().acquisition['MultiChannelVolumeSeries']
+            cache = series.enable_frame_cache(max_bytes=5 * self.data[0].nbytes, prefetch=0)
+            cache[0:6]
+            self.assertEqual(cache.nbytes, 4 * self.data[0].nbytes)
+            cache[0]
+            self.assertEqual((cache.hits, cache.misses), (0, 4))
+            series.disable_frame_cache()
+
+    def test_prefetch(self):
+        with NWBHDF5IO(self.path, mode='r') as io:
+            series = io.read().acquisition['MultiChannelVolumeSeries']
+            cache = series.enable_frame_cache(prefetch=1)
+            np.testing.assert_array_equal(cache[4], self.data[4])
+            np.testing.assert_array_equal(cache[7], self.data[7])
+            np.testing.assert_array_equal(cache[3], self.data[3])
+            self.assertEqual(cache.misses, 1)
+            self.assertEqual(cache.hits, 2)
+            series.disable_frame_cache()
+
+    def test_failed_prefetch(self):
+        class FailOnce:
+            def __init__(self, data):
+                self.data, self.shape, self.dtype, self.failed = data, data.shape, data.dtype, False
+
+            def __getitem__(self, key):
+                if key == slice(1, 2) and not self.failed:
+                    self.failed = True
+                    raise OSError('read error')
+                return self.data[key]
+
+        cache = FrameBlockCache(data=FailOnce(self.data), prefetch=1)
+        cache[0]
+        cache._executor.shutdown(wait=True)
+        cache._executor = None
+        self.assertEqual(cache._pending, {})
+        np.testing.assert_array_equal(cache[1], self.data[1])
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        cache.close()
+
+    def test_in_memory(self):
+        cache = FrameBlockCache(data=self.data, frames_per_block=4, prefetch=0)
+
+        np.testing.assert_array_equal(cache[2:7, ..., 1], self.data[2:7, ..., 1])
+        self.assertEqual(cache.misses, 2)
+
+
+class TestVolumePyramid(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol(
+            channels = [("mNeptune 2.5", "561-700-75m"), ("Tag RGP-T", "561-605-70m")]
+        )
+        self.path = 'test_volume_pyramid.nwb'
+        self.data = np.random.randint(0, 1000, size=(37, 21, 9, 2)).astype(np.int16)
+        self.image = MultiChannelVolume(
+            name = 'multichanvol',
+            resolution = [0.25, 0.3, 1.0],
+            description = 'description',
+            RGBW_channels = [0, 1, 0, 1],
+            data = self.data,
+            imaging_volume = self.ImagingVol,
+            Order_optical_channels = self.ImagingVol.Order_optical_channels
+        )
+
+    def tearDown(self):
+        remove_test_file(self.path)
+
+    @staticmethod
+    def downsample(data, factors, reduce):
+        out = np.zeros(tuple(-(-n // f) for n, f in zip(data.shape[:3], factors)) + data.shape[3:])
+        for i, j, k in np.ndindex(*out.shape[:3]):
+            block = data[i * factors[0]:(i + 1) * factors[0], j * factors[1]:(j + 1) * factors[1],
+                         k * factors[2]:(k + 1) * factors[2]]
+            out[i, j, k] = reduce(block, axis=(0, 1, 2))
+        return out
+
+    def test_build_pyramid(self):
+        levels = self.image.build_pyramid(factors=[2, 4], compression=False)
+
+        self.assertEqual([level.name for level in levels], ['pyramid_2x', 'pyramid_4x'])
+        np.testing.assert_array_equal(levels[0].data, np.rint(self.downsample(self.data, (2, 2, 1), np.mean)))
+        np.testing.assert_array_equal(levels[1].data, np.rint(self.downsample(self.data, (4, 4, 1), np.mean)))
+        np.testing.assert_array_equal(levels[1].resolution, [1.0, 1.2, 1.0])
+        with self.assertRaises(ValueError):
+            self.image.build_pyramid()
+
+    def test_build_pyramid_max_z(self):
+        levels = self.image.build_pyramid(factors=[2, 3], downsample_z=True, method='max', compression=False)
+
+        np.testing.assert_array_equal(levels[0].data, self.downsample(self.data, (2, 2, 2), np.max))
+        np.testing.assert_array_equal(levels[1].data, self.downsample(self.data, (3, 3, 3), np.max))
+
+    def test_pyramid_roundtrip(self):
+        self.image.build_pyramid(factors=[2, 4, 8, 16])
+        self.assertIs(self.image.pyramid_level([40, 5]), self.image)
+        self.nwbfile.add_acquisition(self.image)
+
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            read_image = io.read().acquisition['multichanvol']
+            self.assertEqual(read_image.pyramid_level([9, 5]).name, 'pyramid_4x')
+            self.assertEqual(read_image.pyramid_level([2, 1]).name, 'pyramid_16x')
+            level = read_image.pyramid_level([4, 2])
+            np.testing.assert_array_equal(level.downsampling[:], [8, 8, 1])
+            np.testing.assert_array_almost_equal(level.resolution[:], [2.0, 2.4, 1.0])
+            overview = read_image.get_overview([9, 5], channels=['561-605-70m'])
+            np.testing.assert_array_equal(overview[..., 0],
+                                          np.rint(self.downsample(self.data, (4, 4, 1), np.mean))[..., 1])
+
+
+@unittest.skipIf(NWBZarrIO is None, 'hdmf-zarr is not installed')
+class TestZarrRoundtrip(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol(
+            channels = [("mNeptune 2.5", "561-700-75m"), ("Tag RGP-T", "561-605-70m")]
+        )
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'test_multichannel_volume.nwb.zarr')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_roundtrip(self):
+        data = np.random.randint(0, 1000, size=(30, 20, 8, 2)).astype(np.int16)
+        image = MultiChannelVolume(
+            name = 'multichanvol',
+            resolution = [0.25, 0.3, 1.0],
+            description = 'description',
+            RGBW_channels = [0, 1, 0, 1],
+            data = data,
+            imaging_volume = self.ImagingVol,
+            Order_optical_channels = self.ImagingVol.Order_optical_channels,
+            backend = 'zarr'
+        )
+        series_data = np.random.randint(0, 1000, size=(4, 30, 20, 8, 2)).astype(np.int16)
+        series = MultiChannelVolumeSeries(
+            name = 'MultiChannelVolumeSeries',
+            data = series_data,
+            resolution = [0.25, 0.3, 1.0],
+            RGBW_channels = [0, 1, 0, 1],
+            imaging_volume = self.ImagingVol,
+            device = self.ImagingVol.device,
+            rate = 2.,
+            description = 'description',
+            compression = 'blosc',
+            backend = 'zarr'
+        )
+        volume_seg = VolumeSegmentation(
+            name = 'VolumeSegmentation',
+            description = 'Neuron centers',
+            imaging_volume = self.ImagingVol
+        )
+        volume_seg.add_roi(voxel_mask=[[1, 2, 3, 0.5, 'AVAL'], [0, 0, 0, 1., 'AVAL']])
+        volume_seg.add_roi(voxel_mask=[[4, 5, 6, 1., 'AVAR']])
+        self.assertEqual(series.data.io_settings['chunks'], (1, 30, 20, 8, 2))
+        self.nwbfile.add_acquisition(image)
+        self.nwbfile.add_acquisition(series)
+        self.nwbfile.processing['NeuroPAL'].add(volume_seg)
+
+        with NWBZarrIO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBZarrIO(self.path, mode='r') as io:
+            read_nwbfile = io.read()
+            read_image = read_nwbfile.acquisition['multichanvol']
+            read_series = read_nwbfile.acquisition['MultiChannelVolumeSeries']
+            read_seg = read_nwbfile.processing['NeuroPAL']['VolumeSegmentation']
+
+            self.assertEqual(read_image.data.chunks, (30, 20, 8, 2))
+            self.assertEqual(read_series.data.chunks, (1, 30, 20, 8, 2))
+            np.testing.assert_array_equal(read_image.data[:], data)
+            np.testing.assert_array_equal(read_series.data[:], series_data)
+            np.testing.assert_array_equal(read_image.get_channel('561-605-70m'), data[..., 1])
+            np.testing.assert_array_equal(read_series.resolution[:], [0.25, 0.3, 1.0])
+            self.assertIs(read_image.imaging_volume, read_nwbfile.processing['NeuroPAL']['ImagingVolume'])
+            self.assertIs(read_series.imaging_volume, read_image.imaging_volume)
+
+            self.assertEqual([tuple(v) for v in read_seg['voxel_mask'][0]],
+                             [(1, 2, 3, 0.5, 'AVAL'), (0, 0, 0, 1., 'AVAL')])
+            self.assertEqual(read_seg.rois_at([4, 5, 6]), [1])
+            traces = read_seg.extract_traces(read_series, frames_per_chunk=2, n_workers=2)
+            np.testing.assert_allclose(traces[:, 1], series_data[:, 4, 5, 6])
+
+    def test_map_frames(self):
+        data = np.random.randint(0, 1000, size=(4, 10, 10, 5, 2)).astype(np.int16)
+        series = MultiChannelVolumeSeries(
+            name = 'MultiChannelVolumeSeries',
+            data = data,
+            resolution = [0.25, 0.3, 1.0],
+            RGBW_channels = [0, 1, 0, 1],
+            imaging_volume = self.ImagingVol,
+            device = self.ImagingVol.device,
+            rate = 2.,
+            description = 'description'
+        )
+        self.nwbfile.add_acquisition(series.map_frames(np.negative, 'negated', frames_per_chunk=1, backend='zarr'))
+
+        with NWBZarrIO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBZarrIO(self.path, mode='r') as io:
+            read_series = io.read().acquisition['negated']
+            self.assertEqual(read_series.data.chunks, (1, 10, 10, 5, 2))
+            np.testing.assert_array_equal(read_series.data[:], -data)
+
+
+class TestVolumeMotionCorrection(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol(
+            channels = [("mNeptune 2.5", "561-700-75m"), ("Tag RGP-T", "561-605-70m")]
+        )
+        self.path = 'test_motion_correction.nwb'
+        self.data = np.random.randint(0, 1000, size=(4, 12, 10, 6, 2)).astype(np.int16)
+        self.series = MultiChannelVolumeSeries(
+            name = 'MultiChannelVolumeSeries',
+            data = self.data,
+            resolution = [0.25, 0.3, 1.0],
+            RGBW_channels = [0, 1, 0, 1],
+            imaging_volume = self.ImagingVol,
+            device = self.ImagingVol.device,
+            rate = 2.,
+            description = 'description'
+        )
+        self.nwbfile.add_acquisition(self.series)
+        self.shifts = np.array([[0, 0, 0], [1, -2, 0], [3, 1, 1], [-1, 0, 2]])
+
+    def tearDown(self):
+        remove_test_file(self.path)
+
+    def expected(self, frame):
+        shifted = np.zeros(self.data.shape[1:], dtype=np.float32)
+        tx, ty, tz = self.shifts[frame]
+        nx, ny, nz = self.data.shape[1:4]
+        shifted[max(-tx, 0):nx - max(tx, 0), max(-ty, 0):ny - max(ty, 0), max(-tz, 0):nz - max(tz, 0)] = \
+            self.data[frame, max(tx, 0):nx + min(tx, 0), max(ty, 0):ny + min(ty, 0), max(tz, 0):nz + min(tz, 0)]
+        return shifted
+
+    def test_translations(self):
+        motion = VolumeMotionCorrection(original=self.series, transforms=self.shifts)
+
+        self.assertEqual(motion.transforms.shape, (4, 3, 4))
+        for frame in range(4):
+            np.testing.assert_allclose(motion.get_registered(frame), self.expected(frame), atol=1e-3)
+        nearest = motion.get_registered(2, order=0)
+        self.assertEqual(nearest.dtype, np.int16)
+        np.testing.assert_array_equal(nearest, self.expected(2))
+
+    def test_sub_volume(self):
+        motion = VolumeMotionCorrection(original=self.series, transforms=self.shifts)
+
+        registered = motion.get_registered(1, x=slice(2, 7), z=slice(1, 3), channels=['561-605-70m', 0])
+        np.testing.assert_allclose(registered, self.expected(1)[2:7, :, 1:3][..., [1, 0]], atol=1e-3)
+
+    def test_affine(self):
+        from scipy import ndimage
+
+        transforms = np.tile(np.eye(4), (4, 1, 1))
+        transforms[:, :3, :3] = [[0.5, 0.2, 0.], [-0.1, 0.8, 0.], [0., 0., 1.]]
+        transforms[:, :3, 3] = [1., 0.5, 0.]
+        motion = VolumeMotionCorrection(original=self.series, transforms=transforms, reference_frame=0)
+
+        registered = motion.get_registered(3, y=slice(2, 9))
+        for channel in range(2):
+            expected = ndimage.affine_transform(self.data[3, ..., channel].astype(np.float32), transforms[3, :3, :3],
+                                                offset=transforms[3, :3, 3], order=1)
+            np.testing.assert_allclose(registered[..., channel], expected[:, 2:9], atol=1e-3)
+
+    def test_cache(self):
+        motion = VolumeMotionCorrection(original=self.series, transforms=self.shifts, cache_size=2)
+
+        first = motion.get_registered(0)
+        self.assertIs(motion.get_registered(0), first)
+        self.assertFalse(first.flags.writeable)
+        motion.get_registered(1)
+        motion.get_registered(2)
+        self.assertIsNot(motion.get_registered(0), first)
+        motion.clear_cache()
+        self.assertEqual(len(motion._registered_cache), 0)
+
+    def test_bad_transforms(self):
+        with self.assertRaises(ValueError):
+            VolumeMotionCorrection(original=self.series, transforms=self.shifts[:3])
+        with self.assertRaises(ValueError):
+            VolumeMotionCorrection(original=self.series, transforms=np.zeros((4, 2)))
+
+    def test_roundtrip(self):
+        module = self.nwbfile.create_processing_module(name='ophys', description='motion correction')
+        module.add(VolumeMotionCorrection(original=self.series, transforms=self.shifts, reference_frame=0))
+
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            nwbfile = io.read()
+            motion = nwbfile.processing['ophys']['VolumeMotionCorrection']
+            self.assertIs(motion.original, nwbfile.acquisition['MultiChannelVolumeSeries'])
+            self.assertEqual(motion.reference_frame, 0)
+            np.testing.assert_allclose(motion.get_registered(3), self.expected(3), atol=1e-3)
@@ -0,0 +1,578 @@
+import numpy as np
+
+from pynwb import NWBHDF5IO
+from pynwb.testing import TestCase, remove_test_file
+
+from ndx_multichannel_volume import (VolumeSegmentation, MultiChannelVolume, MultiChannelVolumeSeries, VOXEL_MASK_DTYPE,
+                                     COLOR_VOXEL_MASK_DTYPE)
+
+from .utils import create_im_vol
+
+
+class TestVoxelMaskConversion(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol()
+        self.image_mask = np.zeros((40, 30, 5))
+        self.image_mask[1, 2, 3] = 0.5
+        self.image_mask[4, 5, 0] = 1.
+        self.image_mask[7, 8, 4] = -1.
+
+    def test_image_to_pixel(self):
+        voxel_mask = VolumeSegmentation.image_to_pixel(self.image_mask, 'AVAL')
+
+        np.testing.assert_array_equal(voxel_mask['x'], [1, 4])
+        np.testing.assert_array_equal(voxel_mask['y'], [2, 5])
+        np.testing.assert_array_equal(voxel_mask['z'], [3, 0])
+        np.testing.assert_array_equal(voxel_mask['weight'], [0.5, 1.])
+        self.assertEqual(list(voxel_mask['ID']), ['AVAL', 'AVAL'])
+
+    def test_image_to_pixel_sparse(self):
+        from scipy import sparse
+
+        voxel_mask = VolumeSegmentation.image_to_pixel(sparse.csr_matrix(self.image_mask[:, :, 3]))
+
+        self.assertEqual(voxel_mask.tolist(), [(1, 2, 0, 0.5, '')])
+
+    def test_add_roi_structured(self):
+        volume_seg = VolumeSegmentation(
+            name = 'VolumeSegmentation',
+            description = 'Neuron centers',
+            imaging_volume = self.ImagingVol
+        )
+        voxel_mask = VolumeSegmentation.image_to_pixel(self.image_mask, 'AVAL')
+        volume_seg.add_roi(voxel_mask=voxel_mask)
+
+        self.assertEqual(len(volume_seg), 1)
+        self.assertEqual([tuple(v) for v in volume_seg['voxel_mask'][0]], voxel_mask.tolist())
+
+    def test_voxel_to_image(self):
+        voxel_mask = VolumeSegmentation.image_to_pixel(self.image_mask)
+        image = VolumeSegmentation.voxel_to_image(voxel_mask, shape=self.image_mask.shape)
+
+        np.testing.assert_array_equal(image, np.clip(self.image_mask, 0, None))
+
+    def test_voxel_to_label_volume(self):
+        volume_seg = VolumeSegmentation(
+            name = 'VolumeSegmentation',
+            description = 'Neuron centers',
+            imaging_volume = self.ImagingVol
+        )
+        volume_seg.add_roi(voxel_mask=[[1, 2, 3, 0.5, 'AVAL'], [0, 0, 0, 1., 'AVAL']])
+        volume_seg.add_roi(voxel_mask=[[4, 5, 0, 0.25, 'AVAR']])
+
+        labels = volume_seg.voxel_to_label_volume(shape=(10, 10, 5))
+        self.assertEqual(labels.dtype, np.uint8)
+        self.assertEqual(labels.shape, (10, 10, 5))
+        self.assertEqual(labels[1, 2, 3], 1)
+        self.assertEqual(labels[0, 0, 0], 1)
+        self.assertEqual(labels[4, 5, 0], 2)
+        self.assertEqual(np.count_nonzero(labels), 3)
+
+        weights = volume_seg.voxel_to_label_volume(shape=(10, 10, 5), weighted=True)
+        self.assertEqual(weights[4, 5, 0], 0.25)
+        self.assertAlmostEqual(weights.sum(), 1.75)
+
+
+class TestBulkAddRois(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol()
+        self.volume_seg = VolumeSegmentation(
+            name = 'VolumeSegmentation',
+            description = 'Neuron centers',
+            imaging_volume = self.ImagingVol
+        )
+
+    def test_add_rois_list(self):
+        self.volume_seg.add_rois(voxel_masks=[[[1, 2, 3, 1., 'AVAL']],
+                                              [[4, 5, 6, 0.5, 'AVAR'], [7, 8, 9, 0.5, 'AVAR']]])
+        self.volume_seg.add_roi(voxel_mask=[[0, 0, 0, 1., 'RIAL']])
+
+        self.assertEqual(len(self.volume_seg), 3)
+        self.assertEqual(list(self.volume_seg.id[:]), [0, 1, 2])
+        self.assertEqual([tuple(v) for v in self.volume_seg['voxel_mask'][1]],
+                         [(4, 5, 6, 0.5, 'AVAR'), (7, 8, 9, 0.5, 'AVAR')])
+        self.assertEqual([tuple(v) for v in self.volume_seg['voxel_mask'][2]], [(0, 0, 0, 1., 'RIAL')])
+
+    def test_add_rois_concatenated(self):
+        voxel_mask = np.zeros(3, dtype=VOXEL_MASK_DTYPE)
+        voxel_mask['x'] = [1, 2, 3]
+        voxel_mask['weight'] = 1.
+        voxel_mask['ID'] = ['AVAL', 'AVAR', 'AVAR']
+        self.volume_seg.add_rois(voxel_mask=voxel_mask, voxel_mask_index=[1, 3], id=[10, 11])
+
+        self.assertEqual(list(self.volume_seg.id[:]), [10, 11])
+        self.assertEqual([tuple(v) for v in self.volume_seg['voxel_mask'][1]],
+                         [(2, 0, 0, 1., 'AVAR'), (3, 0, 0, 1., 'AVAR')])
+
+    def test_mixed_structured_and_list_masks(self):
+        image_mask = np.zeros((10, 10, 5))
+        image_mask[1, 2, 3] = 0.5
+        self.volume_seg.add_roi(voxel_mask=VolumeSegmentation.image_to_pixel(image_mask, 'AVAL'))
+        self.volume_seg.add_roi(voxel_mask=[[4, 5, 1, 1., 'AVAR']])
+
+        self.assertEqual(self.volume_seg.rois_at([1, 2, 3]), [0])
+        self.assertEqual(self.volume_seg.rois_at([4, 5, 1]), [1])
+        labels = self.volume_seg.voxel_to_label_volume(shape=(10, 10, 5))
+        self.assertEqual((labels[1, 2, 3], labels[4, 5, 1], np.count_nonzero(labels)), (1, 2, 2))
+        np.testing.assert_allclose(self.volume_seg.to_sparse(shape=(10, 10, 5)).data, [0.5, 1.])
+
+    def test_add_rois_bad_index(self):
+        with self.assertRaises(ValueError):
+            self.volume_seg.add_rois(voxel_mask=[[1, 2, 3, 1., 'AVAL']], voxel_mask_index=[2])
+
+    def test_add_rois_read_from_file(self):
+        self.volume_seg.add_rois(voxel_masks=[[[1, 2, 3, 1., 'AVAL']]])
+        self.nwbfile.processing['NeuroPAL'].add(self.volume_seg)
+        path = 'test_bulk_add_rois.nwb'
+        try:
+            with NWBHDF5IO(path, mode='w') as io:
+                io.write(self.nwbfile)
+            with NWBHDF5IO(path, mode='r') as io:
+                read_seg = io.read().processing['NeuroPAL']['VolumeSegmentation']
+                with self.assertRaisesRegex(ValueError, 'read from a file'):
+                    read_seg.add_rois(voxel_masks=[[[4, 5, 6, 1., 'AVAR']]])
+                self.assertEqual(len(read_seg), 1)
+        finally:
+            remove_test_file(path)
+
+    def test_from_labeled_volume(self):
+        labels = np.zeros((10, 10, 5), dtype=np.uint16)
+        labels[1:3, 2, 3] = 7
+        labels[5, 5, 0] = 2
+
+        volume_seg = VolumeSegmentation.from_labeled_volume(
+            labels = labels,
+            imaging_volume = self.ImagingVol,
+            description = 'Neuron centers',
+            ID = {7: 'AVAL'}
+        )
+
+        self.assertEqual(volume_seg.name, 'ImagingVolume')
+        self.assertEqual(list(volume_seg.id[:]), [2, 7])
+        self.assertEqual([tuple(v) for v in volume_seg['voxel_mask'][0]], [(5, 5, 0, 1., '2')])
+        self.assertEqual([tuple(v) for v in volume_seg['voxel_mask'][1]],
+                         [(1, 2, 3, 1., 'AVAL'), (2, 2, 3, 1., 'AVAL')])
+        np.testing.assert_array_equal(volume_seg.voxel_to_label_volume(shape=labels.shape) > 0, labels > 0)
+
+
+class TestSpatialIndex(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol()
+        self.volume_seg = VolumeSegmentation(
+            name = 'VolumeSegmentation',
+            description = 'Neuron centers',
+            imaging_volume = self.ImagingVol
+        )
+        self.volume_seg.add_rois(voxel_masks=[
+            [[1, 1, 1, 1., 'AVAL'], [2, 1, 1, 1., 'AVAL']],
+            [[10, 10, 4, 1., 'AVAR']],
+            [[2, 1, 1, 0.5, 'RIAL'], [6, 6, 2, 0.5, 'RIAL']],
+        ])
+
+    def test_rois_at(self):
+        self.assertEqual(self.volume_seg.rois_at([1, 1, 1]), [0])
+        self.assertEqual(self.volume_seg.rois_at([2, 1, 1]), [0, 2])
+        self.assertEqual(self.volume_seg.rois_at([10, 10, 4]), [1])
+        self.assertEqual(self.volume_seg.rois_at([3, 3, 3]), [])
+        self.assertEqual(self.volume_seg.rois_at([50, 0, 0]), [])
+
+    def test_rois_in_box(self):
+        self.assertEqual(self.volume_seg.rois_in_box([0, 0, 0], [3, 3, 3]), [0, 2])
+        self.assertEqual(self.volume_seg.rois_in_box([9, 9, 0], [20, 20, 5]), [1])
+        # the bounding box of RIAL covers (4, 4, 1) but none of its voxels do
+        self.assertEqual(self.volume_seg.rois_in_box([4, 4, 1], [5, 5, 2]), [])
+        self.assertEqual(self.volume_seg.rois_in_box([4, 4, 1], [5, 5, 2], exact=False), [2])
+
+    def test_nearest_rois(self):
+        rows, distances = self.volume_seg.nearest_rois([10, 10, 3], k=2)
+        self.assertEqual(rows, [1, 2])
+        self.assertAlmostEqual(distances[0], 1.)
+
+    def test_index_rebuilt_after_add(self):
+        self.assertEqual(self.volume_seg.rois_at([20, 20, 0]), [])
+        self.volume_seg.add_roi(voxel_mask=[[20, 20, 0, 1., 'ASHL']])
+        self.assertEqual(self.volume_seg.rois_at([20, 20, 0]), [3])
+
+
+class TestExtractTraces(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol(
+            channels = [("mNeptune 2.5", "561-700-75m"), ("Tag RGP-T", "561-605-70m")]
+        )
+        self.path = 'test_extract_traces.nwb'
+        self.data = np.random.randint(0, 1000, size=(7, 12, 10, 4, 2)).astype(np.int16)
+        self.volume_seg = VolumeSegmentation(
+            name = 'VolumeSegmentation',
+            description = 'Neuron centers',
+            imaging_volume = self.ImagingVol
+        )
+        self.volume_seg.add_rois(voxel_masks=[
+            [[1, 1, 1, 1., 'AVAL'], [2, 1, 1, 3., 'AVAL']],
+            [[11, 9, 3, 1., 'AVAR']],
+        ])
+
+    def tearDown(self):
+        remove_test_file(self.path)
+
+    def create_series(self, **kwargs):
+        return MultiChannelVolumeSeries(
+            name = 'MultiChannelVolumeSeries',
+            data = self.data,
+            resolution = [0.25, 0.3, 1.0],
+            RGBW_channels = [0, 1, 0, 1],
+            imaging_volume = self.ImagingVol,
+            device = self.ImagingVol.device,
+            rate = 2.,
+            description = 'description',
+            **kwargs
+        )
+
+    def expected(self):
+        aval = (self.data[:, 1, 1, 1] * 1. + self.data[:, 2, 1, 1] * 3.) / 4.
+        avar = self.data[:, 11, 9, 3].astype(np.float64)
+        return np.stack((aval, avar), axis=1)
+
+    def test_extract_traces(self):
+        series = self.create_series(compression=False)
+
+        traces = self.volume_seg.extract_traces(series, frames_per_chunk=3)
+        self.assertEqual(traces.shape, (7, 2, 2))
+        self.assertEqual(traces.dtype, np.float32)
+        np.testing.assert_allclose(traces, self.expected(), rtol=1e-5)
+
+        traces = self.volume_seg.extract_traces(series, channels='561-605-70m')
+        np.testing.assert_allclose(traces, self.expected()[..., 1], rtol=1e-5)
+
+        sums = self.volume_seg.extract_traces(series, channels=[1, 0], normalize=False)
+        np.testing.assert_allclose(sums[:, 1], self.data[:, 11, 9, 3, ::-1])
+
+    def test_extract_traces_parallel(self):
+        self.nwbfile.add_acquisition(self.create_series())
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            series = io.read().acquisition['MultiChannelVolumeSeries']
+            traces = self.volume_seg.extract_traces(series, frames_per_chunk=2, n_workers=2)
+        np.testing.assert_allclose(traces, self.expected(), rtol=1e-5)
+
+
+class TestLabelVolume(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol()
+        self.path = 'test_label_volume.nwb'
+        self.labels = np.zeros((40, 30, 12), dtype=np.uint16)
+        self.labels[1:4, 2:5, 3:6] = 9
+        self.labels[20, 20, 10] = 3
+
+    def tearDown(self):
+        remove_test_file(self.path)
+
+    def test_set_label_volume(self):
+        volume_seg = VolumeSegmentation(
+            name = 'VolumeSegmentation',
+            description = 'Neuron centers',
+            imaging_volume = self.ImagingVol
+        )
+        volume_seg.add_rois(voxel_masks=[[[1, 2, 3, 0.5, 'AVAL'], [0, 0, 0, 1., 'AVAL']], [[4, 5, 6, 1., 'AVAR']]])
+        volume_seg.set_label_volume(shape=(10, 10, 8))
+
+        self.assertEqual(volume_seg.label_volume.io_settings['chunks'], (10, 10, 8))
+        labels = volume_seg.label_volume.data
+        self.assertEqual(labels.dtype, np.uint16)
+        self.assertEqual(labels[1, 2, 3], 1)
+        self.assertEqual(labels[4, 5, 6], 2)
+        # image masks come from the voxel masks, which keep the weights, while there are any
+        self.assertEqual(volume_seg.get_image_mask(0)[1, 2, 3], 0.5)
+        volume_seg.label_volume.data[4, 5, 6] = 0
+        self.assertEqual(volume_seg.get_image_mask(1).sum(), 1.)
+        with self.assertRaises(ValueError):
+            volume_seg.set_label_volume(shape=(10, 10, 8))
+
+    def test_from_labeled_volume(self):
+        volume_seg = VolumeSegmentation.from_labeled_volume(
+            labels = self.labels,
+            imaging_volume = self.ImagingVol,
+            description = 'Neuron centers',
+            storage = 'label_volume'
+        )
+
+        self.assertEqual(list(volume_seg.id[:]), [3, 9])
+        self.assertEqual(volume_seg.colnames, ())
+        mask, offset = volume_seg.get_image_mask(1, crop=True)
+        self.assertEqual(mask.shape, (3, 3, 3))
+        self.assertEqual(offset, (1, 2, 3))
+        self.assertEqual(volume_seg.get_image_mask(0).shape, (40, 30, 12))
+        self.assertEqual(volume_seg.rois_at([20, 20, 10]), [0])
+        np.testing.assert_array_equal(volume_seg.voxel_to_label_volume() > 0, self.labels > 0)
+
+    def test_from_labeled_volume_both(self):
+        volume_seg = VolumeSegmentation.from_labeled_volume(
+            labels = self.labels,
+            imaging_volume = self.ImagingVol,
+            description = 'Neuron centers',
+            storage = 'both'
+        )
+
+        np.testing.assert_array_equal(volume_seg.label_volume.data, volume_seg.voxel_to_label_volume())
+
+    def test_roundtrip(self):
+        volume_seg = VolumeSegmentation.from_labeled_volume(
+            labels = self.labels,
+            imaging_volume = self.ImagingVol,
+            description = 'Neuron centers',
+            name = 'VolumeSegmentation',
+            storage = 'label_volume'
+        )
+        self.nwbfile.processing['NeuroPAL'].add(volume_seg)
+
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            read_seg = io.read().processing['NeuroPAL']['VolumeSegmentation']
+            self.assertEqual(read_seg.label_volume.compression, 'gzip')
+            self.assertEqual(read_seg.label_volume.dtype, np.uint16)
+            self.assertEqual(list(read_seg.id[:]), [3, 9])
+            mask, offset = read_seg.get_image_mask(1, crop=True)
+            self.assertEqual(offset, (1, 2, 3))
+            self.assertEqual(mask.sum(), 27.)
+            self.assertEqual(read_seg.rois_in_box([0, 0, 0], [5, 5, 5]), [1])
+
+
+class TestNumericLayout(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol()
+        self.path = 'test_numeric_layout.nwb'
+        self.voxel_masks = [[[1, 2, 3, 0.5, 'AVAL'], [0, 0, 0, 1., 'AVAL']], [[4, 5, 6, 1., 'AVAR']]]
+
+    def tearDown(self):
+        remove_test_file(self.path)
+
+    def create_seg(self, name, layout):
+        volume_seg = VolumeSegmentation(
+            name = name,
+            description = 'Neuron centers',
+            imaging_volume = self.ImagingVol
+        )
+        volume_seg.add_rois(voxel_masks=self.voxel_masks, layout=layout)
+        return volume_seg
+
+    def check_same(self, compound_seg, numeric_seg):
+        for row in range(len(compound_seg)):
+            compound, numeric = compound_seg.get_voxel_mask(row), numeric_seg.get_voxel_mask(row)
+            self.assertEqual(numeric.dtype, VOXEL_MASK_DTYPE)
+            self.assertEqual(numeric.tolist(), compound.tolist())
+        self.assertEqual(numeric_seg.rois_at([4, 5, 6]), compound_seg.rois_at([4, 5, 6]))
+        np.testing.assert_array_equal(numeric_seg.voxel_to_label_volume(shape=(10, 10, 10)),
+                                      compound_seg.voxel_to_label_volume(shape=(10, 10, 10)))
+
+    def test_add_rois(self):
+        volume_seg = self.create_seg('VolumeSegmentation', 'numeric')
+
+        self.assertEqual(volume_seg.colnames, ('numeric_voxel_mask', 'roi_ID'))
+        self.assertEqual(list(volume_seg['roi_ID'].data), ['AVAL', 'AVAR'])
+        self.check_same(self.create_seg('compound', 'compound'), volume_seg)
+
+    def test_add_roi(self):
+        volume_seg = VolumeSegmentation(
+            name = 'VolumeSegmentation',
+            description = 'Neuron centers',
+            imaging_volume = self.ImagingVol
+        )
+        color_voxel_mask = [[1, 2, 3, 0.5, 'AVAL', 10, 20, 30, 40]]
+        volume_seg.add_roi(voxel_mask=self.voxel_masks[1], color_voxel_mask=color_voxel_mask, layout='numeric')
+
+        self.assertEqual(volume_seg.get_voxel_mask(0).tolist(), [(4, 5, 6, 1., 'AVAR')])
+        color = volume_seg.get_voxel_mask(0, column='color_voxel_mask')
+        self.assertEqual(color.dtype, COLOR_VOXEL_MASK_DTYPE)
+        self.assertEqual(color.tolist(), [(1, 2, 3, 0.5, 'AVAR', 10, 20, 30, 40)])
+
+    def test_add_roi_then_add_rois(self):
+        volume_seg = VolumeSegmentation(
+            name = 'VolumeSegmentation',
+            description = 'Neuron centers',
+            imaging_volume = self.ImagingVol
+        )
+        volume_seg.add_roi(voxel_mask=self.voxel_masks[0], layout='numeric')
+        volume_seg.add_rois(voxel_masks=self.voxel_masks[1:], layout='numeric')
+
+        self.assertTrue(all(isinstance(row, np.void) for row in volume_seg['numeric_voxel_mask'].target.data))
+        self.check_same(self.create_seg('compound', 'compound'), volume_seg)
+
+    def test_mixed_ids(self):
+        volume_seg = VolumeSegmentation(
+            name = 'VolumeSegmentation',
+            description = 'Neuron centers',
+            imaging_volume = self.ImagingVol
+        )
+        with self.assertRaises(ValueError):
+            volume_seg.add_rois(voxel_masks=[[[1, 2, 3, 1., 'AVAL'], [4, 5, 6, 1., 'AVAR']]], layout='numeric')
+
+    def test_roundtrip(self):
+        self.nwbfile.processing['NeuroPAL'].add(self.create_seg('compound', 'compound'))
+        self.nwbfile.processing['NeuroPAL'].add(self.create_seg('numeric', 'numeric'))
+
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            module = io.read().processing['NeuroPAL']
+            self.assertEqual(module['numeric']['numeric_voxel_mask'].target.data.dataset.dtype.itemsize, 16)
+            self.check_same(module['compound'], module['numeric'])
+
+
+class TestColorVoxelMask(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol()
+        self.path = 'test_color_voxel_mask.nwb'
+        self.data = np.arange(10 * 8 * 6 * 3, dtype=np.int16).reshape(10, 8, 6, 3)
+        self.data[0, 0, 0, 2] = -5
+        self.image = MultiChannelVolume(
+            name = 'multichanvol',
+            resolution = [0.25, 0.3, 1.0],
+            description = 'description',
+            RGBW_channels = [2, 0, 1, 0],
+            data = self.data,
+            imaging_volume = self.ImagingVol,
+            Order_optical_channels = self.ImagingVol.Order_optical_channels
+        )
+        self.nwbfile.add_acquisition(self.image)
+        self.voxel_masks = [[[1, 2, 3, 0.5, 'AVAL'], [0, 0, 0, 1., 'AVAL'], [9, 7, 5, 1., 'AVAL']],
+                            [[4, 5, 1, 1., 'AVAR']]]
+
+    def tearDown(self):
+        remove_test_file(self.path)
+
+    def create_seg(self, name, layout):
+        volume_seg = VolumeSegmentation(
+            name = name,
+            description = 'Neuron centers',
+            imaging_volume = self.ImagingVol
+        )
+        volume_seg.add_rois(voxel_masks=self.voxel_masks, layout=layout)
+        return volume_seg
+
+    def check_colors(self, volume_seg, summary):
+        rgbw = np.maximum(self.data[..., [2, 0, 1, 0]], 0)
+        for row, voxel_mask in enumerate(self.voxel_masks):
+            colors = np.array([rgbw[x, y, z] for x, y, z, _, _ in voxel_mask])
+            expected = [tuple(voxel) + tuple(color) for voxel, color in zip(voxel_mask, colors.tolist())]
+            self.assertEqual(volume_seg.get_voxel_mask(row, column='color_voxel_mask').tolist(), expected)
+            means = summary.iloc[row][['mean_R', 'mean_G', 'mean_B', 'mean_W']].astype(float)
+            np.testing.assert_allclose(means, colors.mean(axis=0))
+            medians = summary.iloc[row][['median_R', 'median_G', 'median_B', 'median_W']].astype(float)
+            np.testing.assert_allclose(medians, np.median(colors, axis=0))
+        self.assertEqual(list(summary['ID']), ['AVAL', 'AVAR'])
+        self.assertEqual(list(summary['n_voxels']), [3, 1])
+
+    def test_compound(self):
+        volume_seg = self.create_seg('VolumeSegmentation', 'compound')
+        summary = volume_seg.add_color_voxel_mask(volume=self.image)
+
+        self.assertIn('color_voxel_mask', volume_seg)
+        self.check_colors(volume_seg, summary)
+        with self.assertRaises(ValueError):
+            volume_seg.add_color_voxel_mask(volume=self.image)
+
+    def test_numeric(self):
+        volume_seg = self.create_seg('VolumeSegmentation', 'numeric')
+        summary = volume_seg.add_color_voxel_mask(volume=self.image)
+
+        self.assertIn('numeric_color_voxel_mask', volume_seg)
+        self.check_colors(volume_seg, summary)
+
+    def test_out_of_bounds(self):
+        self.voxel_masks = [[[10, 0, 0, 1., 'AVAL']]]
+        with self.assertRaises(ValueError):
+            self.create_seg('VolumeSegmentation', 'compound').add_color_voxel_mask(volume=self.image)
+
+    def test_roundtrip(self):
+        self.nwbfile.processing['NeuroPAL'].add(self.create_seg('compound', 'compound'))
+        self.nwbfile.processing['NeuroPAL'].add(self.create_seg('numeric', 'numeric'))
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            nwbfile = io.read()
+            for name in ('compound', 'numeric'):
+                volume_seg = nwbfile.processing['NeuroPAL'][name]
+                summary = volume_seg.add_color_voxel_mask(volume=nwbfile.acquisition['multichanvol'])
+                self.check_colors(volume_seg, summary)
+
+
+class TestSparse(TestCase):
+
+    def setUp(self):
+        self.nwbfile, self.ImagingVol = create_im_vol()
+        self.path = 'test_sparse.nwb'
+        self.shape = (10, 8, 6)
+        self.voxel_masks = [[[1, 2, 3, 0.5, 'AVAL'], [0, 0, 0, 1., 'AVAL']], [], [[4, 5, 1, 0.25, 'AVAR']]]
+
+    def tearDown(self):
+        remove_test_file(self.path)
+
+    def create_seg(self, layout='compound'):
+        volume_seg = VolumeSegmentation(
+            name = 'VolumeSegmentation',
+            description = 'Neuron centers',
+            imaging_volume = self.ImagingVol
+        )
+        volume_seg.add_rois(voxel_masks=self.voxel_masks, layout=layout)
+        return volume_seg
+
+    def test_to_sparse(self):
+        for layout in ('compound', 'numeric'):
+            matrix = self.create_seg(layout).to_sparse(shape=self.shape)
+
+            self.assertEqual(matrix.format, 'csr')
+            self.assertEqual(matrix.shape, (3, 480))
+            dense = matrix.toarray().reshape((3,) + self.shape)
+            self.assertEqual(dense[0, 1, 2, 3], 0.5)
+            self.assertEqual(dense[0, 0, 0, 0], 1.)
+            self.assertEqual(dense[1].sum(), 0.)
+            self.assertEqual(dense[2, 4, 5, 1], 0.25)
+            self.assertEqual(matrix.nnz, 3)
+
+    def test_from_sparse(self):
+        matrix = self.create_seg().to_sparse(shape=self.shape, format='coo')
+        volume_seg = VolumeSegmentation.from_sparse(
+            matrix = matrix,
+            shape = self.shape,
+            imaging_volume = self.ImagingVol,
+            description = 'Neuron centers',
+            ID = ['AVAL', '', 'AVAR'],
+            layout = 'numeric'
+        )
+
+        self.assertEqual(len(volume_seg), 3)
+        self.assertEqual(volume_seg.get_voxel_mask(0).tolist(), [(0, 0, 0, 1., 'AVAL'), (1, 2, 3, 0.5, 'AVAL')])
+        self.assertEqual(len(volume_seg.get_voxel_mask(1)), 0)
+        self.assertEqual(volume_seg.get_voxel_mask(2).tolist(), [(4, 5, 1, 0.25, 'AVAR')])
+        self.assertEqual((volume_seg.to_sparse(shape=self.shape) != matrix.tocsr()).nnz, 0)
+
+    def test_from_sparse_bad_shape(self):
+        with self.assertRaises(ValueError):
+            VolumeSegmentation.from_sparse(
+                matrix = self.create_seg().to_sparse(shape=self.shape),
+                shape = (10, 8, 5),
+                imaging_volume = self.ImagingVol,
+                description = 'Neuron centers'
+            )
+
+    def test_roundtrip(self):
+        self.nwbfile.processing['NeuroPAL'].add(self.create_seg())
+        with NWBHDF5IO(self.path, mode='w') as io:
+            io.write(self.nwbfile)
+
+        with NWBHDF5IO(self.path, mode='r') as io:
+            volume_seg = io.read().processing['NeuroPAL']['VolumeSegmentation']
+            matrix = volume_seg.to_sparse(shape=self.shape)
+            self.assertEqual((matrix != self.create_seg().to_sparse(shape=self.shape)).nnz, 0)
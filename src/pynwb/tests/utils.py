@@ -0,0 +1,61 @@
+import datetime
+
+from pynwb import NWBFile
+
+from ndx_multichannel_volume import OpticalChannelReferences, OpticalChannelPlus, ImagingVolume
+
+
+def create_im_vol(channels=[("mNeptune 2.5", "561-700-75m")]):
+
+    # channels should be ordered list of tuples (name, description)
+
+    nwbfile = NWBFile(
+        session_description = 'session_description',
+        identifier = 'identifier',
+        session_start_time = datetime.datetime.now(datetime.timezone.utc)
+    )
+
+    device = nwbfile.create_device(
+        name='device_name'
+    )
+
+    OptChannels = []
+    OptChanRefData = []
+    for name, wave in channels:
+        excite = float(wave.split('-')[0])
+        emiss_mid = float(wave.split('-')[1])
+        emiss_range = float(wave.split('-')[2][:-1])
+        OptChan = OpticalChannelPlus(
+            name = name,
+            description = wave,
+            excitation_lambda = excite,
+            excitation_range = [excite, excite],
+            emission_range = [emiss_mid-emiss_range/2, emiss_mid+emiss_range/2],
+            emission_lambda = emiss_mid
+        )
+
+        OptChannels.append(OptChan)
+        OptChanRefData.append(wave)
+
+    OpticalChannelRefs = OpticalChannelReferences(
+        name = 'OpticalChannelRefs',
+        channels = OptChanRefData
+    )
+
+    imaging_vol = ImagingVolume(
+        name = 'ImagingVolume',
+        optical_channel_plus = OptChannels,
+        Order_optical_channels = OpticalChannelRefs,
+        description = 'NeuroPAL image of C elegan brain',
+        device = device,
+        location = 'head'
+    )
+
+    neuroPAL_module = nwbfile.create_processing_module(
+        name = 'NeuroPAL',
+        description = 'description'
+    )
+    neuroPAL_module.add(imaging_vol)
+    neuroPAL_module.add(OpticalChannelRefs)
+
+    return nwbfile, imaging_vol
@@ -11,7 +11,7 @@ def main():
     ns_builder = NWBNamespaceBuilder(
         doc="""extension to allow use of multichannel volumetric images""",
         name="""ndx-multichannel-volume""",
-        version="""0.1.0""",
+        version="""0.2.0""",
         author=list(map(str.strip, """Daniel Sprague""".split(','))),
         contact=list(map(str.strip, """daniel.sprague@ucsf.edu""".split(',')))
     )
@@ -84,6 +84,7 @@ def main():
                 name = 'description',
                 doc = 'description of image series',
                 dtype = 'float32',
+                quantity = '?'
             ),
             NWBDatasetSpec(
                 name = 'RGBW_channels',
@@ -153,6 +154,36 @@ def main():
         ]
     )
 
+    VolumeMotionCorrection = NWBGroupSpec(
+        neurodata_type_def = 'VolumeMotionCorrection',
+        neurodata_type_inc = 'NWBDataInterface',
+        doc = 'Per-frame 3-D rigid or affine transforms registering the frames of a MultiChannelVolumeSeries, the volumetric counterpart of MotionCorrection',
+        datasets = [
+            NWBDatasetSpec(
+                name = 'transforms',
+                dtype = 'float32',
+                dims = ['frame', 'row', 'column'],
+                shape = [None, 3, 4],
+                doc = 'Top three rows of the 4x4 homogeneous affine transform of each frame, mapping (x, y, z) voxel positions in the registered space to voxel positions in the frame as recorded'
+            )
+        ],
+        attributes = [
+            NWBAttributeSpec(
+                name = 'reference_frame',
+                dtype = 'uint32',
+                doc = 'Frame of the original series that defines the registered space, if any',
+                required = False
+            )
+        ],
+        links = [
+            NWBLinkSpec(
+                name = 'original',
+                target_type = 'MultiChannelVolumeSeries',
+                doc = 'Link to the MultiChannelVolumeSeries whose frames are registered by these transforms'
+            )
+        ]
+    )
+
     MultiChannelVolume = NWBGroupSpec(
         neurodata_type_def='MultiChannelVolume',
         neurodata_type_inc='NWBDataInterface',
@@ -183,6 +214,11 @@ def main():
                 dims = ['x','y','z','channel'],
                 shape = [None, None,None,None],
                 dtype = 'int16',
+            ),
+            NWBDatasetSpec(
+                neurodata_type_inc = 'VolumePyramidLevel',
+                doc = 'Downsampled copies of data for fast overview rendering, from finest to coarsest',
+                quantity = '*'
             )
         ],
 
@@ -203,6 +239,39 @@ def main():
         ]
     )
 
+    VolumePyramidLevel = NWBDatasetSpec(
+        neurodata_type_def = 'VolumePyramidLevel',
+        neurodata_type_inc = 'NWBData',
+        doc = 'A downsampled level of the data of a MultiChannelVolume',
+        dtype = 'int16',
+        dims = ['x','y','z','channel'],
+        shape = [None, None, None, None],
+        attributes = [
+            NWBAttributeSpec(
+                name = 'downsampling',
+                dtype = 'uint16',
+                dims = ['xyz factor'],
+                shape = [3],
+                doc = 'downsampling factor of this level relative to the full-resolution data in x, y and z'
+            ),
+            NWBAttributeSpec(
+                name = 'resolution',
+                dtype = 'float32',
+                dims = ['xyz scale'],
+                shape = [3],
+                doc = 'pixel resolution of this level, the resolution of the full-resolution data scaled by downsampling'
+            ),
+            NWBAttributeSpec(
+                name = 'grid_spacing',
+                dtype = 'float32',
+                dims = ['xyz scale'],
+                shape = [3],
+                doc = 'grid_spacing of the ImagingVolume scaled by downsampling, in grid_spacing_unit',
+                required = False
+            )
+        ]
+    )
+
     ImagingVolume = NWBGroupSpec(
         neurodata_type_def = 'ImagingVolume',
         neurodata_type_inc = 'NWBDataInterface',
@@ -425,6 +494,109 @@ def main():
                 ],
                 doc = 'Voxel masks for each ROI including RGBW color values',
                 quantity = '?'
+            ),
+            NWBDatasetSpec(
+                name = 'numeric_voxel_mask_index',
+                neurodata_type_inc = 'VectorIndex',
+                doc = 'Index into numeric_voxel_mask.',
+                quantity = '?'
+            ),
+            NWBDatasetSpec(
+                name = 'numeric_voxel_mask',
+                neurodata_type_inc = 'VectorData',
+                dtype = [
+                    NWBDtypeSpec(
+                        name = 'x',
+                        dtype = 'uint32',
+                        doc = 'Voxel x-coordinate'
+                    ),
+                    NWBDtypeSpec(
+                        name = 'y',
+                        dtype = 'uint32',
+                        doc = 'Voxel y-coordinate'
+                    ),
+                    NWBDtypeSpec(
+                        name = 'z',
+                        dtype = 'uint32',
+                        doc = 'Voxel z-coordinate'
+                    ),
+                    NWBDtypeSpec(
+                        name = 'weight',
+                        dtype = 'float32',
+                        doc = 'Weight of the voxel'
+                    )
+                ],
+                doc = 'Voxel masks for each ROI with fixed-width numeric fields only. Alternative to voxel_mask, with the cell ID stored once per ROI in roi_ID.',
+                quantity = '?'
+            ),
+            NWBDatasetSpec(
+                name = 'numeric_color_voxel_mask_index',
+                neurodata_type_inc = 'VectorIndex',
+                doc = 'Index into numeric_color_voxel_mask.',
+                quantity = '?'
+            ),
+            NWBDatasetSpec(
+                name = 'numeric_color_voxel_mask',
+                neurodata_type_inc = 'VectorData',
+                dtype = [
+                    NWBDtypeSpec(
+                        name = 'x',
+                        dtype = 'uint32',
+                        doc = 'Voxel x-coordinate'
+                    ),
+                    NWBDtypeSpec(
+                        name = 'y',
+                        dtype = 'uint32',
+                        doc = 'Voxel y-coordinate'
+                    ),
+                    NWBDtypeSpec(
+                        name = 'z',
+                        dtype = 'uint32',
+                        doc = 'Voxel z-coordinate'
+                    ),
+                    NWBDtypeSpec(
+                        name = 'weight',
+                        dtype = 'float32',
+                        doc = 'Weight of the voxel'
+                    ),
+                    NWBDtypeSpec(
+                        name = 'R',
+                        dtype = 'uint32',
+                        doc = 'Voxel red value'
+                    ),
+                    NWBDtypeSpec(
+                        name = 'G',
+                        dtype = 'uint32',
+                        doc = 'Voxel green value'
+                    ),
+                    NWBDtypeSpec(
+                        name = 'B',
+                        dtype = 'uint32',
+                        doc = 'Voxel blue value'
+                    ),
+                    NWBDtypeSpec(
+                        name = 'W',
+                        dtype = 'uint32',
+                        doc = 'voxel white value'
+                    )
+                ],
+                doc = 'Voxel masks for each ROI including RGBW color values, with fixed-width numeric fields only. Alternative to color_voxel_mask, with the cell ID stored once per ROI in roi_ID.',
+                quantity = '?'
+            ),
+            NWBDatasetSpec(
+                name = 'roi_ID',
+                neurodata_type_inc = 'VectorData',
+                dtype = 'text',
+                doc = 'Cell ID of each ROI, used with the numeric voxel mask columns.',
+                quantity = '?'
+            ),
+            NWBDatasetSpec(
+                name = 'label_volume',
+                dtype = 'uint16',
+                dims = ['num_x', 'num_y', 'num_z'],
+                shape = [None, None, None],
+                doc = 'Label volume of all ROIs: voxels of the ROI in row i have the value i + 1 and background voxels are 0. A compact alternative to storing one image_mask per ROI.',
+                quantity = '?'
             )
         ],
         links = [
@@ -437,7 +609,7 @@ def main():
     )
 
     # TODO: add all of your new data types to this list
-    new_data_types = [CElegansSubject, MultiChannelVolumeSeries, MultiChannelVolume, ImagingVolume, OpticalChannelReferences, OpticalChannelPlus, VolumeSegmentation]
+    new_data_types = [CElegansSubject, MultiChannelVolumeSeries, VolumeMotionCorrection, MultiChannelVolume, VolumePyramidLevel, ImagingVolume, OpticalChannelReferences, OpticalChannelPlus, VolumeSegmentation]
 
     # export the spec to yaml files in the spec folder
     output_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'spec'))